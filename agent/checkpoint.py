@@ -0,0 +1,74 @@
+# Saving and restoring the training state of Q-learning agents
+import json
+import os
+
+import numpy as np
+
+
+def save_checkpoint(agent, path, iteration, epsilon_start, env=None):
+    """
+    Save the Q-tables, the epsilon schedule position and the random number generator states of the agent and of the
+    environment's scenarios, so a resumed run draws the same explorations and scenarios as an uninterrupted one.
+    The file is replaced atomically, so an interrupted save leaves the previous checkpoint intact.
+
+    Args:
+        agent (QLearning): The agent, any agent providing get_Q_entries.
+        path (str): The checkpoint file (.npz).
+        iteration (int): Number of completed training iterations.
+        epsilon_start (float): Exploration rate at the start of the next iteration.
+        env (SupplyChainEnv): The training environment, its scenario generator's state is saved if it has one.
+    """
+    rng_state = agent.rng.get_state()
+    scenario_state = {}
+    if env is not None and env.scenarios is not None:
+        scenario_state["scenario_rng_state"] = json.dumps(env.scenarios.rng.bit_generator.state)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez(
+            file,
+            **agent.get_Q_entries(),
+            iteration=iteration,
+            epsilon_start=epsilon_start,
+            rng_keys=rng_state[1],
+            rng_position=rng_state[2],
+            rng_has_gauss=rng_state[3],
+            rng_cached_gaussian=rng_state[4],
+            **scenario_state,
+        )
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(agent, path, env=None):
+    """
+    Restore a checkpoint written by save_checkpoint into an agent, and into the environment's scenario generator.
+
+    Args:
+        agent (QLearning): The agent, any agent providing set_Q_entries.
+        path (str): The checkpoint file.
+        env (SupplyChainEnv): The training environment, its scenario generator continues from the saved state.
+
+    Returns:
+        tuple: Number of completed training iterations and the exploration rate at the start of the next iteration.
+    """
+    with np.load(path) as checkpoint:
+        agent.set_Q_entries(checkpoint)
+        agent.rng.set_state(("MT19937", checkpoint["rng_keys"], int(checkpoint["rng_position"]),
+                             int(checkpoint["rng_has_gauss"]), float(checkpoint["rng_cached_gaussian"])))
+        if env is not None and env.scenarios is not None and "scenario_rng_state" in checkpoint:
+            env.scenarios.rng.bit_generator.state = json.loads(str(checkpoint["scenario_rng_state"]))
+            # Drop the chunks the current scenario stream drew before the restore
+            env.reset()
+        return int(checkpoint["iteration"]), float(checkpoint["epsilon_start"])
+
+
+def warm_start(agent, path):
+    """
+    Initialize an agent's Q-tables from a checkpoint, e.g. to train a new agent from a previously trained table.
+    The epsilon schedule and the random number generator of the agent are left untouched.
+
+    Args:
+        agent (QLearning): The agent, any agent providing set_Q_entries.
+        path (str): The checkpoint file.
+    """
+    with np.load(path) as checkpoint:
+        agent.set_Q_entries(checkpoint)
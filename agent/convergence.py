@@ -0,0 +1,157 @@
+# Monitoring the convergence of Q-learning training and stopping it early
+from collections import deque
+
+import numpy as np
+
+
+def _row_keys(rows):
+    # One hashable, sortable void value per row of an integer array, to match rows between snapshots
+    rows = np.ascontiguousarray(rows, dtype=np.int64)
+    return rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+
+
+def greedy_policy(entries):
+    """
+    Find the greedy action of every visited state of every agent in flattened Q-table entries.
+    Ties are broken towards the smaller action.
+
+    Args:
+        entries (dict): The arrays Q_agents, Q_states, Q_actions and Q_values, see QLearning.get_Q_entries.
+
+    Returns:
+        tuple: The (agent, *state) rows, the greedy actions and their Q-values, one entry per row.
+    """
+    pairs = np.column_stack([entries["Q_agents"], entries["Q_states"]]).astype(np.int64)
+    # Sort by agent and state, then by decreasing value and increasing action, so each group starts with its best action
+    order = np.lexsort((entries["Q_actions"], -entries["Q_values"]) + tuple(pairs.T[::-1]))
+    pairs = pairs[order]
+    first = np.ones(len(pairs), dtype=bool)
+    first[1:] = (pairs[1:] != pairs[:-1]).any(axis=1)
+    return pairs[first], entries["Q_actions"][order][first], entries["Q_values"][order][first]
+
+
+class ConvergenceMonitor:
+    def __init__(self, check_every=100, reward_window=100, policy_change_tol=None, q_delta_tol=None, reward_tol=None,
+                 patience=3, min_iterations=0, evaluate_every=None):
+        """
+        Track the convergence of QLearning.train and decide when to stop early.
+        Every check_every iterations the Q-tables are compared with the previous check. Training stops once every
+        configured criterion holds for patience checks in a row, without criteria the monitor only records.
+
+        Args:
+            check_every (int): Number of iterations between two checks.
+            reward_window (int): Number of episodes in the moving average of the episode reward.
+            policy_change_tol (float): Largest share of visited states whose greedy action changed since the last check.
+            q_delta_tol (float): Largest absolute change of a Q-value since the last check.
+            reward_tol (float): Largest relative change of the moving average reward since the last check.
+            patience (int): Number of consecutive checks the criteria must hold.
+            min_iterations (int): Number of iterations before training may stop.
+            evaluate_every (int): Number of iterations between greedy evaluations with QLearning.simulation,
+                None to skip them. The evaluations do not change the random number generators of the agent and of the
+                environment's scenarios.
+        """
+        self.check_every = check_every
+        self.policy_change_tol = policy_change_tol
+        self.q_delta_tol = q_delta_tol
+        self.reward_tol = reward_tol
+        self.patience = patience
+        self.min_iterations = min_iterations
+        self.evaluate_every = evaluate_every
+        self.history = [] # One record per check or evaluation
+        self.stopped_at = None # Iteration after which training stopped early
+        self._rewards = deque(maxlen=reward_window)
+        self._previous = None # Q-table snapshot and moving average reward of the last check
+        self._streak = 0
+
+    def update(self, agent, env, iteration, total_reward):
+        """
+        Record a finished training episode and check for convergence if one is due.
+
+        Args:
+            agent (QLearning): The agent being trained, any agent providing get_Q_entries.
+            env (SupplyChainEnv): The training environment, used for the greedy evaluations.
+            iteration (int): The iteration of the episode, starting at 0.
+            total_reward (int): The total reward of the episode.
+
+        Returns:
+            bool: Whether training should stop.
+        """
+        self._rewards.append(total_reward)
+        completed = iteration + 1
+        check = completed % self.check_every == 0
+        evaluate = bool(self.evaluate_every) and completed % self.evaluate_every == 0
+        if not (check or evaluate):
+            return False
+
+        record = {"iteration": completed}
+        if evaluate:
+            record["greedy_reward"] = self.evaluate(agent, env)
+        if check:
+            record.update(self._compare(agent))
+        self.history.append(record)
+        if not check:
+            return False
+
+        converged = self._converged(record)
+        self._streak = self._streak + 1 if converged else 0
+        if self._streak >= self.patience and completed >= self.min_iterations:
+            self.stopped_at = completed
+            return True
+        return False
+
+    def evaluate(self, agent, env):
+        """
+        Run the greedy policy once with QLearning.simulation, keeping the random number generators of the agent and of
+        the environment's scenarios unchanged, so training continues as without the evaluation.
+
+        Args:
+            agent (QLearning): The agent.
+            env (SupplyChainEnv): The environment.
+
+        Returns:
+            int: The total reward of the greedy episode.
+        """
+        rng_state = agent.rng.get_state()
+        # Resetting the environment draws a new scenario
+        scenario_state = env.scenarios.rng.bit_generator.state if env.scenarios is not None else None
+        simulation_log = agent.simulation(env)
+        agent.rng.set_state(rng_state)
+        if scenario_state is not None:
+            env.scenarios.rng.bit_generator.state = scenario_state
+        return sum(entry[2] for entry in simulation_log)
+
+    def _compare(self, agent):
+        # Convergence measures of the current Q-tables against the last check
+        entries = agent.get_Q_entries()
+        pairs, greedy_actions, _ = greedy_policy(entries)
+        value_keys = _row_keys(np.column_stack([entries["Q_agents"], entries["Q_states"], entries["Q_actions"]]))
+        snapshot = (_row_keys(pairs), greedy_actions, value_keys, entries["Q_values"])
+        reward_average = float(np.mean(self._rewards))
+        record = {"num_entries": len(value_keys), "reward_moving_average": reward_average,
+                  "policy_change_rate": None, "q_delta_norm": None, "q_delta_max": None, "reward_change": None}
+
+        if self._previous is not None:
+            (previous_pairs, previous_actions, previous_keys, previous_values), previous_average = self._previous
+            # States that are new since the last check count as changed
+            _, current, previous = np.intersect1d(snapshot[0], previous_pairs, assume_unique=True, return_indices=True)
+            changed = len(pairs) - len(current) + np.count_nonzero(greedy_actions[current] != previous_actions[previous])
+            record["policy_change_rate"] = float(changed / max(len(pairs), 1))
+
+            # New entries changed from their initial value 0
+            deltas = entries["Q_values"].copy()
+            _, current, previous = np.intersect1d(value_keys, previous_keys, assume_unique=True, return_indices=True)
+            deltas[current] -= previous_values[previous]
+            record["q_delta_norm"] = float(np.linalg.norm(deltas))
+            record["q_delta_max"] = float(np.abs(deltas).max(initial=0.0))
+            record["reward_change"] = abs(reward_average - previous_average) / max(abs(previous_average), 1.0)
+        self._previous = (snapshot, reward_average)
+        return record
+
+    def _converged(self, record):
+        # Whether all configured criteria hold, never without any criterion or before the first comparison
+        criteria = [(self.policy_change_tol, "policy_change_rate"), (self.q_delta_tol, "q_delta_max"),
+                    (self.reward_tol, "reward_change")]
+        criteria = [(tolerance, key) for tolerance, key in criteria if tolerance is not None]
+        if not criteria or record["policy_change_rate"] is None:
+            return False
+        return all(record[key] <= tolerance for tolerance, key in criteria)
@@ -0,0 +1,244 @@
+import numpy as np
+
+from agent.q_learning import QLearning
+
+
+# Defining the Q-learning agent with array-backed Q-tables
+class DenseQLearning(QLearning):
+    def __init__(self, actions, state_space, **kwargs):
+        """
+        Initialize a Q-learning agent that stores its Q-tables in one dense array.
+        The learning rule and the epsilon-greedy policy are the same as in QLearning.
+
+        Args:
+            actions (list): List of possible actions/action space.
+            state_space (list): List of all possible coded states, ordered as in data.test_problems.
+            **kwargs: Further arguments of QLearning, e.g. alpha, gamma, max_iterations or num_agents.
+        """
+        super().__init__(actions, state_space, **kwargs)
+        self.n_states = len(state_space)
+        self.n_codes = max(max(state) for state in state_space) # Number of codes per agent, 9 in the paper
+
+        # The values are stored state-major, so all agents' entries of one state are contiguous
+        self._bind_tables(
+            np.zeros((self.n_states, self.num_agents, len(actions))),
+            np.zeros((self.n_states, self.num_agents, len(actions)), dtype=bool),
+            # Copy of the values with -inf for unvisited actions, used for the greedy lookups
+            np.full((self.n_states, self.num_agents, len(actions)), -np.inf),
+            # Whether an agent has visited any action of a state
+            np.zeros((self.n_states, self.num_agents), dtype=bool),
+        )
+        self._action_values = np.asarray(actions)
+        self._action_columns = {action: column for column, action in enumerate(actions)}
+
+    def _bind_tables(self, values, visited, masked_values, seen):
+        # Use the given arrays as the Q-tables, e.g. arrays in shared memory, and rebuild the views on them
+        self._values = values
+        self._visited = visited
+        self._masked_values = masked_values
+        self._seen = seen
+
+        # Views with shape (num_agents, n_states, n_actions) and a mask of the visited state-action pairs
+        self.Q_tables = self._values.transpose(1, 0, 2)
+        self.visited = self._visited.transpose(1, 0, 2)
+
+        # Flattened rows of shape (n_states, num_agents * n_actions) used to update all agents with one index array
+        self._value_rows = self._values.reshape(self.n_states, -1)
+        self._visited_rows = self._visited.reshape(self.n_states, -1)
+        self._masked_rows = self._masked_values.reshape(self.n_states, -1)
+
+        # Flat memoryviews on the same memory for the per-step lookups and updates, reading or writing one element
+        # of a memoryview is several times faster than indexing a NumPy array with a scalar
+        self._value_view = memoryview(self._values.reshape(-1))
+        self._visited_view = memoryview(self._visited.reshape(-1))
+        self._masked_view = memoryview(self._masked_values.reshape(-1))
+        self._seen_view = memoryview(self._seen.reshape(-1))
+
+    @property
+    def nbytes(self):
+        """
+        int: Memory used by the Q-tables and their masks in bytes.
+        """
+        return self._values.nbytes + self._visited.nbytes + self._masked_values.nbytes + self._seen.nbytes
+
+    def state_index(self, state):
+        """
+        Convert a coded state into its position in the state space.
+
+        Args:
+            state (tuple): The coded state, codes start at 1.
+
+        Returns:
+            int: The flat state index.
+        """
+        index = 0
+        for code in state:
+            index = index * self.n_codes + code - 1
+        return index
+
+    def choose_action(self, state, epsilon):
+        """
+        Choose an action based on the current state using an epsilon-greedy policy.
+
+        Args:
+            state (tuple): The current state.
+            epsilon (float): The current exploration rate.
+
+        Returns:
+            tuple: The chosen actions as a vector.
+        """
+        n_actions = len(self.actions)
+        index = self.state_index(state) * self.num_agents
+        # One draw decides exploration, the other one picks the random action
+        explore_draws, action_draws = self.rng.rand(2, self.num_agents).tolist()
+
+        seen = self._seen_view
+        masked = self._masked_view
+        action_vector = []
+        fallbacks = 0
+        for agent in range(self.num_agents):
+            # Explore with probability epsilon, and whenever the agent has not seen the state yet
+            if explore_draws[agent] < epsilon or not seen[index + agent]:
+                fallbacks += explore_draws[agent] >= epsilon
+                action_vector.append(self.actions[int(action_draws[agent] * n_actions)])
+            else:
+                # First action with the highest value among the visited ones, as argmax
+                start = (index + agent) * n_actions
+                row = masked[start:start + n_actions].tolist()
+                action_vector.append(self.actions[row.index(max(row))])
+        if self.profiler is not None:
+            self.profiler.count("unseen_state_fallbacks", fallbacks)
+        return tuple(action_vector)
+
+    def choose_greedy(self, state):
+        """
+        Choose the best action based on the current state using a greedy policy.
+
+        Args:
+            state (tuple): The current state.
+
+        Returns:
+            tuple: The chosen actions as a vector.
+        """
+        index = self.state_index(state)
+        if self.profiler is not None:
+            self.profiler.count("unseen_state_fallbacks", int((~self._seen[index]).sum()))
+        columns = np.where(self._seen[index], self._masked_values[index].argmax(axis=1),
+                           (self.rng.rand(self.num_agents) * len(self.actions)).astype(np.intp))
+        return tuple(self._action_values[columns].tolist())
+
+    def update_Q(self, state, action_vector, reward, next_state):
+        """
+        Update the Q-value for the given state-action pair of every agent at once.
+
+        Args:
+            state (tuple): The current state.
+            action_vector (tuple): The actions taken.
+            reward (int): The reward received.
+            next_state (tuple): The next state.
+        """
+        n_actions = len(self.actions)
+        num_agents = self.num_agents
+        index = self.state_index(state) * num_agents
+        next_index = self.state_index(next_state) * num_agents
+        values = self._value_view
+        masked = self._masked_view
+        visited = self._visited_view
+        # Positions of the taken actions in the flat tables
+        positions = [(index + agent) * n_actions + self._action_columns[action]
+                     for agent, action in enumerate(action_vector)]
+
+        # Mark the state-action pairs as visited before looking at the next state, as the dictionary version does
+        for agent, position in enumerate(positions):
+            if not visited[position]:
+                visited[position] = True
+                self._seen_view[index + agent] = True
+                masked[position] = values[position]
+
+        # Q(s, a) = Q(s, a) + alpha * [reward + gamma * max_a' Q(s', a') - Q(s, a)]
+        for agent, position in enumerate(positions):
+            # Maximum Q-value over the visited actions of the next state, 0.0 if there are none
+            start = (next_index + agent) * n_actions
+            max_q_next = max(masked[start:start + n_actions].tolist())
+            if max_q_next == -np.inf:
+                max_q_next = 0.0
+            old_value = values[position]
+            new_value = old_value + self.alpha * (reward + self.gamma * max_q_next - old_value)
+            values[position] = new_value
+            masked[position] = new_value
+
+    def num_Q_states(self):
+        """
+        Number of states the agents have visited, summed over the agents.
+        The dense Q-tables hold every state, so only the visited ones are counted.
+
+        Returns:
+            int: The number of states.
+        """
+        return int(self._seen.sum())
+
+    def init_Q_entries(self, state, action_vector, next_state):
+        """
+        Nothing to initialize, the dense Q-tables cover every state and visits are recorded in update_Q.
+        """
+
+    def save(self, path):
+        """
+        Save the Q-tables to a NumPy .npz file.
+
+        Args:
+            path (str): The file path.
+        """
+        np.savez(path, Q_tables=self.Q_tables, visited=self.visited, actions=self._action_values)
+
+    def load(self, path):
+        """
+        Load Q-tables saved with save().
+
+        Args:
+            path (str): The file path.
+        """
+        with np.load(path) as data:
+            if data["Q_tables"].shape != self.Q_tables.shape or list(data["actions"]) != list(self.actions):
+                raise ValueError(f"Q-tables in {path} do not match the state space and actions of this agent")
+            # Copy in place, so the Q_tables and visited views stay valid
+            self.Q_tables[...] = data["Q_tables"]
+            self.visited[...] = data["visited"]
+        self._refresh_masks()
+
+    def _refresh_masks(self):
+        # Rebuild the masked values and the seen states after the Q-tables were replaced
+        self._masked_values[...] = np.where(self._visited, self._values, -np.inf)
+        self._seen[...] = self._visited.any(axis=2)
+
+    def get_Q_entries(self):
+        """
+        Flatten the Q-tables into arrays with one entry per visited state-action pair, e.g. for checkpoints.
+
+        Returns:
+            dict: The arrays Q_agents, Q_states (entries x echelons), Q_actions and Q_values.
+        """
+        agents, indices, columns = np.nonzero(self.visited)
+        codes = np.unravel_index(indices, (self.n_codes,) * self.num_agents)
+        return {
+            "Q_agents": agents.astype(np.int32),
+            "Q_states": (np.stack(codes, axis=1) + 1).astype(np.int16),
+            "Q_actions": self._action_values[columns].astype(np.int32),
+            "Q_values": self.Q_tables[agents, indices, columns],
+        }
+
+    def set_Q_entries(self, entries):
+        """
+        Replace the Q-tables by flattened entries as returned by get_Q_entries.
+
+        Args:
+            entries (dict): The arrays Q_agents, Q_states, Q_actions and Q_values.
+        """
+        agents = entries["Q_agents"]
+        indices = np.ravel_multi_index(tuple(entries["Q_states"].T - 1), (self.n_codes,) * self.num_agents)
+        columns = np.array([self._action_columns[action] for action in entries["Q_actions"].tolist()], dtype=np.intp)
+        self._values[...] = 0.0
+        self._visited[...] = False
+        self.Q_tables[agents, indices, columns] = entries["Q_values"]
+        self.visited[agents, indices, columns] = True
+        self._refresh_masks()
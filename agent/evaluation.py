@@ -0,0 +1,127 @@
+# Evaluating frozen greedy policies over many demand and lead time scenarios at once
+import numpy as np
+
+from environment.batch_supply_chain import BatchSupplyChainEnv
+from environment.state_coding import StateCoder
+
+
+class CompiledPolicy:
+    def __init__(self, table, seen, state_coder):
+        """
+        A deterministic greedy policy as a lookup array over the flat state indices.
+
+        Args:
+            table (np.ndarray): Action of each agent per state, shape (n_states, num_agents).
+            seen (np.ndarray): Whether the agent had visited the state, shape (n_states, num_agents).
+                Unseen states hold the fallback action in table.
+            state_coder (StateCoder): The coding of the states the policy was learned on.
+        """
+        self.table = table
+        self.seen = seen
+        self.state_coder = state_coder
+
+    def lookup(self, state_indices):
+        """
+        Look up the actions for many states at once.
+
+        Args:
+            state_indices (np.ndarray): Flat state indices of any shape.
+
+        Returns:
+            np.ndarray: The actions with shape state_indices.shape + (num_agents,).
+        """
+        return self.table[state_indices]
+
+    def choose_greedy(self, state):
+        """
+        Choose the actions for a coded state, as QLearning.choose_greedy but without randomness.
+
+        Args:
+            state (tuple): The coded state.
+
+        Returns:
+            tuple: The chosen actions as a vector.
+        """
+        return tuple(self.table[self.state_coder.index(state)].tolist())
+
+
+def compile_policy(agent, state_coder=None, fallback_action=None):
+    """
+    Compile the learned Q-tables of an agent into a deterministic policy lookup array.
+
+    Args:
+        agent (QLearning): The trained agent, any agent providing get_Q_entries.
+        state_coder (StateCoder): The coding of the agent's states, defaults to the paper's ranges.
+        fallback_action (int): Action for states an agent has not visited, defaults to the first action.
+
+    Returns:
+        CompiledPolicy: The greedy policy.
+    """
+    num_agents = agent.num_agents
+    if state_coder is None:
+        state_coder = StateCoder(num_echelons=num_agents)
+    if fallback_action is None:
+        fallback_action = agent.actions[0]
+    action_values = np.asarray(agent.actions)
+
+    # Best visited action per state and agent, unvisited actions never win
+    entries = agent.get_Q_entries()
+    action_columns = {action: column for column, action in enumerate(agent.actions)}
+    columns = np.array([action_columns[action] for action in entries["Q_actions"].tolist()], dtype=np.intp)
+    values = np.full((state_coder.n_states, num_agents, len(action_values)), -np.inf)
+    values[state_coder.index_array(entries["Q_states"]), entries["Q_agents"], columns] = entries["Q_values"]
+
+    seen = np.isfinite(values).any(axis=2)
+    table = np.where(seen, action_values[values.argmax(axis=2)], fallback_action)
+    return CompiledPolicy(table, seen, state_coder)
+
+
+def evaluate_policy(policy, customer_demand, lead_times, initial_inventory, holding_costs, penalty_costs,
+                    quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), batch_size=10000, max_lead_time=None, topology=None):
+    """
+    Run a compiled policy over many demand and lead time scenarios and summarize the cost distribution.
+
+    Args:
+        policy (CompiledPolicy): The policy to evaluate.
+        customer_demand (np.ndarray): Customer demand per scenario, shape (n_scenarios, T),
+            or (n_scenarios, T, n_retailers) for one demand per retailer.
+        lead_times (np.ndarray): Lead times per scenario, shape (n_scenarios, T).
+        initial_inventory (list): Initial inventory levels for each actor in the supply chain.
+        holding_costs (list): Holding costs per unit for each level in the supply chain.
+        penalty_costs (list): Penalty costs per unit for each level in the supply chain.
+        quantiles (tuple): Quantiles of the total cost to report.
+        batch_size (int): Number of scenarios simulated together.
+        max_lead_time (int): Longest lead time the pipeline can hold, defaults to the maximum of lead_times.
+        topology (SupplyChainTopology): Which echelon supplies which, defaults to a serial chain.
+
+    Returns:
+        dict: The total cost per scenario ("costs") with its "mean", "std", "min", "max" and "quantiles".
+    """
+    customer_demand = np.atleast_2d(customer_demand)
+    lead_times = np.broadcast_to(lead_times, customer_demand.shape[:2])
+    if max_lead_time is None:
+        max_lead_time = int(lead_times.max(initial=0))
+
+    costs = None
+    for start in range(0, len(customer_demand), batch_size):
+        stop = min(start + batch_size, len(customer_demand))
+        env = BatchSupplyChainEnv(stop - start, initial_inventory, holding_costs, penalty_costs,
+                                  customer_demand[start:stop], lead_times[start:stop], max_lead_time=max_lead_time,
+                                  state_coder=policy.state_coder, topology=topology)
+        if costs is None:
+            # Integer costs give integer totals, fractional costs float totals, as the rewards of the environment
+            costs = np.empty(len(customer_demand), dtype=env.cost_dtype)
+        total_reward = np.zeros(stop - start, dtype=env.cost_dtype)
+        for _ in range(customer_demand.shape[1]):
+            _, reward = env.step(policy.lookup(env.state_index))
+            total_reward += reward
+        costs[start:stop] = -total_reward
+
+    return {
+        "costs": costs,
+        "mean": float(costs.mean()),
+        "std": float(costs.std()),
+        "min": costs.min().item(),
+        "max": costs.max().item(),
+        "quantiles": dict(zip(quantiles, np.quantile(costs, quantiles).tolist())),
+    }
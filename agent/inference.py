@@ -0,0 +1,205 @@
+# Deciding orders for live inventory positions with a learned greedy policy
+from operator import add, sub
+
+import numpy as np
+
+from agent.policy_io import MappedPolicy, _key_states, _state_keys, policy_arrays
+from environment.state_coding import StateCoder
+
+# Policies for the agents that have not visited a state
+FALLBACKS = ("constant", "nearest", "base_stock")
+
+# Largest number of (query, stored state) distances computed at once by the nearest state fallback
+NEAREST_CHUNK = 10 ** 6
+
+
+class InferencePolicy:
+    def __init__(self, state_keys, greedy_actions, seen, actions, state_coder, fallback="constant",
+                 fallback_action=None, base_stock_levels=None):
+        """
+        Deterministic orders of a learned greedy policy for raw inventory levels and backlogs, one site
+        at a time with order or many sites at once with order_batch.
+        An agent that has not visited the coded state follows the fallback policy:
+        "constant" takes fallback_action, "nearest" takes its greedy action in the closest state it has visited
+        (fewest code steps summed over the echelons, ties go to the smaller state index) and "base_stock" orders
+        up to base_stock_levels, i.e. takes the action closest to the base-stock level minus the net inventory.
+
+        Args:
+            state_keys (np.ndarray): Sorted flat indices of the visited states.
+            greedy_actions (np.ndarray): Greedy action of each agent per visited state, shape (n, num_agents).
+            seen (np.ndarray): Whether each agent had visited the state, shape (n, num_agents).
+            actions (list): List of possible actions/action space.
+            state_coder (StateCoder): The coding of the states the policy was learned on.
+            fallback (str): Policy for unseen states, one of FALLBACKS.
+            fallback_action (int): Action of the constant fallback and of the nearest state fallback if an agent
+                has not visited any state, defaults to the first action.
+            base_stock_levels (list): Base-stock level per echelon, required by the base-stock fallback.
+        """
+        if fallback not in FALLBACKS:
+            raise ValueError(f"Unknown fallback {fallback!r}, expected one of {FALLBACKS}")
+        if fallback == "base_stock" and base_stock_levels is None:
+            raise ValueError("The base-stock fallback requires base_stock_levels")
+        self.state_keys = state_keys
+        self.greedy_actions = greedy_actions
+        self.seen = seen
+        self.actions = list(actions)
+        self.state_coder = state_coder
+        self.num_agents = state_coder.num_echelons
+        self.fallback = fallback
+        self.fallback_action = self.actions[0] if fallback_action is None else fallback_action
+        self.base_stock_levels = None if base_stock_levels is None else np.asarray(base_stock_levels, dtype=np.int64)
+        self._action_values = np.sort(np.asarray(self.actions))
+
+        # Actions of the states every agent has visited, the only lookup on the path of a single decision
+        fully_seen = seen.all(axis=1)
+        self._greedy = dict(zip(np.asarray(state_keys)[fully_seen].tolist(),
+                                map(tuple, np.asarray(greedy_actions)[fully_seen].tolist())))
+        # Actions of other states, filled on demand unless they depend on the raw inventory (base-stock fallback)
+        self._resolved = {}
+        self._states = None # Thermometer codes of the visited states, built when the nearest state fallback needs them
+
+    @classmethod
+    def from_agent(cls, agent, state_coder=None, **kwargs):
+        """
+        Build the inference policy of a trained agent.
+
+        Args:
+            agent (QLearning): The trained agent, any agent providing get_Q_entries.
+            state_coder (StateCoder): The coding of the agent's states, defaults to the paper's ranges.
+            **kwargs: Further arguments of InferencePolicy, e.g. fallback.
+
+        Returns:
+            InferencePolicy: The policy.
+        """
+        if state_coder is None:
+            state_coder = StateCoder(num_echelons=agent.num_agents)
+        fallback_action = kwargs.get("fallback_action")
+        arrays = policy_arrays(agent, state_coder, agent.actions[0] if fallback_action is None else fallback_action)
+        return cls(arrays["state_keys"], arrays["greedy_actions"], arrays["seen"], agent.actions, state_coder,
+                   **kwargs)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """
+        Build the inference policy of a policy file written by export_policy, reading the arrays from the mapped file.
+
+        Args:
+            path (str): The policy file.
+            **kwargs: Further arguments of InferencePolicy, fallback_action defaults to the one of the file.
+
+        Returns:
+            InferencePolicy: The policy.
+        """
+        policy = MappedPolicy(path)
+        kwargs.setdefault("fallback_action", policy.fallback_action)
+        return cls(policy.state_keys, policy.greedy_actions, policy.seen, policy.actions, policy.state_coder,
+                   **kwargs)
+
+    def order(self, inventory, backlog, incoming_orders=None):
+        """
+        Decide the orders of one site.
+
+        Args:
+            inventory (list): Inventory level per echelon.
+            backlog (list): Backlog per echelon.
+            incoming_orders (list): Order received by each echelon in this period (X in the X+Y rule).
+                If given the order quantities X + Y are returned instead of the actions Y.
+
+        Returns:
+            tuple: The action (or order quantity) of each echelon.
+        """
+        net_inventory = list(map(sub, inventory, backlog))
+        coded_state = self.state_coder.code(net_inventory)
+        key = self.state_coder.index(coded_state)
+        actions = self._greedy.get(key)
+        if actions is None:
+            actions = self._resolved.get(key)
+            if actions is None:
+                actions = tuple(self._decide(np.array([key], dtype=np.uint64), np.array([coded_state]),
+                                             np.array([net_inventory]))[0].tolist())
+                if self.fallback != "base_stock":
+                    self._resolved[key] = actions
+        if incoming_orders is None:
+            return actions
+        return tuple(map(add, incoming_orders, actions))
+
+    def order_batch(self, inventory, backlog, incoming_orders=None):
+        """
+        Decide the orders of many sites at once.
+
+        Args:
+            inventory (array-like): Inventory level per site and echelon, shape (n_sites, num_agents).
+            backlog (array-like): Backlog per site and echelon, shape (n_sites, num_agents).
+            incoming_orders (array-like): Order received by each echelon of each site in this period.
+                If given the order quantities X + Y are returned instead of the actions Y.
+
+        Returns:
+            np.ndarray: The action (or order quantity) of each echelon per site, shape (n_sites, num_agents).
+        """
+        net_inventory = np.asarray(inventory) - np.asarray(backlog)
+        net_inventory = net_inventory.reshape(-1, self.num_agents)
+        coded_states = self.state_coder.code_array(net_inventory)
+        keys = _state_keys(coded_states, self.state_coder.n_codes, self.num_agents)
+        if self.fallback == "base_stock":
+            actions = self._decide(keys, coded_states, net_inventory)
+        else:
+            # The actions only depend on the coded state, so sites in the same state are decided once
+            keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            actions = self._decide(keys, coded_states[first], net_inventory[first])[inverse.ravel()]
+        if incoming_orders is None:
+            return actions
+        return np.asarray(incoming_orders).reshape(actions.shape) + actions
+
+    def _decide(self, keys, coded_states, net_inventory):
+        # Greedy actions of the visited states, the fallback policy for the agents that have not visited them
+        actions = np.empty((len(keys), self.num_agents), dtype=np.int64)
+        rows = np.searchsorted(self.state_keys, keys)
+        found = rows < len(self.state_keys)
+        found[found] = self.state_keys[rows[found]] == keys[found]
+        rows = np.where(found, rows, 0)
+        if len(self.state_keys):
+            actions[:] = self.greedy_actions[rows]
+            missing = ~(found[:, None] & self.seen[rows])
+        else:
+            missing = np.ones(actions.shape, dtype=bool)
+        if missing.any():
+            queries, agents = np.nonzero(missing)
+            actions[queries, agents] = self._fallback_actions(queries, agents, coded_states, net_inventory)
+        return actions
+
+    def _fallback_actions(self, queries, agents, coded_states, net_inventory):
+        # Actions of the fallback policy for the given (query, agent) pairs
+        if self.fallback == "constant":
+            return self.fallback_action
+        if self.fallback == "base_stock":
+            targets = self.base_stock_levels[agents] - net_inventory[queries, agents]
+            # Closest action to the order-up-to quantity, ties go to the smaller action
+            columns = np.abs(self._action_values[None, :] - targets[:, None]).argmin(axis=1)
+            return self._action_values[columns]
+
+        if self._states is None:
+            self._states = self._thermometer(_key_states(self.state_keys, self.state_coder.n_codes, self.num_agents))
+        query_states = self._thermometer(coded_states)
+        fallback_actions = np.full(len(queries), self.fallback_action, dtype=np.int64)
+        for agent in np.unique(agents).tolist():
+            rows = np.flatnonzero(self.seen[:, agent])
+            if not len(rows):
+                continue
+            states = self._states[rows]
+            positions = np.flatnonzero(agents == agent)
+            chunk = max(NEAREST_CHUNK // len(rows), 1)
+            for start in range(0, len(positions), chunk):
+                part = query_states[queries[positions[start:start + chunk]]]
+                # The code steps between two states are the Hamming distance of their thermometer codes,
+                # |x| + |y| - 2 x.y, which one matrix product gives for all pairs
+                distances = part.sum(axis=1)[:, None] + states.sum(axis=1)[None, :] - 2 * part @ states.T
+                fallback_actions[positions[start:start + chunk]] = \
+                    self.greedy_actions[rows[distances.argmin(axis=1)], agent]
+        return fallback_actions
+
+    def _thermometer(self, coded_states):
+        # Code c of every echelon as c - 1 ones followed by zeros, as float32 for the matrix products
+        thresholds = np.arange(1, self.state_coder.n_codes)
+        coded_states = np.asarray(coded_states)
+        codes = coded_states[:, :, None] > thresholds
+        return codes.reshape(len(coded_states), self.num_agents * len(thresholds)).astype(np.float32)
@@ -0,0 +1,316 @@
+# Defining the Q-learning agent with a compiled training episode
+import numpy as np
+
+from agent.dense_q_learning import DenseQLearning
+from utils.jit import NUMBA_AVAILABLE, njit
+
+
+@njit(cache=True)
+def _code_state(inventory, backlog, bin_edges, n_codes, codes):
+    # Code the net inventory levels as StateCoder.code does and return the flat state index
+    index = 0
+    for i in range(inventory.shape[0]):
+        value = inventory[i] - backlog[i]
+        code = 1
+        for edge in bin_edges:
+            if edge < value:
+                code += 1
+        codes[i] = code
+        index = index * n_codes + code - 1
+    return index
+
+
+@njit(cache=True)
+def _step(t, actions, demand, lead_times, inventory, backlog, pending, owed, required, holding_costs, penalty_costs,
+          order, child_start, children, retailer_position, factory):
+    # One period of SupplyChainEnv.step on arrays, returns the reward
+    n_echelons = inventory.shape[0]
+    pipeline_length = pending.shape[1]
+    slot = t % pipeline_length
+    arrival_slot = (t + lead_times[t]) % pipeline_length
+
+    # Delivery Process
+    for i in range(n_echelons):
+        inventory[i] += pending[i, slot]
+        pending[i, slot] = 0
+
+    # Ordering Process, downstream echelons first
+    for k in range(n_echelons):
+        i = order[k]
+        first = child_start[i]
+        last = child_start[i + 1]
+        if first == last:
+            required[i] = demand[t, retailer_position[i]]
+        else:
+            total = 0
+            for j in range(first, last):
+                total += required[children[j]] + actions[children[j]]
+            required[i] = total
+
+        # Prioritize fulfilling backorders first
+        backorder_fulfilled = 0
+        if backlog[i] > 0:
+            if inventory[i] >= backlog[i]:
+                backorder_fulfilled = backlog[i]
+                inventory[i] -= backorder_fulfilled
+                backlog[i] = 0
+            else:
+                backorder_fulfilled = inventory[i]
+                backlog[i] -= backorder_fulfilled
+                inventory[i] = 0
+
+        # Attempt to fulfill the current required inventory
+        if inventory[i] >= required[i]:
+            order_fulfilled = required[i]
+        else:
+            order_fulfilled = inventory[i]
+            backlog[i] += required[i] - order_fulfilled
+        total_fulfilled = backorder_fulfilled + order_fulfilled
+        inventory[i] -= order_fulfilled
+
+        # Ship downstream, several downstream echelons are served in the order of their index up to what they are owed
+        if last - first == 1:
+            pending[children[first], arrival_slot] += total_fulfilled
+        else:
+            for j in range(first, last):
+                c = children[j]
+                owed[c] += required[c] + actions[c]
+                shipped = min(total_fulfilled, owed[c])
+                owed[c] -= shipped
+                total_fulfilled -= shipped
+                pending[c, arrival_slot] += shipped
+
+        # The factory can always produce the required amount
+        if i == factory:
+            required[n_echelons] = required[i] + actions[i]
+            pending[i, arrival_slot] += required[n_echelons]
+
+    # Delivery Process again, to account for lead times of zero
+    for i in range(n_echelons):
+        inventory[i] += pending[i, slot]
+        pending[i, slot] = 0
+
+    # Holding costs first, then penalty costs, summed in the same order as SupplyChainEnv.get_reward
+    holding_cost = 0
+    penalty_cost = 0
+    for i in range(n_echelons):
+        holding_cost += holding_costs[i] * max(0, inventory[i])
+    for i in range(n_echelons):
+        penalty_cost += penalty_costs[i] * max(0, backlog[i])
+    return -(holding_cost + penalty_cost)
+
+
+@njit(cache=True)
+def train_episode(values, visited, masked_values, seen, action_values, explore_draws, action_draws, epsilon_start,
+                  epsilon_decrement, alpha, gamma, demand, lead_times, inventory, backlog, pending, owed, required,
+                  holding_costs, penalty_costs, order, child_start, children, retailer_position, factory, bin_edges,
+                  log_states, log_actions, log_rewards, log_inventory, log_backlog):
+    """
+    Run one training episode of DenseQLearning on a SupplyChainEnv in a single compiled kernel.
+    The environment and Q-table arrays are updated in place, every step is written to the log arrays.
+
+    Args:
+        values, visited, masked_values, seen (np.ndarray): The state-major Q-table arrays of DenseQLearning.
+        action_values (np.ndarray): The possible actions.
+        explore_draws, action_draws (np.ndarray): Uniform draws of the epsilon-greedy choices, shape (T, num_agents).
+        epsilon_start (float): Exploration rate at the beginning of the episode.
+        epsilon_decrement (float): Decrease of the exploration rate per period.
+        alpha (float): Learning rate.
+        gamma (float): Discount factor.
+        demand (np.ndarray): Customer demand per period and retailer, shape (T, n_retailers).
+        lead_times (np.ndarray): Lead times per period.
+        inventory, backlog, pending, owed, required (np.ndarray): The environment state after reset.
+        holding_costs, penalty_costs (np.ndarray): Costs per unit and echelon, int64 or float64.
+        order, child_start, children, retailer_position (np.ndarray): The topology, with the downstream echelons
+            of echelon i in children[child_start[i]:child_start[i + 1]].
+        factory (int): Index of the factory.
+        bin_edges (np.ndarray): Bin edges of the state coding.
+        log_states, log_actions, log_rewards, log_inventory, log_backlog (np.ndarray): Log arrays, T + 1 rows
+            for the states, inventory levels and backlogs, T rows for the actions and rewards.
+
+    Returns:
+        int: The total reward of the episode, a float for float64 costs.
+    """
+    n_agents = inventory.shape[0]
+    n_actions = action_values.shape[0]
+    n_codes = bin_edges.shape[0] + 1
+    codes = np.empty(n_agents, dtype=np.int64)
+    columns = np.empty(n_agents, dtype=np.int64)
+    actions = np.empty(n_agents, dtype=np.int64)
+
+    index = _code_state(inventory, backlog, bin_edges, n_codes, codes)
+    epsilon = epsilon_start
+    total_reward = 0
+    for t in range(demand.shape[0]):
+        log_states[t] = codes
+        log_inventory[t] = inventory
+        log_backlog[t] = backlog
+
+        # a) Select an action using the epsilon-greedy policy, exploring unseen states
+        for a in range(n_agents):
+            if explore_draws[t, a] < epsilon or not seen[index, a]:
+                column = int(action_draws[t, a] * n_actions)
+            else:
+                column = 0
+                for b in range(1, n_actions):
+                    if masked_values[index, a, b] > masked_values[index, a, column]:
+                        column = b
+            columns[a] = column
+            actions[a] = action_values[column]
+        log_actions[t] = actions
+
+        # b) Calculate the next state and the reward
+        reward = _step(t, actions, demand, lead_times, inventory, backlog, pending, owed, required, holding_costs,
+                       penalty_costs, order, child_start, children, retailer_position, factory)
+        log_rewards[t] = reward
+        total_reward += reward
+        next_index = _code_state(inventory, backlog, bin_edges, n_codes, codes)
+
+        # c) Update the Q-tables, Q(s, a) = Q(s, a) + alpha * [reward + gamma * max_a' Q(s', a') - Q(s, a)]
+        for a in range(n_agents):
+            column = columns[a]
+            if not visited[index, a, column]:
+                visited[index, a, column] = True
+                seen[index, a] = True
+                masked_values[index, a, column] = values[index, a, column]
+            max_q_next = 0.0
+            if seen[next_index, a]:
+                max_q_next = -np.inf
+                for b in range(n_actions):
+                    max_q_next = max(max_q_next, masked_values[next_index, a, b])
+            old_value = values[index, a, column]
+            new_value = old_value + alpha * (reward + gamma * max_q_next - old_value)
+            values[index, a, column] = new_value
+            masked_values[index, a, column] = new_value
+
+        epsilon -= epsilon_decrement
+        index = next_index
+
+    log_states[demand.shape[0]] = codes
+    log_inventory[demand.shape[0]] = inventory
+    log_backlog[demand.shape[0]] = backlog
+    return total_reward
+
+
+class JitQLearning(DenseQLearning):
+    def __init__(self, actions, state_space, use_jit=None, **kwargs):
+        """
+        Initialize a dense Q-learning agent whose training episodes run in one compiled kernel,
+        covering the environment step, the epsilon-greedy choice and the update of the Q-tables.
+        Training gives exactly the same Q-tables and logs as DenseQLearning with the same seed.
+        Requires numba (pip install numba), without it the episodes run as in DenseQLearning.
+
+        Args:
+            actions (list): List of possible actions/action space.
+            state_space (list): List of all possible coded states, ordered as in data.test_problems.
+            use_jit (bool): Run the kernel, defaults to whether numba is installed.
+                Without numba the kernel runs as slow plain Python, which is only useful for checking it.
+            **kwargs: Further arguments of QLearning, e.g. alpha, gamma, max_iterations or num_agents.
+        """
+        super().__init__(actions, state_space, **kwargs)
+        self.use_jit = NUMBA_AVAILABLE if use_jit is None else use_jit
+        self._topology = None # Topology the cached topology arrays belong to
+        self._topology_arrays = None
+
+    def _get_topology_arrays(self, topology):
+        # Arrays describing the topology for the kernel, cached as they are the same for every episode
+        if topology is not self._topology:
+            child_start = np.cumsum([0] + [len(children) for children in topology.children])
+            children = np.array([c for children in topology.children for c in children], dtype=np.int64)
+            retailer_position = np.full(topology.num_echelons, -1, dtype=np.int64)
+            retailer_position[topology.retailers] = np.arange(len(topology.retailers))
+            self._topology_arrays = (np.array(topology.order, dtype=np.int64), child_start.astype(np.int64),
+                                     children, retailer_position, topology.factory)
+            self._topology = topology
+        return self._topology_arrays
+
+    def run_episode(self, env, epsilon_start, record=True):
+        """
+        Run one training episode, updating the Q-tables after every step.
+        The environment is left in the same state as after the episode of DenseQLearning.
+
+        Args:
+            env (SupplyChainEnv): The environment.
+            epsilon_start (float): Exploration rate at the beginning of the episode.
+            record (bool): Whether to build the log entries of the episode.
+
+        Returns:
+            tuple: The episode log (None if not recorded) and the total reward of the episode.
+        """
+        if not self.use_jit or len(env.state_coder.bin_edges) + 1 != self.n_codes:
+            return super().run_episode(env, epsilon_start, record)
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.mark()
+        env.reset()
+        horizon = self.time_horizon
+        topology = env.topology
+        # Demand and lead time of each period are read together, a scenario stream discards the periods of past chunks
+        demands = []
+        lead_times = []
+        for t in range(horizon):
+            demands.append(env.customer_demand[t])
+            lead_times.append(env.lead_times[t])
+        demand = np.broadcast_to(np.array(demands, dtype=np.int64).reshape(horizon, -1),
+                                 (horizon, len(topology.retailers)))
+        lead_times = np.array(lead_times, dtype=np.int64)
+        if lead_times.max(initial=0) > env.max_lead_time:
+            raise ValueError(f"Lead times exceed the maximum lead time of {env.max_lead_time}")
+
+        # Environment state after the reset
+        inventory = np.array(env.inventory_levels, dtype=np.int64)
+        backlog = np.array(env.order_backlog, dtype=np.int64)
+        pending = np.array(env.pending_orders, dtype=np.int64)
+        owed = np.array(env.owed, dtype=np.int64)
+        required = np.array(env.required_inventory, dtype=np.int64)
+
+        # The same draws as choose_action makes in every period
+        draws = self.rng.rand(horizon, 2, self.num_agents)
+        log_states = np.empty((horizon + 1, self.num_agents), dtype=np.int64)
+        log_actions = np.empty((horizon, self.num_agents), dtype=np.int64)
+        # Integer costs give integer rewards as in SupplyChainEnv, any fractional cost makes them floats
+        cost_dtype = np.int64
+        if not all(float(cost).is_integer() for cost in list(env.holding_costs) + list(env.penalty_costs)):
+            cost_dtype = np.float64
+        log_rewards = np.empty(horizon, dtype=cost_dtype)
+        log_inventory = np.empty((horizon + 1, self.num_agents), dtype=np.int64)
+        log_backlog = np.empty((horizon + 1, self.num_agents), dtype=np.int64)
+
+        total_reward = train_episode(
+            self._values, self._visited, self._masked_values, self._seen, self._action_values.astype(np.int64),
+            np.ascontiguousarray(draws[:, 0]), np.ascontiguousarray(draws[:, 1]), float(epsilon_start),
+            (epsilon_start - self.epsilon_final) / horizon, float(self.alpha), float(self.gamma),
+            np.ascontiguousarray(demand), lead_times, inventory, backlog, pending, owed, required,
+            np.asarray(env.holding_costs, dtype=cost_dtype), np.asarray(env.penalty_costs, dtype=cost_dtype),
+            *self._get_topology_arrays(topology), np.asarray(env.state_coder.bin_edges, dtype=np.float64),
+            log_states, log_actions, log_rewards, log_inventory, log_backlog)
+
+        if profiler is not None:
+            profiler.lap("episode_kernel")
+
+        # Leave the environment at the end of the episode
+        env.inventory_levels = inventory.tolist()
+        env.order_backlog = backlog.tolist()
+        env.pending_orders = pending.tolist()
+        env.owed = owed.tolist()
+        env.required_inventory = required.tolist()
+        env.current_time = horizon
+        env.update_costs()
+        env.state_index = int(self.state_index(log_states[horizon].tolist()))
+
+        episode_log = None
+        if record:
+            states = [tuple(state) for state in log_states.tolist()]
+            actions = [tuple(action_vector) for action_vector in log_actions.tolist()]
+            rewards = [0] + log_rewards.tolist()
+            inventories = log_inventory.tolist()
+            backlogs = log_backlog.tolist()
+            episode_log = [(states[t], actions[t], rewards[t], demands[t], inventories[t], backlogs[t])
+                           for t in range(horizon)]
+            # Loging the final state of each episode
+            episode_log.append((states[horizon], actions[horizon - 1], rewards[horizon], 0, inventories[horizon],
+                                backlogs[horizon]))
+            if profiler is not None:
+                profiler.lap("logging")
+        return episode_log, float(total_reward) if cost_dtype is np.float64 else int(total_reward)
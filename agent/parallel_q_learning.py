@@ -0,0 +1,219 @@
+# Training one set of dense Q-tables with several worker processes sharing them in memory
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from agent.checkpoint import load_checkpoint, save_checkpoint
+from agent.jit_q_learning import JitQLearning
+from environment.supply_chain import SupplyChainEnv
+from utils.log_sinks import MemorySink
+from utils.profiling import profiled
+
+_worker = {} # Agent, environment and shared memory blocks of a worker process
+
+
+def _env_arguments(env):
+    # Arguments to rebuild an environment in a worker, a lazily drawn scenario stream cannot be pickled
+    return {
+        "initial_inventory": env.initial_inventory,
+        "holding_costs": env.holding_costs,
+        "penalty_costs": env.penalty_costs,
+        "customer_demand": None if env.scenarios is not None else env.customer_demand,
+        "lead_times": None if env.scenarios is not None else env.lead_times,
+        "max_lead_time": env.max_lead_time,
+        "state_coder": env.state_coder,
+        "scenarios": env.scenarios,
+        "topology": env.topology,
+    }
+
+
+def _init_worker(agent_arguments, env_arguments, tables):
+    # Build the worker's agent on the shared Q-tables and its own copy of the environment
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in tables]
+    agent = JitQLearning(**agent_arguments)
+    agent._bind_tables(*[np.ndarray(shape, dtype=dtype, buffer=block.buf)
+                         for block, (_, shape, dtype) in zip(blocks, tables)])
+    _worker.update(agent=agent, env=SupplyChainEnv(**env_arguments), blocks=blocks)
+
+
+def _run_episodes(iterations, epsilons, records, seed):
+    """
+    Run training episodes in a worker process, writing the updates straight into the shared Q-tables.
+
+    Args:
+        iterations (list): The training iterations of the episodes.
+        epsilons (list): Exploration rate at the beginning of each episode.
+        records (list): Whether to build the log entries of each episode.
+        seed (int): Seed of the exploration and of the scenarios drawn by the episodes.
+
+    Returns:
+        list: The iteration, the episode log (None if not recorded) and the total reward of each episode.
+    """
+    agent, env = _worker["agent"], _worker["env"]
+    agent.rng = np.random.RandomState(seed)
+    if env.scenarios is not None:
+        env.scenarios.rng = np.random.default_rng(seed)
+    results = []
+    for iteration, epsilon_start, record in zip(iterations, epsilons, records):
+        episode_log, total_reward = agent.run_episode(env, epsilon_start, record=record)
+        results.append((iteration, episode_log, total_reward))
+    return results
+
+
+class ParallelQLearning(JitQLearning):
+    def __init__(self, actions, state_space, num_workers=None, sync_every=1000, **kwargs):
+        """
+        Initialize a dense Q-learning agent whose training episodes run in several worker processes.
+        The Q-tables are kept in shared memory, every worker runs episodes against its own copy of the environment
+        and applies its updates directly to the shared tables without locks (Hogwild). The order of the updates
+        then depends on the scheduling of the processes, so only training with one worker is reproducible,
+        it runs in the calling process exactly as JitQLearning.train.
+
+        Args:
+            actions (list): List of possible actions/action space.
+            state_space (list): List of all possible coded states, ordered as in data.test_problems.
+            num_workers (int): Number of worker processes, defaults to the number of CPUs.
+            sync_every (int): Number of iterations per round. The workers' episode rewards and logs are collected
+                after every round, rounds also end at checkpoints and at the checks of a convergence monitor.
+            **kwargs: Further arguments of JitQLearning, e.g. alpha, gamma, max_iterations, seed or use_jit.
+        """
+        super().__init__(actions, state_space, **kwargs)
+        self.num_workers = os.cpu_count() if num_workers is None else num_workers
+        self.sync_every = sync_every
+
+    def _agent_arguments(self):
+        # Arguments to build the same agent in a worker, its Q-tables are replaced by the shared ones
+        return {
+            "actions": self.actions,
+            "state_space": self.state_space,
+            "time_horizon": self.time_horizon,
+            "alpha": self.alpha,
+            "gamma": self.gamma,
+            "epsilon_final": self.epsilon_final,
+            "num_agents": self.num_agents,
+            "use_jit": self.use_jit,
+        }
+
+    def _share_tables(self):
+        # Move the Q-tables into shared memory blocks
+        blocks = []
+        tables = []
+        for array in (self._values, self._visited, self._masked_values, self._seen):
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            blocks.append(block)
+            tables.append(shared)
+        self._bind_tables(*tables)
+        return blocks
+
+    def _unshare_tables(self, blocks):
+        # Copy the Q-tables back into private memory and release the shared memory blocks
+        self._bind_tables(self._values.copy(), self._visited.copy(), self._masked_values.copy(), self._seen.copy())
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    def _round_end(self, iteration, checkpoint_every, monitor):
+        # First iteration after the round starting at iteration, rounds end where the main process needs the tables
+        periods = [self.sync_every, checkpoint_every]
+        if monitor is not None:
+            periods += [monitor.check_every, monitor.evaluate_every]
+        return min([self.max_iterations] + [(iteration // period + 1) * period for period in periods if period])
+
+    @profiled("train")
+    def train(self, env, log_sink=None, checkpoint_path=None, checkpoint_every=None, resume=False, monitor=None):
+        """
+        Train the Q-learning agent, see QLearning.train.
+        With several workers the episodes of each round are spread over the worker processes, every worker draws
+        its exploration and scenarios from a seed taken from the agent's random number generator. The episodes are
+        handed to the log sink and the monitor in the order of their iterations after each round.
+
+        Args:
+            env (SupplyChainEnv): The environment, the workers run on copies of it.
+            log_sink (MemorySink): Sink that decides which episodes are logged and where, see utils.log_sinks.
+                If None, every episode is kept in memory.
+            checkpoint_path (str): Checkpoint file (.npz), written every checkpoint_every iterations and at the end.
+            checkpoint_every (int): Number of iterations between two checkpoints, None for the final one only.
+            resume (bool): Continue from the checkpoint file if it exists, the logs then cover the remaining iterations.
+            monitor (ConvergenceMonitor): Tracks convergence and may stop training before max_iterations.
+
+        Returns:
+            tuple: Logs of the training process (the list of episode logs, or the log sink if one was given)
+                and the log of the simulation after training.
+
+        Raises:
+            ValueError: If checkpoint_every is given without checkpoint_path.
+        """
+        if checkpoint_every and checkpoint_path is None:
+            raise ValueError("checkpoint_every requires a checkpoint_path")
+        if self.num_workers == 1:
+            return super().train(env, log_sink=log_sink, checkpoint_path=checkpoint_path,
+                                 checkpoint_every=checkpoint_every, resume=resume, monitor=monitor)
+
+        sink = MemorySink() if log_sink is None else log_sink
+        epsilon_decrement_outer = (self.epsilon_start - self.epsilon_end) / self.max_iterations
+        new_epsilon_start = self.epsilon_start
+        start_iteration = 0
+        if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+            start_iteration, new_epsilon_start = load_checkpoint(self, checkpoint_path, env)
+        completed_iterations = start_iteration
+
+        profiler = self.profiler
+        blocks = self._share_tables()
+        try:
+            tables = [(block.name, array.shape, array.dtype) for block, array in
+                      zip(blocks, (self._values, self._visited, self._masked_values, self._seen))]
+            with ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker,
+                                     initargs=(self._agent_arguments(), _env_arguments(env), tables)) as executor:
+                iteration = start_iteration
+                stopped = False
+                while iteration < self.max_iterations and not stopped:
+                    round_end = self._round_end(iteration, checkpoint_every, monitor)
+                    if profiler is not None:
+                        num_states = self.num_Q_states()
+                        profiler.mark()
+                    # Exploration rate at the beginning of every iteration of the round, as the serial schedule
+                    epsilons = []
+                    for _ in range(iteration, round_end):
+                        epsilons.append(new_epsilon_start)
+                        new_epsilon_start -= epsilon_decrement_outer
+                    records = [sink.wants(i) for i in range(iteration, round_end)]
+                    seeds = self.rng.randint(2 ** 31, size=self.num_workers).tolist()
+                    # Every worker takes every num_workers-th iteration of the round
+                    futures = [
+                        executor.submit(_run_episodes, list(range(iteration + k, round_end, self.num_workers)),
+                                        epsilons[k::self.num_workers], records[k::self.num_workers], seeds[k])
+                        for k in range(self.num_workers)
+                    ]
+                    results = sorted((result for future in futures for result in future.result()),
+                                     key=lambda result: result[0])
+                    if profiler is not None:
+                        profiler.lap("episodes")
+                        profiler.count("episodes", len(results))
+                        profiler.count("steps", len(results) * self.time_horizon)
+                        profiler.count("Q_table_growth", self.num_Q_states() - num_states)
+
+                    for result_iteration, episode_log, total_reward in results:
+                        sink.add_episode(result_iteration, episode_log, total_reward)
+                        completed_iterations = result_iteration + 1
+                        if monitor is not None and monitor.update(self, env, result_iteration, total_reward):
+                            stopped = True
+                    if profiler is not None:
+                        profiler.lap("log_sink")
+                    if checkpoint_every and completed_iterations % checkpoint_every == 0:
+                        save_checkpoint(self, checkpoint_path, completed_iterations, new_epsilon_start, env)
+                    iteration = round_end
+        finally:
+            self._unshare_tables(blocks)
+
+        sink.close()
+        if checkpoint_path is not None:
+            save_checkpoint(self, checkpoint_path, completed_iterations, new_epsilon_start, env)
+
+        # Run simulation after training is complete
+        simulation_log = self.simulation(env)
+
+        return (sink.logs if log_sink is None else sink), simulation_log
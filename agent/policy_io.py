@@ -0,0 +1,231 @@
+# Exporting learned policies to a memory-mappable binary file and answering queries straight from the file
+import json
+import os
+
+import numpy as np
+
+from agent.policy_reader import _PREAMBLE, FORMAT_VERSION, MAGIC, read_header
+from environment.state_coding import StateCoder
+
+ALIGNMENT = 64 # Byte alignment of the arrays in the file
+
+
+def _state_keys(states, n_codes, num_echelons):
+    # Flat state indices as in StateCoder.index, computed in uint64 so long supply chains do not overflow
+    states = np.asarray(states, dtype=np.uint64).reshape(-1, num_echelons)
+    weights = np.array([n_codes ** (num_echelons - 1 - i) for i in range(num_echelons)], dtype=np.uint64)
+    return ((states - np.uint64(1)) * weights).sum(axis=1, dtype=np.uint64)
+
+
+def _key_states(state_keys, n_codes, num_echelons):
+    # Coded states of flat state indices, the inverse of _state_keys
+    state_keys = np.asarray(state_keys, dtype=np.uint64)
+    states = np.empty((len(state_keys), num_echelons), dtype=np.int64)
+    for i in range(num_echelons - 1, -1, -1):
+        states[:, i] = (state_keys % np.uint64(n_codes)).astype(np.int64) + 1
+        state_keys = state_keys // np.uint64(n_codes)
+    return states
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def policy_arrays(agent, state_coder, fallback_action, q_dtype=np.float32):
+    """
+    Collect the greedy policy and the Q-values of an agent's visited states, sorted by flat state index.
+
+    Args:
+        agent (QLearning): The trained agent, any agent providing get_Q_entries.
+        state_coder (StateCoder): The coding of the agent's states.
+        fallback_action (int): Action for states an agent has not visited.
+        q_dtype (np.dtype): Type of the Q-values.
+
+    Returns:
+        dict: The arrays state_keys, greedy_actions, seen, q_values and visited, one row per visited state.
+    """
+    num_agents = agent.num_agents
+    action_values = np.asarray(agent.actions)
+
+    # One row per visited state, holding the Q-values of every agent and action
+    entries = agent.get_Q_entries()
+    state_keys, rows = np.unique(_state_keys(entries["Q_states"], state_coder.n_codes, num_agents),
+                                 return_inverse=True)
+    rows = rows.ravel()
+    action_columns = {action: column for column, action in enumerate(agent.actions)}
+    columns = np.array([action_columns[action] for action in entries["Q_actions"].tolist()], dtype=np.intp)
+    visited = np.zeros((len(state_keys), num_agents, len(action_values)), dtype=bool)
+    visited[rows, entries["Q_agents"], columns] = True
+    values = np.zeros(visited.shape, dtype=np.float64)
+    values[rows, entries["Q_agents"], columns] = entries["Q_values"]
+
+    # Best visited action per state and agent, unvisited actions never win. The full precision values decide,
+    # as in choose_greedy, rounding to q_dtype could turn them into ties won by the first action
+    seen = visited.any(axis=2)
+    greedy = np.where(visited, values, -np.inf).argmax(axis=2)
+    greedy_actions = np.where(seen, action_values[greedy], fallback_action).astype(np.int64)
+    return {"state_keys": state_keys, "greedy_actions": greedy_actions, "seen": seen,
+            "q_values": values.astype(q_dtype), "visited": visited}
+
+
+def export_policy(agent, path, state_coder=None, fallback_action=None, q_dtype=np.float32):
+    """
+    Write the greedy policy and the Q-values of an agent's visited states to a memory-mappable binary file.
+    The file starts with the magic bytes, the format version and a JSON header carrying the state coding,
+    the action set and the echelon count, followed by aligned arrays over the visited states sorted by state index.
+    The file is replaced atomically, as in save_checkpoint.
+
+    Args:
+        agent (QLearning): The trained agent, any agent providing get_Q_entries.
+        path (str): The policy file.
+        state_coder (StateCoder): The coding of the agent's states, defaults to the paper's ranges.
+        fallback_action (int): Action for states an agent has not visited, defaults to the first action.
+        q_dtype (np.dtype): Type of the stored Q-values.
+    """
+    num_agents = agent.num_agents
+    if state_coder is None:
+        state_coder = StateCoder(num_echelons=num_agents)
+    if fallback_action is None:
+        fallback_action = agent.actions[0]
+    arrays = policy_arrays(agent, state_coder, fallback_action, q_dtype)
+    header = {
+        "num_agents": int(num_agents),
+        "actions": np.asarray(agent.actions).tolist(),
+        "bin_edges": np.asarray(state_coder.bin_edges).tolist(),
+        "fallback_action": int(fallback_action),
+        "num_states": len(arrays["state_keys"]),
+        "arrays": {},
+    }
+    # The array offsets are part of the header, so its length is fixed first with placeholder offsets
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+    header_length = _align(_PREAMBLE.size + len(json.dumps(header)) + 20 * len(arrays)) - _PREAMBLE.size
+    offset = _PREAMBLE.size + header_length
+    for name, array in arrays.items():
+        header["arrays"][name]["offset"] = offset
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode()
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_length))
+        file.write(header_bytes.ljust(header_length))
+        for name, array in arrays.items():
+            file.seek(header["arrays"][name]["offset"])
+            file.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temporary_path, path)
+
+
+class MappedPolicy:
+    def __init__(self, path):
+        """
+        A greedy policy answered straight from a memory-mapped file written by export_policy.
+        Opening the file only reads the header, the operating system shares the mapped arrays between processes,
+        and a pickled MappedPolicy reopens the file instead of copying the arrays.
+
+        Args:
+            path (str): The policy file.
+        """
+        self.path = path
+        header = read_header(path)
+        self.version = header["version"]
+        self.num_agents = header["num_agents"]
+        self.actions = header["actions"]
+        self.fallback_action = header["fallback_action"]
+        self.state_coder = StateCoder(header["bin_edges"], num_echelons=self.num_agents)
+        arrays = {
+            name: np.memmap(path, dtype=np.dtype(layout["dtype"]), mode="r", offset=layout["offset"],
+                            shape=tuple(layout["shape"]))
+            if np.prod(layout["shape"]) > 0 else np.empty(layout["shape"], dtype=np.dtype(layout["dtype"]))
+            for name, layout in header["arrays"].items()
+        }
+        self.state_keys = arrays["state_keys"] # Flat index of each stored state, sorted
+        self.greedy_actions = arrays["greedy_actions"] # Action of each agent per stored state
+        self.seen = arrays["seen"] # Whether each agent had visited the state
+        self.q_values = arrays["q_values"] # Q-values per stored state, agent and action
+        self.visited = arrays["visited"] # Whether each state-action pair was visited
+        self._fallback = np.full(self.num_agents, self.fallback_action, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.state_keys)
+
+    def __reduce__(self):
+        return MappedPolicy, (self.path,)
+
+    def find(self, state_keys):
+        """
+        Find the rows of states by their flat indices.
+
+        Args:
+            state_keys (np.ndarray): Flat state indices of any shape.
+
+        Returns:
+            np.ndarray: The rows with the same shape, -1 for states that are not stored.
+        """
+        state_keys = np.asarray(state_keys, dtype=np.uint64)
+        rows = np.searchsorted(self.state_keys, state_keys)
+        found = rows < len(self.state_keys)
+        found[found] = self.state_keys[rows[found]] == state_keys[found]
+        return np.where(found, rows, -1)
+
+    def lookup(self, state_indices):
+        """
+        Look up the actions for many states at once, as CompiledPolicy.lookup.
+
+        Args:
+            state_indices (np.ndarray): Flat state indices of any shape.
+
+        Returns:
+            np.ndarray: The actions with shape state_indices.shape + (num_agents,).
+        """
+        rows = self.find(state_indices)
+        if not len(self.state_keys):
+            return np.broadcast_to(self._fallback, rows.shape + (self.num_agents,)).copy()
+        return np.where((rows >= 0)[..., None], self.greedy_actions[np.maximum(rows, 0)], self._fallback)
+
+    def state_key(self, state):
+        """
+        Compute the flat index of a coded state.
+
+        Args:
+            state (tuple): The coded state.
+
+        Returns:
+            int: The flat state index.
+        """
+        return self.state_coder.index(state)
+
+    def choose_greedy(self, state):
+        """
+        Choose the actions for a coded state, as QLearning.choose_greedy but without randomness.
+        Agents that have not visited the state take the fallback action.
+
+        Args:
+            state (tuple): The coded state.
+
+        Returns:
+            tuple: The chosen actions as a vector.
+        """
+        key = self.state_key(state)
+        row = int(np.searchsorted(self.state_keys, np.uint64(key)))
+        if row < len(self.state_keys) and int(self.state_keys[row]) == key:
+            return tuple(self.greedy_actions[row].tolist())
+        return tuple(self._fallback.tolist())
+
+    def get_Q_entries(self):
+        """
+        Flatten the stored Q-values into the entries of QLearning.get_Q_entries, e.g. to warm start an agent
+        with set_Q_entries.
+
+        Returns:
+            dict: The arrays Q_agents, Q_states (entries x echelons), Q_actions and Q_values.
+        """
+        rows, agents, columns = np.nonzero(self.visited)
+        states = _key_states(self.state_keys[rows], self.state_coder.n_codes, self.num_agents)
+        return {
+            "Q_agents": agents.astype(np.int32),
+            "Q_states": states.astype(np.int16),
+            "Q_actions": np.asarray(self.actions)[columns].astype(np.int32),
+            "Q_values": self.q_values[rows, agents, columns].astype(np.float64),
+        }
@@ -0,0 +1,200 @@
+# Reading greedy actions from policy files with the standard library only, for processes that must start quickly
+import bisect
+import json
+import mmap
+import struct
+from operator import add, sub
+
+MAGIC = b"BGRLPOL\0" # First bytes of every policy file
+FORMAT_VERSION = 1
+
+# Magic, format version and length of the JSON header in bytes
+_PREAMBLE = struct.Struct("<8sII")
+
+# struct formats of the array types in policy files
+_FORMATS = {"<u8": "Q", "<i8": "q", "|b1": "?"}
+
+# Policies for the agents that have not visited a state, as agent.inference.FALLBACKS
+FALLBACKS = ("constant", "nearest", "base_stock")
+
+
+def read_header(path):
+    """
+    Read the header of a policy file written by agent.policy_io.export_policy.
+
+    Args:
+        path (str): The policy file.
+
+    Returns:
+        dict: The header, including the format version.
+    """
+    with open(path, "rb") as file:
+        preamble = file.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError(f"{path} is not a policy file")
+        magic, version, header_length = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a policy file")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, this version reads up to {FORMAT_VERSION}")
+        header = json.loads(file.read(header_length).decode())
+    header["version"] = version
+    return header
+
+
+class PolicyReader:
+    def __init__(self, path, fallback="constant", base_stock_levels=None):
+        """
+        Answer greedy queries from a policy file by binary search in the memory-mapped file, without NumPy.
+        Importing NumPy takes longer than a single query, so short-lived processes such as the evaluate and infer
+        commands of main.py use this reader. The fallback policies of order are those of
+        agent.inference.InferencePolicy, the nearest state fallback scans all stored states in Python though,
+        so InferencePolicy is faster for many queries on large policies. choose_greedy always takes the fallback
+        action of the file for agents that have not visited a state, as MappedPolicy.choose_greedy.
+
+        Args:
+            path (str): The policy file.
+            fallback (str): Policy of order for agents that have not visited the state, one of FALLBACKS.
+            base_stock_levels (list): Base-stock level per echelon, required by the base-stock fallback.
+        """
+        if fallback not in FALLBACKS:
+            raise ValueError(f"Unknown fallback {fallback!r}, expected one of {FALLBACKS}")
+        if fallback == "base_stock" and base_stock_levels is None:
+            raise ValueError("The base-stock fallback requires base_stock_levels")
+        header = read_header(path)
+        self.path = path
+        self.num_agents = header["num_agents"]
+        self.actions = header["actions"]
+        self.fallback_action = header["fallback_action"]
+        self.bin_edges = header["bin_edges"]
+        self.n_codes = len(self.bin_edges) + 1
+        self.num_states = header["num_states"]
+        self.fallback = fallback
+        self.base_stock_levels = None if base_stock_levels is None else list(base_stock_levels)
+        self._stored = None # Coded state, seen flags and greedy actions per stored state, for the nearest fallback
+        self._layout = {}
+        for name in ("state_keys", "greedy_actions", "seen"):
+            layout = header["arrays"][name]
+            if layout["dtype"] not in _FORMATS:
+                raise ValueError(f"Unsupported type {layout['dtype']} of {name} in {path}")
+            row_format = struct.Struct(f"<{self.num_agents if name != 'state_keys' else 1}{_FORMATS[layout['dtype']]}")
+            self._layout[name] = (layout["offset"], row_format)
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.num_states else b""
+
+    def close(self):
+        """
+        Release the mapped file.
+        """
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def _row(self, name, row):
+        # Unpack one row of an array in the file
+        offset, row_format = self._layout[name]
+        return row_format.unpack_from(self._map, offset + row * row_format.size)
+
+    def code(self, net_inventory):
+        """
+        Code net inventory levels as environment.state_coding.StateCoder.code does.
+
+        Args:
+            net_inventory (list): Inventory level minus backlog per echelon.
+
+        Returns:
+            tuple: The coded state.
+        """
+        return tuple([bisect.bisect_left(self.bin_edges, value) + 1 for value in net_inventory])
+
+    def find(self, coded_state):
+        """
+        Find the row of a coded state in the file.
+
+        Args:
+            coded_state (tuple): The coded state.
+
+        Returns:
+            int: The row, -1 if no agent has visited the state.
+        """
+        key = 0
+        for code in coded_state:
+            key = key * self.n_codes + code - 1
+        low, high = 0, self.num_states
+        while low < high:
+            middle = (low + high) // 2
+            if self._row("state_keys", middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.num_states and self._row("state_keys", low)[0] == key:
+            return low
+        return -1
+
+    def choose_greedy(self, coded_state):
+        """
+        Choose the actions for a coded state, as agent.policy_io.MappedPolicy.choose_greedy.
+
+        Args:
+            coded_state (tuple): The coded state.
+
+        Returns:
+            tuple: The chosen actions as a vector.
+        """
+        row = self.find(coded_state)
+        if row == -1:
+            return (self.fallback_action,) * self.num_agents
+        return self._row("greedy_actions", row)
+
+    def order(self, inventory, backlog, incoming_orders=None):
+        """
+        Decide the orders of one site, as agent.inference.InferencePolicy.order with the reader's fallback.
+
+        Args:
+            inventory (list): Inventory level per echelon.
+            backlog (list): Backlog per echelon.
+            incoming_orders (list): Order received by each echelon in this period (X in the X+Y rule).
+                If given the order quantities X + Y are returned instead of the actions Y.
+
+        Returns:
+            tuple: The action (or order quantity) of each echelon.
+        """
+        net_inventory = list(map(sub, inventory, backlog))
+        coded_state = self.code(net_inventory)
+        # One lookup serves the greedy actions and the seen flags
+        row = self.find(coded_state)
+        if row == -1:
+            actions, seen = (self.fallback_action,) * self.num_agents, (False,) * self.num_agents
+        else:
+            actions = self._row("greedy_actions", row)
+            seen = self._row("seen", row) if self.fallback != "constant" else None
+        if self.fallback != "constant" and not all(seen):
+            actions = tuple([action if agent_seen else self._fallback_action(agent, coded_state, net_inventory)
+                             for agent, (action, agent_seen) in enumerate(zip(actions, seen))])
+        if incoming_orders is None:
+            return actions
+        return tuple(map(add, incoming_orders, actions))
+
+    def _fallback_action(self, agent, coded_state, net_inventory):
+        # Action of the nearest state or base-stock fallback for an agent that has not visited the state
+        if self.fallback == "base_stock":
+            target = self.base_stock_levels[agent] - net_inventory[agent]
+            # Closest action to the order-up-to quantity, ties go to the smaller action
+            return min(sorted(self.actions), key=lambda action: abs(action - target))
+
+        if self._stored is None:
+            self._stored = []
+            for row in range(self.num_states):
+                key = self._row("state_keys", row)[0]
+                codes = []
+                for _ in range(self.num_agents):
+                    key, code = divmod(key, self.n_codes)
+                    codes.append(code + 1)
+                self._stored.append((codes[::-1], self._row("seen", row), self._row("greedy_actions", row)))
+        # Fewest code steps summed over the echelons, ties go to the smaller state index
+        best_action, best_distance = self.fallback_action, None
+        for codes, seen, greedy_actions in self._stored:
+            if seen[agent]:
+                distance = sum([abs(code - query) for code, query in zip(codes, coded_state)])
+                if best_distance is None or distance < best_distance:
+                    best_action, best_distance = greedy_actions[agent], distance
+        return best_action
@@ -1,9 +1,16 @@
+import os
+
 import numpy as np
 
+from agent.checkpoint import load_checkpoint, save_checkpoint
+from utils.log_sinks import MemorySink
+from utils.profiling import profiled
+
 # Defining the Q-learning agent, RL algorithm
 class QLearning:
     def __init__(self, actions, state_space, time_horizon=35, alpha=0.17, gamma=1, epsilon_start=0.98, epsilon_end=0.1,
-                 epsilon_final=0.02, max_iterations=1, num_agents=4):
+                 epsilon_final=0.02, max_iterations=1, num_agents=None, seed=None,
+                 profiler=None):
         """
         Initialize the Q-learning agent.
 
@@ -17,8 +24,13 @@ class QLearning:
             max_iterations (int): Maximum number of iterations for training.
             actions (list): List of possible actions/action space.
             state_space (list): List of all possible states.
-            num_agents (int): Number of agents in the supply chain, default 4, see beer game.
+            num_agents (int): Number of agents in the supply chain, one per echelon. Defaults to the length of the
+                states in state_space, e.g. 4 for the beer game.
+            seed (int): Seed of the agent's own random number generator, uses the global NumPy state if None.
+            profiler (Profiler): Collects phase timings and counters of train and simulation, see utils.profiling.
         """
+        if num_agents is None:
+            num_agents = len(state_space[0])
         # Initialize Q-table as a List of dictionaries
         self.Q_tables = [{} for _ in range(num_agents)]  # One Q-table per agent
         self.alpha = alpha # Learning rate
@@ -31,6 +43,8 @@ class QLearning:
         self.state_space = state_space # List of all possible states
         self.num_agents = num_agents # Number of agents in the supply chain
         self.time_horizon = time_horizon
+        self.rng = np.random if seed is None else np.random.RandomState(seed) # Random number generator for exploration
+        self.profiler = profiler # Optional timing of the training phases
 
     def choose_action(self, state, epsilon):
         """
@@ -49,13 +63,15 @@ class QLearning:
         for agent in range(self.num_agents):
 
             # Exploration: choose a random action
-            if np.random.rand() < epsilon:
-                action = int(np.random.choice(self.actions))
+            if self.rng.rand() < epsilon:
+                action = int(self.rng.choice(self.actions))
             
             # Exploitation: choose the best action based on the agent's Q-table
             else:
                 if state not in self.Q_tables[agent] or not self.Q_tables[agent][state]:
-                    action = int(np.random.choice(self.actions))
+                    action = int(self.rng.choice(self.actions))
+                    if self.profiler is not None:
+                        self.profiler.count("unseen_state_fallbacks")
                 else:
                     action = max(self.Q_tables[agent][state], key=self.Q_tables[agent][state].get)
             action_vector.append(action)
@@ -78,7 +94,9 @@ class QLearning:
 
         for agent in range(self.num_agents):
             if state not in self.Q_tables[agent] or not self.Q_tables[agent][state]:
-                action = int(np.random.choice(self.actions))
+                action = int(self.rng.choice(self.actions))
+                if self.profiler is not None:
+                    self.profiler.count("unseen_state_fallbacks")
             else:
                 action = max(self.Q_tables[agent][state], key=self.Q_tables[agent][state].get)
             action_vector.append(action)
@@ -122,78 +140,211 @@ class QLearning:
             self.Q_tables[agent][state][action] = new_value
 
 
-    def train(self, env):
+    def init_Q_entries(self, state, action_vector, next_state):
         """
-        Train the Q-learning agent.
+        Add default entries to the Q-tables for a transition that is about to be updated.
 
         Args:
-            env (SupplyChainEnv): The environment.
+            state (tuple): The current state.
+            action_vector (tuple): The actions taken.
+            next_state (tuple): The next state.
+        """
+        for agent in range(self.num_agents):
+            action = action_vector[agent]
+
+            # Fill Q-table with default values if not present
+            if state not in self.Q_tables[agent]:
+                self.Q_tables[agent][state] = {}
+            if action not in self.Q_tables[agent][state]:
+                self.Q_tables[agent][state][action] = 0
+
+            if next_state not in self.Q_tables[agent]:
+                self.Q_tables[agent][next_state] = {}
+
+
+    def num_Q_states(self):
+        """
+        Number of states held in the Q-tables, summed over the agents.
 
         Returns:
-            list: Logs of the training process.
+            int: The number of states.
         """
+        return sum(len(Q_table) for Q_table in self.Q_tables)
 
-        logs = []
-        # Linearly decrease epsilon within the iteration - increasing exploitation
-        epsilon_decrement_outer = (self.epsilon_start - self.epsilon_end) / self.max_iterations
-        new_epsilon_start = self.epsilon_start
-        for iteration in range(self.max_iterations):
-            state = env.reset()
-            t = 0
-            episode_log = []
-            # Linearly decrease epsilon within the period - increasing exploitation
-            epsilon_decrement = (new_epsilon_start - self.epsilon_final) / self.time_horizon
-            epsilon = new_epsilon_start
-            reward = 0
-            while t < self.time_horizon:
-                # a) Select an action using the epsilon-greedy policy
-                action_vector = self.choose_action(state, epsilon)
-
-                # Log for each timestamp during training
-                episode_log.append((state, action_vector, reward, env.customer_demand[t], list(env.inventory_levels), list(env.order_backlog)))
-                
-                # b) Caclulate the next state and the reward - includes doing action & doing state vector
-                next_state, reward = env.step(action_vector)
 
-                # Update Q-table for each agent
-                for agent in range(self.num_agents):
-                    action = action_vector[agent]
+    def get_Q_entries(self):
+        """
+        Flatten the Q-tables into arrays with one entry per visited state-action pair, e.g. for checkpoints.
+
+        Returns:
+            dict: The arrays Q_agents, Q_states (entries x echelons), Q_actions and Q_values.
+        """
+        agents, states, actions, values = [], [], [], []
+        for agent in range(self.num_agents):
+            for state, action_values in self.Q_tables[agent].items():
+                for action, value in action_values.items():
+                    agents.append(agent)
+                    states.append(state)
+                    actions.append(action)
+                    values.append(value)
+        return {
+            "Q_agents": np.asarray(agents, dtype=np.int32),
+            "Q_states": np.asarray(states, dtype=np.int16).reshape(len(states), self.num_agents),
+            "Q_actions": np.asarray(actions, dtype=np.int32),
+            "Q_values": np.asarray(values, dtype=np.float64),
+        }
+
+
+    def set_Q_entries(self, entries):
+        """
+        Replace the Q-tables by flattened entries as returned by get_Q_entries.
+
+        Args:
+            entries (dict): The arrays Q_agents, Q_states, Q_actions and Q_values.
+        """
+        self.Q_tables = [{} for _ in range(self.num_agents)]
+        for agent, state, action, value in zip(entries["Q_agents"].tolist(), entries["Q_states"].tolist(),
+                                               entries["Q_actions"].tolist(), entries["Q_values"].tolist()):
+            self.Q_tables[agent].setdefault(tuple(state), {})[action] = value
+
+
+    def run_episode(self, env, epsilon_start, record=True):
+        """
+        Run one training episode, updating the Q-tables after every step.
+
+        Args:
+            env (SupplyChainEnv): The environment.
+            epsilon_start (float): Exploration rate at the beginning of the episode.
+            record (bool): Whether to build the log entries of the episode.
+
+        Returns:
+            tuple: The episode log (None if not recorded) and the total reward of the episode.
+        """
+        state = env.reset()
+        t = 0
+        episode_log = [] if record else None
+        # Linearly decrease epsilon within the period - increasing exploitation
+        epsilon_decrement = (epsilon_start - self.epsilon_final) / self.time_horizon
+        epsilon = epsilon_start
+        reward = 0
+        total_reward = 0
+        profiler = self.profiler
+        while t < self.time_horizon:
+            if profiler is not None:
+                profiler.mark()
+            # a) Select an action using the epsilon-greedy policy
+            action_vector = self.choose_action(state, epsilon)
+            if profiler is not None:
+                profiler.lap("choose_action")
+
+            # Log for each timestamp during training
+            if record:
+                episode_log.append((state, action_vector, reward, env.customer_demand[t], list(env.inventory_levels), list(env.order_backlog)))
+                if profiler is not None:
+                    profiler.lap("logging")
 
-                    # Fill Q-table with default values if not present
-                    if state not in self.Q_tables[agent]:
-                        self.Q_tables[agent][state] = {}
-                    if action not in self.Q_tables[agent][state]:
-                        self.Q_tables[agent][state][action] = 0
+            # b) Caclulate the next state and the reward - includes doing action & doing state vector
+            next_state, reward = env.step(action_vector)
+            total_reward += reward
+            if profiler is not None:
+                profiler.lap("env_step")
 
-                    if next_state not in self.Q_tables[agent]:
-                        self.Q_tables[agent][next_state] = {}
+            # Fill Q-table with default values if not present
+            self.init_Q_entries(state, action_vector, next_state)
+            if profiler is not None:
+                profiler.lap("init_Q_entries")
 
+            # c) Update Q-table, using next state and actual reward
+            self.update_Q(state, tuple(action_vector), reward, next_state)
+            if profiler is not None:
+                profiler.lap("update_Q")
 
-                # c) Update Q-table, using next state and actual reward
-                self.update_Q(state, tuple(action_vector), reward, next_state)
+            # Further decrease epsilon within the period - increasing exploitation
+            epsilon -= epsilon_decrement
 
-                # Further decrease epsilon within the period - increasing exploitation
-                epsilon -= epsilon_decrement
+            # d) update state
+            state = next_state
 
-                # d) update state
-                state = next_state
+            # e) update time
+            t += 1
 
-                # e) update time
-                t += 1
-            
-            # Loging the final state of each episode
+        # Loging the final state of each episode
+        if record:
             episode_log.append((state, action_vector, reward, 0, list(env.inventory_levels), list(env.order_backlog)))
-            logs.append(episode_log)
+
+        return episode_log, total_reward
+
+
+    @profiled("train")
+    def train(self, env, log_sink=None, checkpoint_path=None, checkpoint_every=None, resume=False, monitor=None):
+        """
+        Train the Q-learning agent.
+
+        Args:
+            env (SupplyChainEnv): The environment.
+            log_sink (MemorySink): Sink that decides which episodes are logged and where, see utils.log_sinks.
+                If None, every episode is kept in memory.
+            checkpoint_path (str): Checkpoint file (.npz), written every checkpoint_every iterations and at the end.
+            checkpoint_every (int): Number of iterations between two checkpoints, None for the final one only.
+            resume (bool): Continue from the checkpoint file if it exists, the logs then cover the remaining iterations.
+            monitor (ConvergenceMonitor): Tracks convergence and may stop training before max_iterations,
+                see agent.convergence.
+
+        Returns:
+            tuple: Logs of the training process (the list of episode logs, or the log sink if one was given)
+                and the log of the simulation after training.
+
+        Raises:
+            ValueError: If checkpoint_every is given without checkpoint_path.
+        """
+        if checkpoint_every and checkpoint_path is None:
+            raise ValueError("checkpoint_every requires a checkpoint_path")
+        sink = MemorySink() if log_sink is None else log_sink
+        # Linearly decrease epsilon within the iteration - increasing exploitation
+        epsilon_decrement_outer = (self.epsilon_start - self.epsilon_end) / self.max_iterations
+        new_epsilon_start = self.epsilon_start
+        start_iteration = 0
+        # Continue an interrupted run from its last checkpoint
+        if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+            start_iteration, new_epsilon_start = load_checkpoint(self, checkpoint_path, env)
+        completed_iterations = start_iteration
+
+        profiler = self.profiler
+        for iteration in range(start_iteration, self.max_iterations):
+            if profiler is not None:
+                num_states = self.num_Q_states()
+            episode_log, total_reward = self.run_episode(env, new_epsilon_start, record=sink.wants(iteration))
+            if profiler is not None:
+                profiler.count("episodes")
+                profiler.count("steps", self.time_horizon)
+                profiler.count("Q_table_growth", self.num_Q_states() - num_states)
+                profiler.mark()
+            sink.add_episode(iteration, episode_log, total_reward)
+            if profiler is not None:
+                profiler.lap("log_sink")
 
             # Linearly decrease epsilon within the iteration - increasing exploitation
             new_epsilon_start -= epsilon_decrement_outer
 
+            completed_iterations = iteration + 1
+
+            if checkpoint_every and completed_iterations % checkpoint_every == 0:
+                save_checkpoint(self, checkpoint_path, completed_iterations, new_epsilon_start, env)
+
+            # Stop early once the monitor's convergence criteria hold
+            if monitor is not None and monitor.update(self, env, iteration, total_reward):
+                break
+        sink.close()
+        if checkpoint_path is not None:
+            save_checkpoint(self, checkpoint_path, completed_iterations, new_epsilon_start, env)
+
         # Run simulation after training is complete
         simulation_log = self.simulation(env)
 
-        return logs, simulation_log
+        return (sink.logs if log_sink is None else sink), simulation_log
     
 
+    @profiled("simulation")
     def simulation(self, env):
         """
         Run the greedy policy on the learned Q-table.
@@ -0,0 +1,242 @@
+import numpy as np
+
+from agent.q_learning import QLearning
+from agent.sparse_q_table import SparseQTable
+
+
+# Defining the Q-learning agent with compact hash table Q-tables
+class SparseQLearning(QLearning):
+    def __init__(self, actions, state_space=None, n_codes=None, dtype=np.float32, capacity=1024, **kwargs):
+        """
+        Initialize a Q-learning agent that keeps the Q-values of the visited states only, see SparseQTable.
+        The learning rule and the epsilon-greedy policy are the same as in DenseQLearning, so the state space
+        does not have to be enumerated and long supply chains or fine state codings fit into memory.
+
+        Args:
+            actions (list): List of possible actions/action space.
+            state_space (list): List of all possible coded states, only used for num_agents and n_codes if given.
+            n_codes (int): Number of codes per echelon, defaults to the largest code in state_space. Without both it
+                is taken from the environment's state coder in train and simulation, 9 as in the paper until then.
+            dtype (np.dtype): Type of the Q-values, np.float64 gives the same values as DenseQLearning.
+            capacity (int): Number of states reserved in advance.
+            **kwargs: Further arguments of QLearning, num_agents is required without state_space.
+        """
+        if state_space is None and kwargs.get("num_agents") is None:
+            raise ValueError("Either state_space or num_agents is required")
+        super().__init__(actions, state_space, **kwargs)
+        if n_codes is None and state_space is not None:
+            n_codes = max(max(state) for state in state_space)
+        self._n_codes_from_env = n_codes is None
+        if n_codes is None:
+            n_codes = 9
+        self.n_codes = n_codes
+        self.table = SparseQTable(self.num_agents, len(actions), n_codes, dtype=dtype, capacity=capacity)
+        self.Q_tables = None # The Q-values live in self.table
+        self._action_values = np.asarray(actions)
+        self._action_columns = {action: column for column, action in enumerate(actions)}
+
+    @property
+    def nbytes(self):
+        """
+        int: Memory used by the Q-tables in bytes.
+        """
+        return self.table.nbytes
+
+    def memory_usage(self):
+        """
+        Report the memory of the Q-tables, see SparseQTable.memory_usage.
+
+        Returns:
+            dict: Number of states, reserved rows and slots, total bytes and bytes per stored state.
+        """
+        return self.table.memory_usage()
+
+    def _match_state_coder(self, env):
+        # The packed keys only tell the states apart if the agent uses the codes of the environment's state coder
+        n_codes = env.state_coder.n_codes
+        if n_codes == self.n_codes:
+            return
+        if not self._n_codes_from_env or len(self.table):
+            raise ValueError(f"The agent uses {self.n_codes} codes per echelon, the state coder of the environment "
+                             f"{n_codes}")
+        table = self.table
+        self.table = SparseQTable(self.num_agents, len(self.actions), n_codes, dtype=table.values.dtype,
+                                  capacity=len(table.row_keys), max_load=table.max_load)
+        self.n_codes = n_codes
+
+    def train(self, env, *args, **kwargs):
+        """
+        Train the Q-learning agent, see QLearning.train.
+
+        Raises:
+            ValueError: If the number of codes per echelon differs from the environment's state coder.
+        """
+        self._match_state_coder(env)
+        return super().train(env, *args, **kwargs)
+
+    def simulation(self, env):
+        """
+        Run the greedy policy on the learned Q-table, see QLearning.simulation.
+
+        Raises:
+            ValueError: If the number of codes per echelon differs from the environment's state coder.
+        """
+        self._match_state_coder(env)
+        return super().simulation(env)
+
+    def _greedy_columns(self, row):
+        # Best visited action per agent of a table row and whether the agent has visited the state
+        visited = self.table.visited[row]
+        return np.where(visited, self.table.values[row], -np.inf).argmax(axis=1), visited.any(axis=1)
+
+    def _greedy_column(self, position):
+        # First best visited action of one agent's row, -1 if the agent has not visited the state
+        n_actions = len(self.actions)
+        start = position * n_actions
+        visited = self.table.visited_view[start:start + n_actions].tolist()
+        if True not in visited:
+            return -1
+        values = self.table.value_view[start:start + n_actions].tolist()
+        if False in visited:
+            values = [value if seen else -np.inf for value, seen in zip(values, visited)]
+        return values.index(max(values))
+
+    def choose_action(self, state, epsilon):
+        """
+        Choose an action based on the current state using an epsilon-greedy policy.
+
+        Args:
+            state (tuple): The current state.
+            epsilon (float): The current exploration rate.
+
+        Returns:
+            tuple: The chosen actions as a vector.
+        """
+        table = self.table
+        n_actions = len(self.actions)
+        row = table.find(table.key(state))
+        # One draw decides exploration, the other one picks the random action
+        explore_draws, action_draws = self.rng.rand(2, self.num_agents).tolist()
+
+        action_vector = []
+        fallbacks = 0
+        for agent in range(self.num_agents):
+            column = -1
+            if row != -1 and explore_draws[agent] >= epsilon:
+                column = self._greedy_column(row * self.num_agents + agent)
+            if column == -1:
+                # Explore with probability epsilon, and whenever the agent has not seen the state yet
+                fallbacks += explore_draws[agent] >= epsilon
+                column = int(action_draws[agent] * n_actions)
+            action_vector.append(self.actions[column])
+        if self.profiler is not None:
+            self.profiler.count("unseen_state_fallbacks", fallbacks)
+        return tuple(action_vector)
+
+    def choose_greedy(self, state):
+        """
+        Choose the best action based on the current state using a greedy policy.
+
+        Args:
+            state (tuple): The current state.
+
+        Returns:
+            tuple: The chosen actions as a vector.
+        """
+        row = self.table.find(self.table.key(state))
+        if row == -1:
+            greedy_columns, seen = np.zeros(self.num_agents, dtype=np.intp), np.zeros(self.num_agents, dtype=bool)
+        else:
+            greedy_columns, seen = self._greedy_columns(row)
+        if self.profiler is not None:
+            self.profiler.count("unseen_state_fallbacks", int((~seen).sum()))
+        columns = np.where(seen, greedy_columns,
+                           (self.rng.rand(self.num_agents) * len(self.actions)).astype(np.intp))
+        return tuple(self._action_values[columns].tolist())
+
+    def update_Q(self, state, action_vector, reward, next_state):
+        """
+        Update the Q-value for the given state-action pair of every agent at once.
+
+        Args:
+            state (tuple): The current state.
+            action_vector (tuple): The actions taken.
+            reward (int): The reward received.
+            next_state (tuple): The next state.
+        """
+        table = self.table
+        n_actions = len(self.actions)
+        row_size = self.num_agents * n_actions
+        # Inserting may grow the arrays, so the views are only taken afterwards
+        row = table.insert(table.key(state))
+        next_row = table.find(table.key(next_state))
+        values, visited = table.value_view, table.visited_view
+        # Positions of the taken actions in the flat arrays of the table
+        columns = self._action_columns
+        positions = [row * row_size + agent * n_actions + columns[action] for agent, action in enumerate(action_vector)]
+
+        # Mark the state-action pairs as visited before looking at the next state, as the dictionary version does
+        for position in positions:
+            visited[position] = True
+
+        # Q(s, a) = Q(s, a) + alpha * [reward + gamma * max_a' Q(s', a') - Q(s, a)]
+        alpha, gamma = self.alpha, self.gamma
+        start = next_row * row_size
+        for position in positions:
+            # Maximum Q-value over the visited actions of the next state, 0.0 if there are none
+            max_q_next = 0.0
+            if next_row != -1:
+                next_visited = visited[start:start + n_actions].tolist()
+                if False not in next_visited:
+                    max_q_next = max(values[start:start + n_actions].tolist())
+                elif True in next_visited:
+                    max_q_next = max(value for value, seen in zip(values[start:start + n_actions].tolist(),
+                                                                   next_visited) if seen)
+                start += n_actions
+            old_value = values[position]
+            values[position] = old_value + alpha * (reward + gamma * max_q_next - old_value)
+
+    def init_Q_entries(self, state, action_vector, next_state):
+        """
+        Nothing to initialize, states are added to the table in update_Q.
+        """
+
+    def num_Q_states(self):
+        """
+        Number of states the agents have visited, summed over the agents.
+
+        Returns:
+            int: The number of states.
+        """
+        return int(self.table.visited[:len(self.table)].any(axis=2).sum())
+
+    def get_Q_entries(self):
+        """
+        Flatten the Q-tables into arrays with one entry per visited state-action pair, e.g. for checkpoints.
+
+        Returns:
+            dict: The arrays Q_agents, Q_states (entries x echelons), Q_actions and Q_values.
+        """
+        n = len(self.table)
+        rows, agents, columns = np.nonzero(self.table.visited[:n])
+        states = self.table.states(self.table.row_keys[rows])
+        return {
+            "Q_agents": agents.astype(np.int32),
+            "Q_states": states.astype(np.int16).reshape(len(rows), self.num_agents),
+            "Q_actions": self._action_values[columns].astype(np.int32),
+            "Q_values": self.table.values[rows, agents, columns].astype(np.float64),
+        }
+
+    def set_Q_entries(self, entries):
+        """
+        Replace the Q-tables by flattened entries as returned by get_Q_entries.
+
+        Args:
+            entries (dict): The arrays Q_agents, Q_states, Q_actions and Q_values.
+        """
+        self.table.clear()
+        rows = self.table.insert_many(self.table.keys(entries["Q_states"]))
+        agents = entries["Q_agents"]
+        columns = np.array([self._action_columns[action] for action in entries["Q_actions"].tolist()], dtype=np.intp)
+        self.table.values[rows, agents, columns] = entries["Q_values"]
+        self.table.visited[rows, agents, columns] = True
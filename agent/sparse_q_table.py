@@ -0,0 +1,248 @@
+# Defining a compact hash table of Q-value rows for large state spaces
+import numpy as np
+
+from utils.jit import njit
+
+EMPTY = -1 # Marks a free slot
+
+
+def _hash(key):
+    # Fold the high bits of a packed state key into the low bits used as slot index
+    return key ^ (key >> 32)
+
+
+@njit(cache=True)
+def _rebuild_slots(slots, row_keys, n_rows):
+    # Insert the rows 0 to n_rows - 1 into empty slots by linear probing
+    mask = slots.shape[0] - 1
+    for row in range(n_rows):
+        key = row_keys[row]
+        i = np.int64((key ^ (key >> np.uint64(32))) & np.uint64(mask))
+        while slots[i] != EMPTY:
+            i = (i + 1) & mask
+        slots[i] = row
+
+
+class SparseQTable:
+    def __init__(self, num_agents, n_actions, n_codes, dtype=np.float32, capacity=1024, max_load=0.5):
+        """
+        Q-values of the visited states only, stored as one row of shape (num_agents, n_actions) per state.
+        States are packed into integer keys and found by open addressing with linear probing,
+        the rows themselves are kept contiguous in the order the states were first visited.
+
+        Args:
+            num_agents (int): Number of agents (echelons) per state.
+            n_actions (int): Number of possible actions.
+            n_codes (int): Number of codes per echelon, codes run from 1 to n_codes.
+            dtype (np.dtype): Type of the Q-values, float32 halves the memory of the values.
+            capacity (int): Number of rows reserved in advance.
+            max_load (float): Largest share of occupied slots before the slot array is doubled.
+        """
+        if n_codes ** num_agents > 2 ** 64 - 1:
+            raise ValueError(f"{n_codes} codes for {num_agents} echelons do not fit into a 64 bit state key")
+        self.num_agents = num_agents
+        self.n_actions = n_actions
+        self.n_codes = n_codes
+        self.max_load = max_load
+        self.n_rows = 0
+        self.row_keys = np.zeros(capacity, dtype=np.uint64) # Packed state of each row
+        self.values = np.zeros((capacity, num_agents, n_actions), dtype=dtype)
+        self.visited = np.zeros((capacity, num_agents, n_actions), dtype=bool)
+        n_slots = 1
+        while n_slots * max_load < capacity:
+            n_slots *= 2
+        self.slots = np.full(n_slots, EMPTY, dtype=np.int64) # Row of each slot
+        self._mask = n_slots - 1
+        self._bind_views()
+        # Weights of the codes in the packed key, the first echelon varies slowest
+        self._weights = np.array([n_codes ** (num_agents - 1 - i) for i in range(num_agents)], dtype=np.uint64)
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def nbytes(self):
+        """
+        int: Memory reserved by the table in bytes.
+        """
+        return self.row_keys.nbytes + self.values.nbytes + self.visited.nbytes + self.slots.nbytes
+
+    def memory_usage(self):
+        """
+        Report the memory of the table.
+
+        Returns:
+            dict: Number of states, reserved rows and slots, total bytes and bytes per stored state.
+        """
+        return {
+            "states": self.n_rows,
+            "capacity": len(self.row_keys),
+            "slots": len(self.slots),
+            "nbytes": self.nbytes,
+            "bytes_per_state": self.nbytes / max(self.n_rows, 1),
+        }
+
+    def key(self, state):
+        """
+        Pack a coded state into its integer key, the mixed radix index of DenseQLearning.state_index.
+
+        Args:
+            state (tuple): The coded state, codes start at 1.
+
+        Returns:
+            int: The key.
+
+        Raises:
+            ValueError: If a code is outside 1 to n_codes, it would collide with another state.
+        """
+        key = 0
+        n_codes = self.n_codes
+        for code in state:
+            if not 1 <= code <= n_codes:
+                raise ValueError(f"Code {code} is outside 1 to {n_codes}")
+            key = key * n_codes + code - 1
+        return key
+
+    def keys(self, states):
+        """
+        Pack many coded states at once.
+
+        Args:
+            states (np.ndarray): Coded states, shape (n, num_agents).
+
+        Returns:
+            np.ndarray: The keys as uint64.
+
+        Raises:
+            ValueError: If a code is outside 1 to n_codes.
+        """
+        states = np.asarray(states)
+        if states.size and (states.min() < 1 or states.max() > self.n_codes):
+            raise ValueError(f"Codes {states.min()} to {states.max()} are outside 1 to {self.n_codes}")
+        return ((states.astype(np.uint64) - np.uint64(1)) * self._weights).sum(axis=1, dtype=np.uint64)
+
+    def states(self, keys):
+        """
+        Unpack keys into coded states.
+
+        Args:
+            keys (np.ndarray): The keys.
+
+        Returns:
+            np.ndarray: The coded states, shape (n, num_agents).
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        states = np.empty((len(keys), self.num_agents), dtype=np.int64)
+        for i in range(self.num_agents - 1, -1, -1):
+            states[:, i] = (keys % np.uint64(self.n_codes)).astype(np.int64) + 1
+            keys = keys // np.uint64(self.n_codes)
+        return states
+
+    def find(self, key):
+        """
+        Find the row of a state.
+
+        Args:
+            key (int): The packed state.
+
+        Returns:
+            int: The row, -1 if the state is not in the table.
+        """
+        slots, row_keys, mask = self.slot_view, self.key_view, self._mask
+        i = _hash(key) & mask
+        row = slots[i]
+        while row != EMPTY:
+            if row_keys[row] == key:
+                return row
+            i = (i + 1) & mask
+            row = slots[i]
+        return -1
+
+    def insert(self, key):
+        """
+        Find the row of a state, adding a row of zeros if the state is new.
+
+        Args:
+            key (int): The packed state.
+
+        Returns:
+            int: The row.
+        """
+        slots, row_keys, mask = self.slot_view, self.key_view, self._mask
+        i = _hash(key) & mask
+        row = slots[i]
+        while row != EMPTY:
+            if row_keys[row] == key:
+                return row
+            i = (i + 1) & mask
+            row = slots[i]
+
+        row = self.n_rows
+        if row == len(self.row_keys):
+            self._reserve(2 * row)
+        self.key_view[row] = key
+        self.slot_view[i] = row
+        self.n_rows += 1
+        if self.n_rows > self.max_load * len(self.slots):
+            self._resize_slots(2 * len(self.slots))
+        return row
+
+    def insert_many(self, keys):
+        """
+        Add many states at once.
+
+        Args:
+            keys (np.ndarray): The packed states.
+
+        Returns:
+            np.ndarray: The row of each state.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        rows = np.array([self.find(key) for key in unique_keys.tolist()], dtype=np.int64)
+        new = rows == -1
+        n_new = int(new.sum())
+        if self.n_rows + n_new > len(self.row_keys):
+            self._reserve(max(2 * len(self.row_keys), self.n_rows + n_new))
+        rows[new] = np.arange(self.n_rows, self.n_rows + n_new)
+        self.row_keys[self.n_rows:self.n_rows + n_new] = unique_keys[new]
+        self.n_rows += n_new
+        n_slots = len(self.slots)
+        while self.n_rows > self.max_load * n_slots:
+            n_slots *= 2
+        self._resize_slots(n_slots)
+        return rows[inverse.ravel()]
+
+    def clear(self):
+        """
+        Remove all states, keeping the reserved memory.
+        """
+        self.n_rows = 0
+        self.values[...] = 0
+        self.visited[...] = False
+        self.slots[...] = EMPTY
+
+    def _reserve(self, capacity):
+        # Grow the row arrays, keeping the stored rows
+        n = self.n_rows
+        row_keys = np.zeros(capacity, dtype=np.uint64)
+        values = np.zeros((capacity, self.num_agents, self.n_actions), dtype=self.values.dtype)
+        visited = np.zeros((capacity, self.num_agents, self.n_actions), dtype=bool)
+        row_keys[:n], values[:n], visited[:n] = self.row_keys[:n], self.values[:n], self.visited[:n]
+        self.row_keys, self.values, self.visited = row_keys, values, visited
+        self._bind_views()
+
+    def _resize_slots(self, n_slots):
+        # Rebuild the slot array with a new size
+        self.slots = np.full(n_slots, EMPTY, dtype=np.int64)
+        self._mask = n_slots - 1
+        _rebuild_slots(self.slots, self.row_keys, self.n_rows)
+        self._bind_views()
+
+    def _bind_views(self):
+        # Flat memoryviews on the arrays for probing and single entry access with plain Python ints and floats,
+        # which is several times faster than indexing the NumPy arrays with scalars. Rebound whenever an array grows
+        self.slot_view = memoryview(self.slots)
+        self.key_view = memoryview(self.row_keys)
+        self.value_view = memoryview(self.values.reshape(-1))
+        self.visited_view = memoryview(self.visited.reshape(-1))
@@ -0,0 +1,252 @@
+# Benchmarking the throughput of the environment, the Q-learning agents and full training runs
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from agent.sparse_q_learning import SparseQLearning
+from data.test_problems import (
+    initial_inventory,
+    holding_costs,
+    penalty_costs,
+    actions,
+    test_problems,
+    AGENTS,
+    load_agent,
+)
+from environment.batch_supply_chain import BatchSupplyChainEnv
+from environment.state_coding import StateCoder
+from environment.supply_chain import SupplyChainEnv
+from utils.log_sinks import NullSink
+
+# Largest state space for which the agent benchmarks are run, all agents but the sparse one enumerate all states
+MAX_AGENT_STATES = 10 ** 6
+
+
+def make_problem(horizon, num_echelons):
+    """
+    Build the parameters of a supply chain with the given length, repeating the main test problem's data.
+
+    Args:
+        horizon (int): Number of periods.
+        num_echelons (int): Number of echelons in the supply chain.
+
+    Returns:
+        dict: Keyword arguments for SupplyChainEnv.
+    """
+    repeats = -(-horizon // len(test_problems["main"]["customer_demand"]))
+    return {
+        "initial_inventory": [initial_inventory[0]] * num_echelons,
+        "holding_costs": [holding_costs[0]] * num_echelons,
+        "penalty_costs": [penalty_costs[0]] * num_echelons,
+        "customer_demand": (test_problems["main"]["customer_demand"] * repeats)[:horizon],
+        "lead_times": (test_problems["main"]["lead_times"] * repeats)[:horizon],
+    }
+
+
+def make_agent(agent, horizon, num_echelons, iterations=1):
+    agent_class = load_agent(agent)
+    if issubclass(agent_class, SparseQLearning):
+        # The sparse agent only needs the number of echelons
+        return agent_class(actions, num_agents=num_echelons, time_horizon=horizon, max_iterations=iterations, seed=0)
+    state_space = StateCoder(num_echelons=num_echelons).state_space()
+    return agent_class(actions, state_space, time_horizon=horizon, max_iterations=iterations, seed=0)
+
+
+def sample_transitions(env, horizon, rng):
+    # One episode of random actions, giving realistic states for the agent benchmarks
+    transitions = []
+    state = env.reset()
+    for _ in range(horizon):
+        action_vector = tuple(rng.choice(actions, size=len(state)).tolist())
+        next_state, reward = env.step(action_vector)
+        transitions.append((state, action_vector, reward, next_state))
+        state = next_state
+    return transitions
+
+
+def timed(func, repeat):
+    # Best wall-clock time of several runs
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_env_step(horizon, num_echelons, episodes, repeat):
+    env = SupplyChainEnv(**make_problem(horizon, num_echelons))
+    action_vector = tuple([1] * num_echelons)
+
+    def run():
+        for _ in range(episodes):
+            env.reset()
+            for _ in range(horizon):
+                env.step(action_vector)
+
+    return episodes * horizon, timed(run, repeat)
+
+
+def bench_batch_env_step(horizon, num_echelons, n_envs, repeat):
+    problem = make_problem(horizon, num_echelons)
+    env = BatchSupplyChainEnv(n_envs, **problem)
+    action_vectors = np.ones((n_envs, num_echelons), dtype=np.int64)
+
+    def run():
+        env.reset()
+        for _ in range(horizon):
+            env.step(action_vectors)
+
+    return n_envs * horizon, timed(run, repeat)
+
+
+def bench_choose_action(agent, horizon, num_echelons, repeat):
+    env = SupplyChainEnv(**make_problem(horizon, num_echelons))
+    transitions = sample_transitions(env, horizon, np.random.default_rng(0))
+    q_learning = make_agent(agent, horizon, num_echelons)
+    for state, action_vector, reward, next_state in transitions:
+        q_learning.init_Q_entries(state, action_vector, next_state)
+        q_learning.update_Q(state, action_vector, reward, next_state)
+
+    def run():
+        for state, _, _, _ in transitions:
+            q_learning.choose_action(state, 0.5)
+
+    return len(transitions), timed(run, repeat)
+
+
+def bench_update_Q(agent, horizon, num_echelons, repeat):
+    env = SupplyChainEnv(**make_problem(horizon, num_echelons))
+    transitions = sample_transitions(env, horizon, np.random.default_rng(0))
+    q_learning = make_agent(agent, horizon, num_echelons)
+
+    def run():
+        for state, action_vector, reward, next_state in transitions:
+            q_learning.init_Q_entries(state, action_vector, next_state)
+            q_learning.update_Q(state, action_vector, reward, next_state)
+
+    return len(transitions), timed(run, repeat)
+
+
+def bench_train(agent, horizon, num_echelons, iterations, repeat):
+    env = SupplyChainEnv(**make_problem(horizon, num_echelons))
+
+    def run():
+        make_agent(agent, horizon, num_echelons, iterations).train(env, log_sink=NullSink())
+
+    return iterations * horizon, timed(run, repeat)
+
+
+def run_suite(horizons, echelons, iterations, agents, n_envs=1000, episodes=20, repeat=3):
+    """
+    Run all benchmarks over the grid of horizon lengths, echelon counts and iteration counts.
+
+    Args:
+        horizons (list): Numbers of periods per episode.
+        echelons (list): Numbers of echelons in the supply chain, the agent benchmarks are skipped for chains
+            whose state space exceeds MAX_AGENT_STATES, except for the sparse agent.
+        iterations (list): Numbers of training iterations for the end-to-end training benchmark.
+        agents (list): Agents to benchmark, keys of data.test_problems.AGENTS.
+        n_envs (int): Number of lanes for the batch environment benchmark.
+        episodes (int): Number of episodes for the environment step benchmark.
+        repeat (int): Number of runs per benchmark, the fastest one is reported.
+
+    Returns:
+        list: One result dictionary per benchmark and parameter combination.
+    """
+    results = []
+
+    def record(name, params, measurement):
+        steps, seconds = measurement
+        results.append({"benchmark": name, "params": params, "steps": steps, "seconds": seconds,
+                        "steps_per_sec": steps / seconds})
+
+    for horizon in horizons:
+        for num_echelons in echelons:
+            params = {"horizon": horizon, "num_echelons": num_echelons}
+            record("env_step", params, bench_env_step(horizon, num_echelons, episodes, repeat))
+            record("batch_env_step", {**params, "n_envs": n_envs},
+                   bench_batch_env_step(horizon, num_echelons, n_envs, repeat))
+            too_large = StateCoder(num_echelons=num_echelons).n_states > MAX_AGENT_STATES
+            for agent in agents:
+                if too_large and not issubclass(load_agent(agent), SparseQLearning):
+                    continue
+                record("choose_action", {**params, "agent": agent},
+                       bench_choose_action(agent, horizon, num_echelons, repeat))
+                record("update_Q", {**params, "agent": agent},
+                       bench_update_Q(agent, horizon, num_echelons, repeat))
+                for iteration_count in iterations:
+                    record("train", {**params, "agent": agent, "iterations": iteration_count},
+                           bench_train(agent, horizon, num_echelons, iteration_count, repeat))
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Find the benchmarks that got slower than a baseline run.
+
+    Args:
+        results (list): Results of run_suite.
+        baseline (list): Results of an earlier run_suite.
+        tolerance (float): Allowed relative slowdown of the steps per second.
+
+    Returns:
+        list: (benchmark, params, baseline steps/sec, current steps/sec) for each regression.
+    """
+    baseline_rates = {(entry["benchmark"], json.dumps(entry["params"], sort_keys=True)): entry["steps_per_sec"]
+                      for entry in baseline}
+    regressions = []
+    for entry in results:
+        baseline_rate = baseline_rates.get((entry["benchmark"], json.dumps(entry["params"], sort_keys=True)))
+        if baseline_rate is not None and entry["steps_per_sec"] < (1 - tolerance) * baseline_rate:
+            regressions.append((entry["benchmark"], entry["params"], baseline_rate, entry["steps_per_sec"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the throughput of the beer game simulation and training.")
+    parser.add_argument("--horizons", nargs="+", type=int, default=[35, 350])
+    parser.add_argument("--echelons", nargs="+", type=int, default=[4])
+    parser.add_argument("--iterations", nargs="+", type=int, default=[10, 100])
+    # The parallel agent runs the dense one in worker processes, it is left out by default
+    parser.add_argument("--agents", nargs="+", default=[agent for agent in AGENTS if agent != "parallel"],
+                        choices=list(AGENTS))
+    parser.add_argument("--n-envs", type=int, default=1000, help="Lanes of the batch environment benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file for the results, printed to stdout if omitted")
+    parser.add_argument("--compare", help="JSON file of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = run_suite(args.horizons, args.echelons, args.iterations, args.agents, n_envs=args.n_envs,
+                        repeat=args.repeat)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for name, params, baseline_rate, rate in regressions:
+            print(f"Regression in {name} {params}: {baseline_rate:.0f} -> {rate:.0f} steps/sec", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
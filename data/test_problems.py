@@ -43,3 +43,53 @@ test_problems = {
                        3, 0, 3]
     }
 }
+
+# Q-learning agents that can be selected, as module and class names so only the selected one is imported
+AGENTS = {
+    "dict": ("agent.q_learning", "QLearning"),
+    "dense": ("agent.dense_q_learning", "DenseQLearning"),
+    "jit": ("agent.jit_q_learning", "JitQLearning"),
+    "sparse": ("agent.sparse_q_learning", "SparseQLearning"),
+    "parallel": ("agent.parallel_q_learning", "ParallelQLearning"),
+}
+
+
+def load_agent(agent):
+    """
+    Import the class of an agent.
+
+    Args:
+        agent (str): The kind of agent, a key of AGENTS.
+
+    Returns:
+        type: The agent class.
+    """
+    import importlib
+
+    if agent not in AGENTS:
+        raise ValueError(f"Unknown agent {agent!r}, expected one of {list(AGENTS)}")
+    module, name = AGENTS[agent]
+    return getattr(importlib.import_module(module), name)
+
+
+def problem_env(problem="main"):
+    """
+    Build the environment of a test problem.
+
+    Args:
+        problem (str): Name of the test problem, a key of test_problems.
+
+    Returns:
+        SupplyChainEnv: The environment.
+    """
+    from environment.supply_chain import SupplyChainEnv
+
+    if problem not in test_problems:
+        raise ValueError(f"Unknown problem {problem!r}, expected one of {list(test_problems)}")
+    return SupplyChainEnv(
+        initial_inventory,
+        holding_costs,
+        penalty_costs,
+        test_problems[problem]["customer_demand"],
+        test_problems[problem]["lead_times"]
+    )
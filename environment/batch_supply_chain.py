@@ -0,0 +1,233 @@
+# Defining a batched beer game environment, stepping many games in lockstep
+import numpy as np
+
+from environment.state_coding import StateCoder
+from environment.topology import SupplyChainTopology
+
+
+class BatchSupplyChainEnv:
+    def __init__(self, n_envs, initial_inventory, holding_costs, penalty_costs, customer_demand, lead_times,
+                 max_lead_time=None, state_coder=None, topology=None):
+        """
+        Initialize a batch of beer game environments that are stepped together.
+        Every lane of the batch follows exactly the same rules as SupplyChainEnv.
+
+        Args:
+            n_envs (int): Number of environments (lanes) in the batch.
+            initial_inventory (list): Initial inventory levels for each actor in the supply chain.
+            holding_costs (list): Holding costs per unit for each level in the supply chain.
+            penalty_costs (list): Penalty costs per unit for each level in the supply chain.
+            customer_demand (array-like): Customer demand over the time horizon, shape (T,) shared by all lanes
+                or (n_envs, T) for one demand trace per lane, faced by every retailer. Shape (n_envs, T, n_retailers)
+                gives each retailer its own demand.
+            lead_times (array-like): Lead times over the time horizon, shape (T,) or (n_envs, T).
+            max_lead_time (int): Longest lead time the pipeline can hold, defaults to the maximum of lead_times.
+            state_coder (StateCoder): Coding of the net inventory levels, defaults to the ranges of the paper.
+            topology (SupplyChainTopology): Which echelon supplies which, defaults to a serial chain.
+        """
+        self.n_envs = n_envs
+        self.initial_inventory = np.asarray(initial_inventory, dtype=np.int64)
+        # Integer costs give integer rewards as in SupplyChainEnv, any fractional cost makes them floats
+        self.cost_dtype = np.int64
+        if not all(float(cost).is_integer() for cost in list(holding_costs) + list(penalty_costs)):
+            self.cost_dtype = np.float64
+        self.holding_costs = np.asarray(holding_costs, dtype=self.cost_dtype)
+        self.penalty_costs = np.asarray(penalty_costs, dtype=self.cost_dtype)
+        self.n_echelons = len(self.initial_inventory)
+        self.state_coder = StateCoder(num_echelons=self.n_echelons) if state_coder is None else state_coder
+        self.topology = SupplyChainTopology.serial(self.n_echelons) if topology is None else topology
+        if self.topology.num_echelons != self.n_echelons:
+            raise ValueError(f"The topology has {self.topology.num_echelons} echelons, "
+                             f"the initial inventory {self.n_echelons}")
+        # Customer demand of every retailer, shape (n_envs, T, n_retailers)
+        customer_demand = np.asarray(customer_demand, dtype=np.int64)
+        if customer_demand.ndim < 3:
+            customer_demand = customer_demand[..., None]
+        self.customer_demand = np.broadcast_to(customer_demand, (n_envs, customer_demand.shape[-2],
+                                                                 len(self.topology.retailers)))
+        self.lead_times = np.broadcast_to(np.asarray(lead_times, dtype=np.int64), (n_envs, np.shape(lead_times)[-1]))
+
+        self.max_lead_time = int(self.lead_times.max(initial=0)) if max_lead_time is None else max_lead_time
+        if self.lead_times.max(initial=0) > self.max_lead_time:
+            raise ValueError(f"Lead times exceed the maximum lead time of {self.max_lead_time}")
+        # The pipeline is a ring buffer over arrival times, it has to hold the two initial orders (arrival 1 and 2)
+        # and every order placed with the maximum lead time
+        self.pipeline_length = max(self.max_lead_time, 2) + 1
+        self._lanes = np.arange(n_envs)
+
+        # Transposed topology matrices for the orders and shipments of wide supply chains. They are multiplied
+        # as floats to use BLAS, the products are exact integers
+        self._retailer_matrix = self.topology.retailer_descendants.T.astype(np.float64)
+        self._descendant_matrix = self.topology.descendants.T.astype(np.float64)
+        self._sibling_matrix = self.topology.earlier_siblings.T.astype(np.float64)
+        self._suppliers = np.array(self.topology.upstream)
+        self.current_time = 0
+        self.reset()
+
+
+    def reset(self):
+        """
+        Reset all environments to their initial state.
+
+        Returns:
+            np.ndarray: The coded states, shape (n_envs, n_echelons).
+        """
+        self.inventory_levels = np.tile(self.initial_inventory, (self.n_envs, 1))
+        self.order_backlog = np.zeros((self.n_envs, self.n_echelons), dtype=np.int64)
+        self.current_time = 0
+
+        # Required inventory for each agent, plus 1 to account for the factory production
+        self.required_inventory = np.zeros((self.n_envs, self.n_echelons + 1), dtype=np.int64)
+
+        # Pending orders per lane and agent, indexed by arrival time modulo the pipeline length
+        self.pipeline = np.zeros((self.n_envs, self.n_echelons, self.pipeline_length), dtype=np.int64)
+
+        # Initial pending orders of 4 units arriving in period 1 and 2 for each agent
+        self.pipeline[:, :, 1] = 4
+        self.pipeline[:, :, 2] = 4
+
+        # Units each echelon still owes to its downstream echelons, per downstream echelon
+        self.owed = np.zeros((self.n_envs, self.n_echelons), dtype=np.int64)
+
+        # Current costs per lane and echelon, overwritten in place by every step
+        self.echelon_holding_costs = np.empty((self.n_envs, self.n_echelons), dtype=self.cost_dtype)
+        self.echelon_penalty_costs = np.empty((self.n_envs, self.n_echelons), dtype=self.cost_dtype)
+        self.update_costs()
+        return self.get_state()
+
+
+    def update_costs(self):
+        """
+        Recompute the holding and penalty cost of every echelon in every lane from the inventory levels and backlogs.
+        """
+        np.multiply(self.holding_costs, np.maximum(self.inventory_levels, 0), out=self.echelon_holding_costs)
+        np.multiply(self.penalty_costs, np.maximum(self.order_backlog, 0), out=self.echelon_penalty_costs)
+
+
+    def get_state(self):
+        """
+        Get the current coded state of every environment, the flat state indices are kept in state_index.
+
+        Returns:
+            np.ndarray: The coded net inventory levels, shape (n_envs, n_echelons).
+        """
+        coded_states = self.code_state(self.inventory_levels - self.order_backlog)
+        self.state_index = self.state_coder.index_array(coded_states)
+        return coded_states
+
+
+    def code_state(self, state):
+        """
+        Encode net inventory levels into discrete categories, as SupplyChainEnv does.
+
+        Args:
+            state (np.ndarray): Net inventory levels of any shape.
+
+        Returns:
+            np.ndarray: The coded state with the same shape.
+        """
+        return self.state_coder.code_array(state)
+
+
+    def get_reward(self):
+        """
+        Calculate the reward of every environment based on its current state.
+
+        Returns:
+            np.ndarray: The negative costs, shape (n_envs,).
+        """
+        return -(self.echelon_holding_costs.sum(axis=1) + self.echelon_penalty_costs.sum(axis=1))
+
+
+    def cost_breakdown(self):
+        """
+        Get the current holding and penalty cost of every echelon in every lane.
+        The arrays are the environment's own, they are overwritten by the next step and must be copied to be kept.
+
+        Returns:
+            tuple: The holding costs and the penalty costs, each of shape (n_envs, n_echelons).
+        """
+        return self.echelon_holding_costs, self.echelon_penalty_costs
+
+
+    def deliver(self, slot):
+        """
+        Receive the pending orders of a pipeline slot in every lane and clear the slot.
+
+        Args:
+            slot (int): The slot of the current period, current_time % pipeline_length.
+        """
+        self.inventory_levels += self.pipeline[:, :, slot]
+        self.pipeline[:, :, slot] = 0
+
+
+    def step(self, actions, return_state=True):
+        """
+        Perform a single time step in all environments.
+
+        Args:
+            actions (array-like): Actions of each agent per lane, shape (n_envs, n_echelons).
+            return_state (bool): Whether to code the new states. Without it only the rewards are returned and
+                state_index is not updated, e.g. for rollouts of fixed order quantities.
+
+        Returns:
+            tuple: The new coded states, shape (n_envs, n_echelons), and the rewards, shape (n_envs,).
+                Only the rewards if return_state is False.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        t = self.current_time
+        slot = t % self.pipeline_length
+
+        # Delivery Process
+        self.deliver(slot)
+
+        # Ordering Process
+        # The retailer requires the customer demand, every upstream agent the order of its downstream agent (X+Y rule),
+        # the last column is the production order of the factory
+        if self.topology.is_serial:
+            self.required_inventory[:, 0] = self.customer_demand[:, t, 0]
+            self.required_inventory[:, 1:] = self.required_inventory[:, :1] + np.cumsum(actions, axis=1)
+        else:
+            # Every agent requires the demand of the retailers below it plus the actions of the agents below it
+            required = (self.customer_demand[:, t] @ self._retailer_matrix + actions @ self._descendant_matrix)
+            self.required_inventory[:, :-1] = required
+            factory = self.topology.factory
+            self.required_inventory[:, -1] = self.required_inventory[:, factory] + actions[:, factory]
+        required = self.required_inventory[:, :-1]
+
+        # Prioritize fulfilling backorders first
+        backorder_fulfilled = np.minimum(self.inventory_levels, self.order_backlog)
+        self.inventory_levels -= backorder_fulfilled
+        self.order_backlog -= backorder_fulfilled
+
+        # Attempt to fulfill the current required inventory, adding the rest to the backlog
+        order_fulfilled = np.minimum(self.inventory_levels, required)
+        self.order_backlog += required - order_fulfilled
+        self.inventory_levels -= order_fulfilled
+
+        # Every agent ships to its downstream agent, the factory always produces the required amount
+        if self.topology.is_serial:
+            shipments = np.empty_like(self.inventory_levels)
+            shipments[:, :-1] = backorder_fulfilled[:, 1:] + order_fulfilled[:, 1:]
+            shipments[:, -1] = self.required_inventory[:, -1]
+        else:
+            # A supplier serves its downstream agents in the order of their index, each up to what it is owed
+            self.owed += required + actions
+            served_before = (self.owed @ self._sibling_matrix).astype(np.int64)
+            available = (backorder_fulfilled + order_fulfilled)[:, self._suppliers]
+            shipments = np.clip(available - served_before, 0, self.owed)
+            shipments[:, self.topology.factory] = self.required_inventory[:, -1]
+            self.owed -= shipments
+            self.owed[:, self.topology.factory] = 0
+        arrival_slot = (t + self.lead_times[:, t]) % self.pipeline_length
+        self.pipeline[self._lanes, :, arrival_slot] += shipments
+
+        # Delivery Process again, to account for lead times of zero
+        self.deliver(slot)
+
+        self.current_time += 1
+
+        self.update_costs()
+        if not return_state:
+            return self.get_reward()
+        return self.get_state(), self.get_reward()
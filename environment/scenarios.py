@@ -0,0 +1,256 @@
+# Defining generators of customer demand and lead time scenarios
+import os
+
+import numpy as np
+
+
+class ScenarioStream:
+    def __init__(self, chunks):
+        """
+        Lazy view of a scenario that can be indexed by period like the customer_demand and lead_times lists.
+        Chunks are drawn when a period beyond the current chunk is requested, only the current chunk is kept,
+        so periods have to be requested in increasing order as SupplyChainEnv.step does.
+
+        Args:
+            chunks (iterator): Iterator of (customer_demand, lead_times) array pairs of equal length.
+        """
+        self._chunks = chunks
+        self._start = 0 # Period of the first entry of the current chunk
+        self._values = ([], [])
+        self.customer_demand = _StreamColumn(self, 0)
+        self.lead_times = _StreamColumn(self, 1)
+
+    def get(self, period, column):
+        """
+        Get a value of the scenario.
+
+        Args:
+            period (int): The period.
+            column (int): 0 for the customer demand, 1 for the lead time.
+
+        Returns:
+            int: The value.
+        """
+        while period >= self._start + len(self._values[0]):
+            self._start += len(self._values[0])
+            try:
+                demand, lead_times = next(self._chunks)
+            except StopIteration:
+                raise IndexError(f"The scenario ends before period {period}") from None
+            self._values = (np.asarray(demand).tolist(), np.asarray(lead_times).tolist())
+        if period < self._start:
+            raise IndexError(f"Period {period} was already discarded from the scenario stream")
+        return self._values[column][period - self._start]
+
+
+class _StreamColumn:
+    # Indexable column of a ScenarioStream
+    def __init__(self, stream, column):
+        self._stream = stream
+        self._column = column
+
+    def __getitem__(self, period):
+        return self._stream.get(period, self._column)
+
+
+class ScenarioGenerator:
+    def __init__(self, lead_time_low=0, lead_time_high=4, chunk_size=256, seed=None):
+        """
+        Base class of the scenario generators. Lead times are drawn uniformly as in the paper,
+        subclasses define the customer demand by implementing draw_demand.
+
+        Args:
+            lead_time_low (int): Smallest lead time.
+            lead_time_high (int): Largest lead time, used as max_lead_time of the environment.
+            chunk_size (int): Number of periods drawn at once by the streams.
+            seed (int): Seed of the generator's random number generator.
+        """
+        self.lead_time_low = lead_time_low
+        self.lead_time_high = lead_time_high
+        self.max_lead_time = lead_time_high
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(seed)
+
+    def draw_demand(self, periods):
+        """
+        Draw the customer demand.
+
+        Args:
+            periods (np.ndarray): The periods to draw the demand for, of any shape.
+
+        Returns:
+            np.ndarray: The demand with the same shape.
+        """
+        raise NotImplementedError
+
+    def draw_lead_times(self, periods):
+        """
+        Draw the lead times.
+
+        Args:
+            periods (np.ndarray): The periods to draw the lead times for, of any shape.
+
+        Returns:
+            np.ndarray: The lead times with the same shape.
+        """
+        return self.rng.integers(self.lead_time_low, self.lead_time_high + 1, size=np.shape(periods))
+
+    def chunks(self, chunk_size=None):
+        """
+        Yield one scenario in chunks, without end.
+
+        Args:
+            chunk_size (int): Number of periods per chunk, defaults to the generator's chunk_size.
+
+        Yields:
+            tuple: Customer demand and lead times of the next chunk of periods.
+        """
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        start = 0
+        while True:
+            periods = np.arange(start, start + chunk_size)
+            yield self.draw_demand(periods), self.draw_lead_times(periods)
+            start += chunk_size
+
+    def stream(self):
+        """
+        Start a new scenario.
+
+        Returns:
+            ScenarioStream: The scenario, drawn lazily while it is indexed.
+        """
+        return ScenarioStream(self.chunks())
+
+    def sample(self, n_scenarios, n_periods):
+        """
+        Draw many scenarios of a fixed length at once, e.g. for agent.evaluation.evaluate_policy.
+
+        Args:
+            n_scenarios (int): Number of scenarios.
+            n_periods (int): Number of periods per scenario.
+
+        Returns:
+            tuple: Customer demand and lead times, both of shape (n_scenarios, n_periods).
+        """
+        periods = np.broadcast_to(np.arange(n_periods), (n_scenarios, n_periods))
+        return self.draw_demand(periods), self.draw_lead_times(periods)
+
+
+class UniformScenarios(ScenarioGenerator):
+    def __init__(self, demand_low=0, demand_high=15, **kwargs):
+        """
+        Uniformly distributed integer demand, as in the paper.
+
+        Args:
+            demand_low (int): Smallest demand.
+            demand_high (int): Largest demand.
+            **kwargs: Arguments of ScenarioGenerator.
+        """
+        super().__init__(**kwargs)
+        self.demand_low = demand_low
+        self.demand_high = demand_high
+
+    def draw_demand(self, periods):
+        return self.rng.integers(self.demand_low, self.demand_high + 1, size=np.shape(periods))
+
+
+class PoissonScenarios(ScenarioGenerator):
+    def __init__(self, mean_demand=7.5, **kwargs):
+        """
+        Poisson distributed demand.
+
+        Args:
+            mean_demand (float): Mean demand per period.
+            **kwargs: Arguments of ScenarioGenerator.
+        """
+        super().__init__(**kwargs)
+        self.mean_demand = mean_demand
+
+    def draw_demand(self, periods):
+        return self.rng.poisson(self.mean_demand, size=np.shape(periods))
+
+
+class SeasonalScenarios(ScenarioGenerator):
+    def __init__(self, mean_demand=7.5, amplitude=0.5, season_length=12, phase=0, **kwargs):
+        """
+        Poisson distributed demand whose mean follows a sine wave.
+
+        Args:
+            mean_demand (float): Average mean demand per period.
+            amplitude (float): Relative amplitude of the mean, between 0 and 1.
+            season_length (int): Number of periods of one season.
+            phase (int): Period at which the season starts.
+            **kwargs: Arguments of ScenarioGenerator.
+        """
+        super().__init__(**kwargs)
+        self.mean_demand = mean_demand
+        self.amplitude = amplitude
+        self.season_length = season_length
+        self.phase = phase
+
+    def draw_demand(self, periods):
+        means = self.mean_demand * (1 + self.amplitude * np.sin(2 * np.pi * (np.asarray(periods) - self.phase)
+                                                                 / self.season_length))
+        return self.rng.poisson(means)
+
+
+class ReplayScenarios(ScenarioGenerator):
+    def __init__(self, customer_demand, lead_times, loop=False, chunk_size=256):
+        """
+        Replay recorded customer demand and lead times, every scenario starts at the first period.
+
+        Args:
+            customer_demand (list): The recorded customer demand.
+            lead_times (list): The recorded lead times, of the same length.
+            loop (bool): Start over at the end of the recording instead of ending the scenario.
+            chunk_size (int): Number of periods per chunk of the streams.
+        """
+        if len(customer_demand) != len(lead_times):
+            raise ValueError("Customer demand and lead times must have the same length")
+        super().__init__(lead_time_low=int(np.min(lead_times)), lead_time_high=int(np.max(lead_times)),
+                         chunk_size=chunk_size)
+        self.customer_demand = np.asarray(customer_demand, dtype=np.int64)
+        self.lead_times = np.asarray(lead_times, dtype=np.int64)
+        self.loop = loop
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """
+        Load a recording from a .npz file with the arrays customer_demand and lead_times,
+        or from a .csv file with the columns customer_demand and lead_times.
+
+        Args:
+            path (str): The file path.
+            **kwargs: Further arguments of ReplayScenarios.
+
+        Returns:
+            ReplayScenarios: The generator.
+        """
+        if os.path.splitext(path)[1] == ".npz":
+            with np.load(path) as data:
+                return cls(data["customer_demand"], data["lead_times"], **kwargs)
+        data = np.genfromtxt(path, delimiter=",", names=True, dtype=np.int64)
+        return cls(data["customer_demand"], data["lead_times"], **kwargs)
+
+    def _values(self, values, periods):
+        periods = np.asarray(periods)
+        if self.loop:
+            return values[periods % len(values)]
+        if periods.size and periods.max() >= len(values):
+            raise IndexError(f"The recording has only {len(values)} periods")
+        return values[periods]
+
+    def draw_demand(self, periods):
+        return self._values(self.customer_demand, periods)
+
+    def draw_lead_times(self, periods):
+        return self._values(self.lead_times, periods)
+
+    def chunks(self, chunk_size=None):
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        stop = None if self.loop else len(self.customer_demand)
+        start = 0
+        while stop is None or start < stop:
+            periods = np.arange(start, start + chunk_size if stop is None else min(start + chunk_size, stop))
+            yield self.draw_demand(periods), self.draw_lead_times(periods)
+            start += chunk_size
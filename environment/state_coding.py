@@ -0,0 +1,137 @@
+# Defining the coding of net inventory levels into discrete states
+import bisect
+import itertools
+
+# Upper bounds of the state categories 1-8 from the paper, everything above the last edge is category 9
+DEFAULT_BIN_EDGES = (-6, -3, 0, 3, 6, 10, 15, 20)
+
+
+class StateCoder:
+    def __init__(self, bin_edges=DEFAULT_BIN_EDGES, num_echelons=4):
+        """
+        Code net inventory levels into discrete categories and flat state indices.
+        A value v gets category k + 1, where k is the number of bin edges strictly below v,
+        so bin_edges are the inclusive upper bounds of the categories 1 to len(bin_edges).
+
+        Args:
+            bin_edges (list): Strictly increasing upper bounds of the categories, the paper's ranges by default.
+            num_echelons (int): Number of echelons (agents) in a state.
+        """
+        if any(low >= high for low, high in zip(bin_edges, bin_edges[1:])):
+            raise ValueError("Bin edges must be strictly increasing")
+        self.bin_edges = list(bin_edges)
+        self.num_echelons = num_echelons
+        self.n_codes = len(self.bin_edges) + 1 # Number of categories per echelon
+        self.n_states = self.n_codes ** num_echelons
+
+        # For integer edges all values below the first edge (above the last edge) share the first (last) category,
+        # so a lookup table over the values in between covers every integer
+        self._lookup = None
+        self._arrays = None # Lookup table, index weights and bin edges as NumPy arrays, built by the first array call
+        if all(float(edge).is_integer() for edge in self.bin_edges):
+            self._low = int(self.bin_edges[0])
+            self._high = int(self.bin_edges[-1]) + 1
+            self._lookup = [bisect.bisect_left(self.bin_edges, value) + 1 for value in range(self._low, self._high + 1)]
+
+    def code(self, state):
+        """
+        Code the net inventory levels of all echelons.
+
+        Args:
+            state (tuple): The net inventory levels.
+
+        Returns:
+            tuple: The coded state.
+        """
+        if self._lookup is not None:
+            lookup, low, high = self._lookup, self._low, self._high
+            try:
+                # clip to the range of the lookup table, non-integer values cannot index it
+                return tuple([lookup[(low if value < low else high if value > high else value) - low] for value in state])
+            except TypeError:
+                pass
+        return tuple([bisect.bisect_left(self.bin_edges, value) + 1 for value in state])
+
+    def index(self, coded_state):
+        """
+        Convert a coded state into its position in the state space.
+
+        Args:
+            coded_state (tuple): The coded state.
+
+        Returns:
+            int: The flat state index.
+
+        Raises:
+            ValueError: If a code is outside 1 to n_codes.
+        """
+        index = 0
+        for code in coded_state:
+            if not 1 <= code <= self.n_codes:
+                raise ValueError(f"Code {code} is outside 1 to {self.n_codes}")
+            index = index * self.n_codes + code - 1
+        return index
+
+    def encode(self, state):
+        """
+        Code the net inventory levels of all echelons and compute the flat state index.
+
+        Args:
+            state (tuple): The net inventory levels.
+
+        Returns:
+            tuple: The coded state (tuple) and the flat state index (int).
+        """
+        coded_state = self.code(state)
+        return coded_state, self.index(coded_state)
+
+    def code_array(self, states):
+        """
+        Code an array of net inventory levels.
+
+        Args:
+            states (np.ndarray): Net inventory levels of any shape.
+
+        Returns:
+            np.ndarray: The categories with the same shape.
+        """
+        import numpy as np
+
+        states = np.asarray(states)
+        if self._lookup is not None and states.dtype.kind in "iu":
+            return self._get_arrays()[0][np.clip(states, self._low, self._high) - self._low]
+        return np.searchsorted(self._get_arrays()[2], states, side='left') + 1
+
+    def index_array(self, coded_states):
+        """
+        Convert coded states into flat state indices.
+
+        Args:
+            coded_states (np.ndarray): Coded states of shape (..., num_echelons).
+
+        Returns:
+            np.ndarray: The flat state indices of shape (...).
+        """
+        import numpy as np
+
+        return (np.asarray(coded_states) - 1) @ self._get_arrays()[1]
+
+    def _get_arrays(self):
+        # NumPy is only imported by the array methods, so environments stepping one chain start without it
+        if self._arrays is None:
+            import numpy as np
+
+            lookup_array = np.asarray(self._lookup) if self._lookup is not None else None
+            # Weights of the codes in the flat index, the first echelon varies slowest as in data.test_problems
+            weights = self.n_codes ** np.arange(self.num_echelons - 1, -1, -1)
+            self._arrays = (lookup_array, weights, np.asarray(self.bin_edges))
+        return self._arrays
+
+    def state_space(self):
+        """
+        List all coded states in the order of their flat indices.
+
+        Returns:
+            list: The coded states, as data.test_problems.state_space for the default coder.
+        """
+        return list(itertools.product(range(1, self.n_codes + 1), repeat=self.num_echelons))
@@ -1,8 +1,13 @@
 # Defining the beer Game environment
+from operator import sub
+
+from environment.state_coding import StateCoder
+from environment.topology import SupplyChainTopology
 
 
 class SupplyChainEnv:
-    def __init__(self, initial_inventory, holding_costs, penalty_costs, customer_demand, lead_times):
+    def __init__(self, initial_inventory, holding_costs, penalty_costs, customer_demand=None, lead_times=None,
+                 max_lead_time=None, state_coder=None, scenarios=None, topology=None):
         """
         Initialize the environment for the beer game.
 
@@ -10,8 +15,15 @@ class SupplyChainEnv:
             initial_inventory (list): Initial inventory levels for each actor in the supply chain.
             holding_costs (list): Holding costs per unit for each level in the supply chain.
             penalty_costs (list): Penalty costs per unit for each level in the supply chain.
-            customer_demand (list): List of customer demand values over the time horizon.
+            customer_demand (list): List of customer demand values over the time horizon. With several retailers an
+                entry is either one demand faced by every retailer or a list with one demand per retailer.
             lead_times (list): List of lead times the same for each level.
+            max_lead_time (int): Longest lead time the pending orders can hold, defaults to the maximum of lead_times.
+            state_coder (StateCoder): Coding of the net inventory levels, defaults to the ranges of the paper.
+            scenarios (ScenarioGenerator): Generator drawing a fresh customer demand and lead time stream on every
+                reset, see environment.scenarios. Replaces customer_demand and lead_times.
+            topology (SupplyChainTopology): Which echelon supplies which, defaults to a serial chain with the retailer
+                first and the factory last, as in the beer game.
             current_time (int): The current time step, starting at zero.
             reset (method): adding to init, to not have duplicate code.
         """
@@ -20,6 +32,23 @@ class SupplyChainEnv:
         self.penalty_costs = penalty_costs
         self.customer_demand = customer_demand
         self.lead_times = lead_times
+        self.scenarios = scenarios
+        self.state_coder = StateCoder(num_echelons=len(initial_inventory)) if state_coder is None else state_coder
+        self.topology = SupplyChainTopology.serial(len(initial_inventory)) if topology is None else topology
+        if self.topology.num_echelons != len(initial_inventory):
+            raise ValueError(f"The topology has {self.topology.num_echelons} echelons, "
+                             f"the initial inventory {len(initial_inventory)}")
+        # Position of each retailer in a per-retailer customer demand entry
+        self._retailer_positions = {retailer: k for k, retailer in enumerate(self.topology.retailers)}
+        if scenarios is not None:
+            self.max_lead_time = scenarios.max_lead_time if max_lead_time is None else max_lead_time
+        else:
+            self.max_lead_time = max(lead_times) if max_lead_time is None else max_lead_time
+            if max(lead_times) > self.max_lead_time:
+                raise ValueError(f"Lead times exceed the maximum lead time of {self.max_lead_time}")
+        # Pending orders are kept in a ring buffer indexed by arrival time, it has to hold the initial orders
+        # arriving in period 2 and every order placed with the maximum lead time
+        self.pipeline_length = max(self.max_lead_time, 2) + 1
         self.current_time = 0
         self.reset() 
 
@@ -33,30 +62,53 @@ class SupplyChainEnv:
         self.order_backlog = [0] * len(self.initial_inventory)
         self.current_time = 0
 
+        # Start a new scenario, drawn lazily while the periods are stepped through
+        if self.scenarios is not None:
+            stream = self.scenarios.stream()
+            self.customer_demand = stream.customer_demand
+            self.lead_times = stream.lead_times
+
         # Initialize required inventory list for each agent
-        # plus 1 to account for customer demand
+        # plus 1 to account for the factory production
         self.required_inventory = [0] * (len(self.initial_inventory)+1)
+
+        # Units each echelon still owes to each of its downstream echelons, only needed by suppliers of several echelons
+        self.owed = [0] * len(self.initial_inventory)
         
-        # Initialize pending orders list for each agent
-        self.pending_orders = [[] for _ in range(len(self.initial_inventory))]
+        # Initialize pending orders for each agent, slot t % pipeline_length holds the units arriving in period t
+        self.pending_orders = [[0] * self.pipeline_length for _ in range(len(self.initial_inventory))]
         
-        # Add initial pending orders of 4 units with lead times 0 and 1 for each agent
+        # Add initial pending orders of 4 units with lead times 1 and 2 for each agent
         for i in range(len(self.initial_inventory)):
-            self.pending_orders[i].append((1, 4))  # Lead time 1
-            self.pending_orders[i].append((2, 4))  # Lead time 2
+            self.pending_orders[i][1] = 4  # Lead time 1
+            self.pending_orders[i][2] = 4  # Lead time 2
+
+        self.update_costs()
         return self.get_state()
 
 
+    def update_costs(self):
+        """
+        Recompute the holding and penalty cost of every echelon from its inventory level and backlog.
+        The step keeps the costs up to date on its own, this is only needed after setting the levels from outside.
+        """
+        # Current costs per echelon, updated in place whenever an inventory level or backlog changes
+        self.echelon_holding_costs = [h * max(0, level) for h, level in zip(self.holding_costs, self.inventory_levels)]
+        self.echelon_penalty_costs = [p * max(0, backlog) for p, backlog in zip(self.penalty_costs, self.order_backlog)]
+
+
     def get_state(self):
         """
         Get the current state of the environment.
-        The state is represented by coded inventory levels.
+        The state is represented by coded inventory levels, the flat index of the state is kept in state_index.
 
         Returns:
             tuple: A tuple representing the coded inventory levels.
         """
         # subtracting the backlog from the inventory levels and then coding the state
-        return self.code_state(tuple(i - b for i, b in zip(self.inventory_levels, self.order_backlog)))
+        net_inventory = list(map(sub, self.inventory_levels, self.order_backlog))
+        coded_state, self.state_index = self.state_coder.encode(net_inventory)
+        return coded_state
 
 
     def code_state(self, state):
@@ -69,29 +121,7 @@ class SupplyChainEnv:
         Returns:
             tuple: The coded state.
         """
-        
-        # iterating over each element of the state vector and encoding it
-        coded_state = []
-        for s in state:
-            if s <= -6:
-                coded_state.append(1)
-            elif -6 < s <= -3:
-                coded_state.append(2)
-            elif -3 < s <= 0:
-                coded_state.append(3)
-            elif 0 < s <= 3:
-                coded_state.append(4)
-            elif 3 < s <= 6:
-                coded_state.append(5)
-            elif 6 < s <= 10:
-                coded_state.append(6)
-            elif 10 < s <= 15:
-                coded_state.append(7)
-            elif 15 < s <= 20:
-                coded_state.append(8)
-            else:
-                coded_state.append(9)
-        return tuple(coded_state)
+        return self.state_coder.code(state)
 
 
     def get_reward(self):
@@ -102,47 +132,76 @@ class SupplyChainEnv:
         Returns:
             int: The negative cost, calculated as the sum of holding costs and penalty costs.
         """
-        holding_cost = sum(
-            [self.holding_costs[i] * max(0, self.inventory_levels[i]) for i in range(len(self.inventory_levels))])
-        penalty_cost = sum(
-            [self.penalty_costs[i] * max(0, self.order_backlog[i]) for i in range(len(self.inventory_levels))])
-        return -(holding_cost + penalty_cost)
+        return -(sum(self.echelon_holding_costs) + sum(self.echelon_penalty_costs))
+
+
+    def cost_breakdown(self):
+        """
+        Get the current holding and penalty cost of every echelon.
+        The lists are the environment's own, they are updated in place by the next step and must not be modified.
+
+        Returns:
+            tuple: The holding costs and the penalty costs per echelon.
+        """
+        return self.echelon_holding_costs, self.echelon_penalty_costs
+
+
+    def deliver(self, slot):
+        """
+        Receive the pending orders of a ring buffer slot and clear the slot.
 
+        Args:
+            slot (int): The slot of the current period, current_time % pipeline_length.
+        """
+        for i in range(len(self.inventory_levels)):
+            units = self.pending_orders[i][slot]
+            if units:
+                self.inventory_levels[i] += units
+                self.pending_orders[i][slot] = 0
+                self.echelon_holding_costs[i] = self.holding_costs[i] * max(0, self.inventory_levels[i])
 
-    def step(self, action):
+
+    def step(self, action, return_state=True):
         """
         Perform a single time step in the environment.
 
         Args:
             action (list): A list of actions for each agent in the supply chain.
+            return_state (bool): Whether to code the new state. Without it only the reward is returned and
+                state_index is not updated, get_state codes the state later if it is needed after all.
 
         Returns:
-            tuple: The new state and the reward obtained.
+            tuple: The new state and the reward obtained, only the reward if return_state is False.
         """
-        
-        # Delivery Process
-        for i in range(len(self.inventory_levels)):
-            # Get orders that should be delivered at the current time
-            orders_to_deliver = [order for order in self.pending_orders[i] if order[0] <= self.current_time]
+        lead_time = self.lead_times[self.current_time]
+        if lead_time > self.max_lead_time:
+            raise ValueError(f"Lead time {lead_time} exceeds the maximum lead time of {self.max_lead_time}")
+        # Ring buffer slots of the current period and of the orders placed in this period
+        slot = self.current_time % self.pipeline_length
+        arrival_slot = (self.current_time + lead_time) % self.pipeline_length
 
-            # Process each order
-            for order in orders_to_deliver:
-                delivery_time, amount = order
-                self.inventory_levels[i] += amount
-                # Remove the fulfilled order from the pending orders list
-                self.pending_orders[i].remove(order)
+        # Delivery Process
+        self.deliver(slot)
 
 
         # Ordering Process
-        for i in range(len(self.inventory_levels)):
-            if i == 0:
-                # For the retailer, set the required inventory directly to the demand
-                self.required_inventory[i] = self.customer_demand[self.current_time]
-            else:
+        # Echelons are processed downstream first, so every order is known before its supplier ships
+        demand = self.customer_demand[self.current_time]
+        per_retailer_demand = hasattr(demand, "__len__")
+        topology = self.topology
+        for i in topology.order:
+            children = topology.children[i]
+            if not children:
+                # For a retailer, set the required inventory directly to the demand
+                self.required_inventory[i] = demand[self._retailer_positions[i]] if per_retailer_demand else demand
+            elif len(children) == 1:
                 # For other agents, calculate the required inventory
-                X = self.required_inventory[i-1]
-                Y = action[i-1]
+                X = self.required_inventory[children[0]]
+                Y = action[children[0]]
                 self.required_inventory[i] = X + Y
+            else:
+                # A supplier of several echelons receives the sum of their orders
+                self.required_inventory[i] = sum(self.required_inventory[c] + action[c] for c in children)
 
 
             # Prioritize fulfilling backorders first
@@ -169,32 +228,35 @@ class SupplyChainEnv:
             # Total fulfilled order including backorders and current demand
             total_fulfilled = backorder_fulfilled + order_fulfilled
             self.inventory_levels[i] -= order_fulfilled
-
-            # Update supplier's inventory and add to pending orders list
-            # Skip adding to pending orders if i == 0
-            if i != 0:
-                self.pending_orders[i-1].append((self.current_time + self.lead_times[self.current_time], total_fulfilled))
-
-            # Special handling for the factory (Agent 3)
-            if i == 3:
+            # Bring the costs of the echelon up to date, later in the step only deliveries change its inventory
+            self.echelon_holding_costs[i] = self.holding_costs[i] * max(0, self.inventory_levels[i])
+            self.echelon_penalty_costs[i] = self.penalty_costs[i] * max(0, self.order_backlog[i])
+
+            # Update the downstream inventory by adding to its pending orders list
+            if len(children) == 1:
+                self.pending_orders[children[0]][arrival_slot] += total_fulfilled
+            elif children:
+                # Several downstream echelons are served in the order of their index, each up to what it is owed
+                for c in children:
+                    self.owed[c] += self.required_inventory[c] + action[c]
+                    shipped = min(total_fulfilled, self.owed[c])
+                    self.owed[c] -= shipped
+                    total_fulfilled -= shipped
+                    self.pending_orders[c][arrival_slot] += shipped
+
+            # Special handling for the factory
+            if i == topology.factory:
                 # The factory can always produce the required amount
-                self.required_inventory[i+1] = self.required_inventory[i] + action[i]
+                self.required_inventory[-1] = self.required_inventory[i] + action[i]
                 # Record production in pending orders with the appropriate lead time
-                self.pending_orders[i].append((self.current_time + self.lead_times[self.current_time], self.required_inventory[i+1]))
+                self.pending_orders[i][arrival_slot] += self.required_inventory[-1]
 
 
         # Delivery Process again, to account for lead times of zero
-        for i in range(len(self.inventory_levels)):
-            # Get orders that should be delivered at the current time
-            orders_to_deliver = [order for order in self.pending_orders[i] if order[0] <= self.current_time]
-
-            # Process each order
-            for order in orders_to_deliver:
-                delivery_time, amount = order
-                self.inventory_levels[i] += amount
-                # Remove the fulfilled order from the pending orders list
-                self.pending_orders[i].remove(order)
+        self.deliver(slot)
 
         self.current_time += 1
 
+        if not return_state:
+            return self.get_reward()
         return self.get_state(), self.get_reward()
\ No newline at end of file
@@ -0,0 +1,114 @@
+# Defining the structure of the supply chain network
+
+
+class SupplyChainTopology:
+    def __init__(self, upstream):
+        """
+        Describe a supply chain in which every echelon orders from exactly one supplier.
+        The echelons form a tree with the factory as its root and the retailers as its leaves,
+        e.g. upstream=[1, 2, 3, -1] is the serial beer game: retailer, wholesaler, distributor, factory.
+
+        Args:
+            upstream (list): Index of the supplier of each echelon, -1 for the factory.
+        """
+        self.upstream = list(upstream)
+        self.num_echelons = len(self.upstream)
+        roots = [i for i, supplier in enumerate(self.upstream) if supplier == -1]
+        if len(roots) != 1:
+            raise ValueError("The supply chain needs exactly one factory (upstream index -1)")
+        self.factory = roots[0]
+
+        # Downstream echelons of each echelon, in ascending order
+        self.children = [[] for _ in range(self.num_echelons)]
+        for i, supplier in enumerate(self.upstream):
+            if supplier != -1:
+                if not 0 <= supplier < self.num_echelons or supplier == i:
+                    raise ValueError(f"Invalid supplier {supplier} of echelon {i}")
+                self.children[supplier].append(i)
+        self.retailers = [i for i in range(self.num_echelons) if not self.children[i]]
+
+        # Distance of each echelon to the factory, a cycle never reaches the factory
+        self.depth = [0] * self.num_echelons
+        for i in range(self.num_echelons):
+            j = i
+            while self.upstream[j] != -1:
+                j = self.upstream[j]
+                self.depth[i] += 1
+                if self.depth[i] > self.num_echelons:
+                    raise ValueError("The supply chain contains a cycle")
+
+        # Processing order of a period: every echelon after all of its downstream echelons
+        self.order = sorted(range(self.num_echelons), key=lambda i: -self.depth[i])
+        self.is_serial = self.upstream == list(range(1, self.num_echelons)) + [-1]
+
+        self._matrices = None # Built on first use, so environments stepping one chain do not import NumPy
+
+    @property
+    def descendants(self):
+        """
+        np.ndarray: descendants[i, j] = 1 if echelon j is downstream of echelon i.
+        """
+        return self._build_matrices()[0]
+
+    @property
+    def retailer_descendants(self):
+        """
+        np.ndarray: retailer_descendants[i, k] = 1 if the k-th retailer is echelon i or downstream of it.
+        """
+        return self._build_matrices()[1]
+
+    @property
+    def earlier_siblings(self):
+        """
+        np.ndarray: earlier_siblings[c, d] = 1 if echelon d has the same supplier as echelon c and a lower index.
+        """
+        return self._build_matrices()[2]
+
+    def _build_matrices(self):
+        # Matrices for the vectorized environments
+        if self._matrices is None:
+            import numpy as np
+
+            descendants = np.zeros((self.num_echelons, self.num_echelons), dtype=np.int64)
+            for i in range(self.num_echelons):
+                j = self.upstream[i]
+                while j != -1:
+                    descendants[j, i] = 1
+                    j = self.upstream[j]
+            retailer_descendants = (descendants + np.eye(self.num_echelons, dtype=np.int64))[:, self.retailers]
+            earlier_siblings = np.zeros((self.num_echelons, self.num_echelons), dtype=np.int64)
+            for siblings in self.children:
+                for position, child in enumerate(siblings):
+                    earlier_siblings[child, siblings[:position]] = 1
+            self._matrices = (descendants, retailer_descendants, earlier_siblings)
+        return self._matrices
+
+    @classmethod
+    def serial(cls, num_echelons=4):
+        """
+        A serial supply chain, echelon 0 is the retailer and the last echelon the factory.
+
+        Args:
+            num_echelons (int): Number of echelons.
+
+        Returns:
+            SupplyChainTopology: The topology.
+        """
+        return cls(list(range(1, num_echelons)) + [-1])
+
+    @classmethod
+    def divergent(cls, num_retailers, num_upstream=3):
+        """
+        Several retailers ordering from one wholesaler, which is followed by a serial chain up to the factory.
+        Echelons 0 to num_retailers - 1 are the retailers, the last echelon is the factory.
+
+        Args:
+            num_retailers (int): Number of retailers.
+            num_upstream (int): Number of echelons above the retailers, including the wholesaler and the factory.
+
+        Returns:
+            SupplyChainTopology: The topology.
+        """
+        upstream = [num_retailers] * num_retailers
+        upstream += list(range(num_retailers + 1, num_retailers + num_upstream)) + [-1]
+        return cls(upstream)
@@ -1,67 +1,220 @@
 # Investigate time_horizon -- q_learning.py
 # Bei Analysis ggf. Abweichungen
+# Heavy modules (NumPy, pandas, the agents) are imported inside the commands, so short calls start quickly
+import argparse
+import json
+import sys
 import time
-import pandas as pd
-#import numpy as np
-#import logging
 
-from environment.supply_chain import SupplyChainEnv
-from agent.q_learning import QLearning
 from data.test_problems import (
     initial_inventory,
-    holding_costs,
-    penalty_costs,
     time_horizon,
     actions,
     state_space,
     test_problems,
+    AGENTS,
+    load_agent,
+    problem_env,
 )
-from utils.analysis import print_logs, calculate_rewards, print_simulation_log
-from utils.logger import setup_logger
 
+COMMANDS = ("train", "evaluate", "infer")
+
+
+def train(args):
+    """
+    Train an agent on a test problem, print the logs and save the requested outputs.
+
+    Args:
+        args (argparse.Namespace): The arguments of the train command.
+    """
+    from utils.logger import setup_logger
 
-def main():
     # Setup logging
     logger = setup_logger()
+    if args.quiet:
+        logger.setLevel("WARNING")
 
     # Record the start time
     start_time = time.time()
 
     # Initialize environment
-    env = SupplyChainEnv(
-        initial_inventory,
-        holding_costs,
-        penalty_costs,
-        test_problems["main"]["customer_demand"],
-        test_problems["main"]["lead_times"]
-    )
+    env = problem_env(args.problem)
 
     # Initialize Q-learning agent
-    agent = QLearning(actions, state_space, max_iterations=100, time_horizon=time_horizon) # Best results were found using 100k iterations
+    agent_class = load_agent(args.agent)
+    kwargs = {"num_workers": args.workers} if args.agent == "parallel" else {}
+    agent = agent_class(actions, state_space, max_iterations=args.iterations, time_horizon=time_horizon,
+                        seed=args.seed, **kwargs) # Best results were found using 100k iterations
+
+    # Train the agent, only the episode rewards are kept in quiet mode
+    log_sink = None
+    if args.trajectory:
+        from utils.log_sinks import FileSink
+        log_sink = FileSink(args.trajectory)
+    elif args.quiet:
+        from utils.log_sinks import NullSink
+        log_sink = NullSink()
+    logs, simulation_log = agent.train(env, log_sink=log_sink, checkpoint_path=args.checkpoint)
 
-    # Train the agent
-    logs, simulation_log = agent.train(env)
+    from utils.analysis import calculate_rewards, print_logs, print_simulation_log
 
-    # Analyze and print logs
-    print_logs(logs)
+    if args.trajectory:
+        from utils.trajectory import Trajectory
+        logs = Trajectory.load(args.trajectory)
+    simulation_reward = calculate_rewards([simulation_log])[0]
+    if not args.quiet:
+        # Analyze and print logs
+        print_logs(logs, num_episodes=args.print_episodes)
 
-    # Analyze rewards for training
-    episode_rewards = calculate_rewards(logs)
-    print(f"Total rewards for all episodes: {episode_rewards}")
+        # Analyze rewards for training
+        episode_rewards = calculate_rewards(logs)
+        print(f"Total rewards for all episodes: {episode_rewards}")
 
-    # Analyze and print simulation log
-    print_simulation_log(simulation_log)
+        # Analyze and print simulation log
+        print_simulation_log(simulation_log)
 
     # Save simulation logs to a CSV file
-    # df = pd.DataFrame(simulation_log, columns=['State', 'Action', 'Reward', 'Demand', 'Inventory Levels', 'Order Backlog'])
-    # df.to_csv('simulation_logs.csv', index=False)
-    # print("Simulation logs saved to simulation_logs.csv")
+    if args.simulation_output:
+        import pandas as pd
+
+        df = pd.DataFrame(simulation_log, columns=['State', 'Action', 'Reward', 'Demand', 'Inventory Levels', 'Order Backlog'])
+        df.to_csv(args.simulation_output, index=False)
+        if not args.quiet:
+            print(f"Simulation logs saved to {args.simulation_output}")
+
+    if args.policy_output:
+        from agent.policy_io import export_policy
+
+        export_policy(agent, args.policy_output)
+        if not args.quiet:
+            print(f"Policy saved to {args.policy_output}")
 
     # Record the end time
     end_time = time.time()
-    print(f"Total execution time: {end_time - start_time:.2f} seconds")
+    if args.quiet:
+        print(f"Simulation reward: {simulation_reward}")
+    else:
+        print(f"Total execution time: {end_time - start_time:.2f} seconds")
+
+
+def evaluate(args):
+    """
+    Run the greedy policy of a policy file on a test problem and print its costs.
+
+    Args:
+        args (argparse.Namespace): The arguments of the evaluate command.
+    """
+    # Neither the policy reader nor the environment need NumPy, which takes longer to import than the evaluation
+    from agent.policy_reader import PolicyReader
+
+    policy = PolicyReader(args.policy)
+    if policy.num_agents != len(initial_inventory):
+        raise ValueError(f"{args.policy} holds a policy for {policy.num_agents} echelons, "
+                         f"the test problems have {len(initial_inventory)}")
+    env = problem_env(args.problem)
+    state = env.reset()
+    holding_cost = [0] * policy.num_agents
+    penalty_cost = [0] * policy.num_agents
+    for _ in range(time_horizon):
+        state, _ = env.step(policy.choose_greedy(state))
+        echelon_holding_costs, echelon_penalty_costs = env.cost_breakdown()
+        holding_cost = [total + cost for total, cost in zip(holding_cost, echelon_holding_costs)]
+        penalty_cost = [total + cost for total, cost in zip(penalty_cost, echelon_penalty_costs)]
+    total_cost = sum(holding_cost) + sum(penalty_cost)
+
+    if args.json:
+        print(json.dumps({"problem": args.problem, "total_cost": total_cost, "holding_cost": holding_cost,
+                          "penalty_cost": penalty_cost}))
+    else:
+        print(f"Total cost on {args.problem}: {total_cost}")
+
+
+def infer(args):
+    """
+    Print the orders of the greedy policy of a policy file for one site, or for every JSON line read from stdin.
+
+    Args:
+        args (argparse.Namespace): The arguments of the infer command.
+    """
+    # Reads the file with the standard library only, NumPy takes longer to import than the query
+    from agent.policy_reader import PolicyReader
+
+    policy = PolicyReader(args.policy, fallback=args.fallback, base_stock_levels=args.base_stock)
+
+    if args.inventory is not None:
+        sites = [{"inventory": args.inventory, "backlog": args.backlog, "incoming_orders": args.incoming}]
+    else:
+        # One site per line, e.g. {"inventory": [12, 8, 15, 20], "backlog": [0, 2, 0, 0]}
+        sites = (json.loads(line) for line in sys.stdin if line.strip())
+    for site in sites:
+        backlog = site.get("backlog")
+        if backlog is None:
+            backlog = [0] * len(site["inventory"])
+        orders = policy.order(site["inventory"], backlog, site.get("incoming_orders"))
+        print(json.dumps(list(orders)))
+
+
+def build_parser():
+    """
+    Build the parser of the command line interface.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog="supply_chain_sim", description="Solve the beer game with Q-learning.")
+    commands = parser.add_subparsers(dest="command")
+
+    train_parser = commands.add_parser("train", help="Train an agent on a test problem (default command).")
+    train_parser.add_argument("--problem", default="main", choices=list(test_problems))
+    train_parser.add_argument("--iterations", type=int, default=100)
+    train_parser.add_argument("--seed", type=int)
+    train_parser.add_argument("--agent", default="dict", choices=list(AGENTS))
+    train_parser.add_argument("--workers", type=int, help="Worker processes of the parallel agent")
+    train_parser.add_argument("--checkpoint", help="Checkpoint file (.npz) written at the end of training")
+    train_parser.add_argument("--policy-output", help="Policy file for the evaluate and infer commands")
+    train_parser.add_argument("--simulation-output", help="CSV file for the simulation log")
+    train_parser.add_argument("--trajectory", help="Directory for the logs of every training episode")
+    train_parser.add_argument("--print-episodes", type=int, default=1, help="Number of recent episodes to print")
+    train_parser.add_argument("--quiet", action="store_true", help="Only print the simulation reward")
+    train_parser.set_defaults(handler=train)
+
+    evaluate_parser = commands.add_parser("evaluate", help="Run a policy file on a test problem.")
+    evaluate_parser.add_argument("--policy", required=True)
+    evaluate_parser.add_argument("--problem", default="main", choices=list(test_problems))
+    evaluate_parser.add_argument("--json", action="store_true", help="Print the costs as JSON")
+    evaluate_parser.set_defaults(handler=evaluate)
+
+    infer_parser = commands.add_parser("infer", help="Print the orders of a policy file for inventory positions.")
+    infer_parser.add_argument("--policy", required=True)
+    infer_parser.add_argument("--inventory", nargs="+", type=int,
+                              help="Inventory level per echelon, JSON lines are read from stdin if omitted")
+    infer_parser.add_argument("--backlog", nargs="+", type=int, help="Backlog per echelon, defaults to none")
+    infer_parser.add_argument("--incoming", nargs="+", type=int,
+                              help="Order received by each echelon, prints the order quantities X + Y if given")
+    infer_parser.add_argument("--fallback", default="constant", choices=("constant", "nearest", "base_stock"))
+    infer_parser.add_argument("--base-stock", nargs="+", type=int, help="Base-stock level per echelon")
+    infer_parser.set_defaults(handler=infer)
+    return parser
+
+
+def main(argv=None):
+    """
+    Entry point of the supply_chain_sim command.
+
+    Args:
+        argv (list): The command line arguments, defaults to sys.argv[1:].
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Without a command, e.g. supply_chain_sim --iterations 1000, the agent is trained as before
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["train"] + argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "infer" and args.fallback == "base_stock" and args.base_stock is None:
+        parser.error("the base_stock fallback requires --base-stock")
+    args.handler(args)
 
 
 # Standard Python entry point
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,259 @@
+# Serving the game sessions through a small HTTP/1.1 JSON API on a TCP port or a local Unix socket
+import argparse
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs, urlsplit
+
+from data.test_problems import problem_env
+from server.manager import SessionManager
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 64 * 1024 # Largest request body in bytes
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class GameServer:
+    def __init__(self, manager, max_connections=20000, request_timeout=30.0, write_timeout=10.0, max_wait=30.0):
+        """
+        HTTP front end of a SessionManager. Each connection is served by its own coroutine and keeps alive between
+        requests, a player can wait for the next period with a long poll. Clients that are too slow to send a request
+        or to read a response are disconnected, and connections beyond max_connections are refused, so slow players
+        never hold up the event loop or grow the server's buffers.
+
+        Endpoints, all bodies and responses are JSON:
+            GET /sessions: number of sessions per status.
+            POST /sessions {"humans": [0], "problem": "main"}: open a session, returns its snapshot.
+            GET /sessions/<id>?after=<period>&wait=<seconds>: the snapshot, with after and wait once the game has
+                moved past the period or the wait is over.
+            POST /sessions/<id>/orders {"echelon": 0, "action": 2, "period": 5}: submit an order, the period is
+                optional and guards against late orders.
+            DELETE /sessions/<id>: stop and drop a session.
+
+        Args:
+            manager (SessionManager): The sessions.
+            max_connections (int): Largest number of open connections.
+            request_timeout (float): Seconds to receive a request, also the idle time of a kept-alive connection.
+            write_timeout (float): Seconds a client may take to read a response.
+            max_wait (float): Longest long poll in seconds.
+        """
+        self.manager = manager
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.write_timeout = write_timeout
+        self.max_wait = max_wait
+        self._connections = {} # Writer of every open connection by the task serving it
+
+    async def start(self, host="127.0.0.1", port=8080, unix_path=None):
+        """
+        Start listening.
+
+        Args:
+            host (str): Address of the TCP socket.
+            port (int): Port of the TCP socket.
+            unix_path (str): Path of a Unix socket to listen on instead of TCP.
+
+        Returns:
+            asyncio.Server: The listening server.
+        """
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle, path=unix_path)
+        return await asyncio.start_server(self.handle, host, port, backlog=1024)
+
+    async def handle(self, reader, writer):
+        """
+        Serve the requests of one connection.
+
+        Args:
+            reader (asyncio.StreamReader): The incoming stream.
+            writer (asyncio.StreamWriter): The outgoing stream.
+        """
+        if len(self._connections) >= self.max_connections:
+            await self._respond(writer, 503, {"error": "Too many connections"}, keep_alive=False)
+            writer.close()
+            return
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                # A client that does not send the whole request in time is cut off, which ends the reads below
+                timer = loop.call_later(self.request_timeout, writer.transport.abort)
+                try:
+                    head = await self._read_head(reader)
+                    if head is None:
+                        break
+                    method, target, headers = head
+                    length = int(headers.get("content-length", 0))
+                    if not 0 <= length <= MAX_BODY:
+                        await self._respond(writer, 413, {"error": f"Bodies are limited to {MAX_BODY} bytes"},
+                                            keep_alive=False)
+                        break
+                    body = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+                    break
+                finally:
+                    timer.cancel()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self.dispatch(method, target, body)
+                if not await self._respond(writer, status, payload, keep_alive) or not keep_alive:
+                    break
+        finally:
+            del self._connections[task]
+            writer.close()
+
+    async def close(self):
+        """
+        Close all open connections and wait until their requests are finished.
+        """
+        tasks = list(self._connections)
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def dispatch(self, method, target, body):
+        """
+        Answer one request.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The path and query of the request.
+            body (bytes): The request body.
+
+        Returns:
+            tuple: The status code and the JSON payload.
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise ValueError("The request body must be a JSON object")
+            if parts == ["sessions"]:
+                if method == "GET":
+                    return 200, self.manager.stats()
+                if method == "POST":
+                    session = self.manager.create_session(**data)
+                    return 201, session.snapshot()
+            elif len(parts) == 2 and parts[0] == "sessions":
+                session = self.manager.get(parts[1])
+                if method == "GET":
+                    if "after" not in query:
+                        return 200, session.snapshot()
+                    wait = min(float(query.get("wait", self.max_wait)), self.max_wait)
+                    return 200, await session.wait_for_period(int(query["after"]), wait)
+                if method == "DELETE":
+                    self.manager.close_session(parts[1])
+                    return 200, {"closed": parts[1]}
+            elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "orders":
+                session = self.manager.get(parts[1])
+                if method == "POST":
+                    session.submit(data.get("echelon"), data.get("action"), data.get("period"))
+                    return 202, session.snapshot()
+            else:
+                return 404, {"error": f"Unknown path {url.path}"}
+            return 405, {"error": f"{method} is not supported on {url.path}"}
+        except KeyError as error:
+            return 404, {"error": str(error.args[0])}
+        except (TypeError, ValueError) as error:
+            return 400, {"error": str(error)}
+        except RuntimeError as error:
+            return 503, {"error": str(error)}
+
+    async def _read_head(self, reader):
+        # Request line and headers, None once the client closed the connection
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        # Write a JSON response, False if the client did not read it in time
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+        # drain only waits while the client lags behind, a client that does not catch up in time is cut off
+        timer = asyncio.get_running_loop().call_later(self.write_timeout, writer.transport.abort)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            return False
+        finally:
+            timer.cancel()
+        return not writer.is_closing()
+
+
+async def serve(policy_path, host="127.0.0.1", port=8080, unix_path=None, max_connections=20000, **manager_kwargs):
+    """
+    Host game sessions against the greedy policy of a policy file until cancelled.
+
+    Args:
+        policy_path (str): Policy file written by agent.policy_io.export_policy.
+        host (str): Address of the TCP socket.
+        port (int): Port of the TCP socket.
+        unix_path (str): Path of a Unix socket to listen on instead of TCP.
+        max_connections (int): Largest number of open connections.
+        **manager_kwargs: Further arguments of SessionManager, e.g. max_sessions or turn_timeout.
+    """
+    from agent.policy_io import MappedPolicy
+
+    manager = SessionManager(MappedPolicy(policy_path), problem_env, **manager_kwargs)
+    game_server = GameServer(manager, max_connections=max_connections)
+    server = await game_server.start(host, port, unix_path)
+    logger.info(f"Serving game sessions on {unix_path or f'{host}:{port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # Sessions first, so long polls return with the final snapshots
+        await manager.close()
+        await game_server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host beer games played by people against a learned policy.")
+    parser.add_argument("--policy", required=True, help="Policy file written by export_policy")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", help="Unix socket path to listen on instead of TCP")
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--max-connections", type=int, default=20000)
+    parser.add_argument("--turn-timeout", type=float, default=60.0, help="Seconds to wait for the orders of a period")
+    parser.add_argument("--max-missed-turns", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(lineno)d - %(message)s')
+    try:
+        asyncio.run(serve(args.policy, args.host, args.port, args.unix, max_connections=args.max_connections,
+                          max_sessions=args.max_sessions, turn_timeout=args.turn_timeout,
+                          max_missed_turns=args.max_missed_turns))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
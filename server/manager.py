@@ -0,0 +1,129 @@
+# Hosting many concurrent beer game sessions in one asyncio event loop
+import asyncio
+import itertools
+import logging
+import uuid
+
+from server.session import GameSession
+
+logger = logging.getLogger(__name__)
+
+
+class SessionManager:
+    def __init__(self, policy, env_factory, max_sessions=10000, turn_timeout=60.0, max_missed_turns=3,
+                 finished_ttl=300.0, **session_kwargs):
+        """
+        Create, run and expire game sessions. Every session runs as its own task on the running event loop and
+        only holds a small environment, so thousands of sessions share one process. Once max_sessions sessions
+        are open new ones are refused, and ended sessions are dropped finished_ttl seconds after their end.
+
+        Args:
+            policy (object): Greedy policy of the echelons not played by people, shared by all sessions,
+                anything with choose_greedy(coded_state).
+            env_factory (callable): Builds a fresh SupplyChainEnv for a session, called with the keyword arguments
+                given to create_session, e.g. the name of a test problem.
+            max_sessions (int): Largest number of sessions kept at once, including ended ones not yet dropped.
+            turn_timeout (float): Seconds a session waits for the players' orders of a period.
+            max_missed_turns (int): Number of consecutive periods without orders before a session is abandoned.
+            finished_ttl (float): Seconds an ended session can still be looked up.
+            **session_kwargs: Further arguments of GameSession, e.g. timeout_action or period_delay.
+        """
+        self.policy = policy
+        self.env_factory = env_factory
+        self.max_sessions = max_sessions
+        self.turn_timeout = turn_timeout
+        self.max_missed_turns = max_missed_turns
+        self.finished_ttl = finished_ttl
+        self.session_kwargs = session_kwargs
+        self.sessions = {}
+        self._tasks = {}
+        self._counter = itertools.count(1)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def create_session(self, humans=(), time_horizon=None, **env_kwargs):
+        """
+        Open a session and start playing it.
+
+        Args:
+            humans (list): Echelons played by people, none for a game between agents.
+            time_horizon (int): Number of periods, defaults to the length of the environment's customer demand.
+            **env_kwargs: Arguments of env_factory.
+
+        Returns:
+            GameSession: The session.
+        """
+        if len(self.sessions) >= self.max_sessions:
+            raise RuntimeError(f"The server already hosts {self.max_sessions} sessions")
+        session_id = f"{next(self._counter)}-{uuid.uuid4().hex[:8]}"
+        session = GameSession(session_id, self.env_factory(**env_kwargs), self.policy, humans=humans,
+                              time_horizon=time_horizon, turn_timeout=self.turn_timeout,
+                              max_missed_turns=self.max_missed_turns, **self.session_kwargs)
+        self.sessions[session_id] = session
+        task = asyncio.get_running_loop().create_task(session.run())
+        task.add_done_callback(lambda task: self._session_ended(session_id, task))
+        self._tasks[session_id] = task
+        return session
+
+    def get(self, session_id):
+        """
+        Look up a session.
+
+        Args:
+            session_id (str): Identifier of the session.
+
+        Returns:
+            GameSession: The session.
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(f"Unknown session {session_id}")
+        return session
+
+    def close_session(self, session_id):
+        """
+        Stop a session and drop it, players waiting for it get the closed snapshot.
+
+        Args:
+            session_id (str): Identifier of the session.
+        """
+        self.get(session_id).close()
+        task = self._tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+        self.sessions.pop(session_id, None)
+
+    def stats(self):
+        """
+        Count the sessions by status.
+
+        Returns:
+            dict: Number of sessions per status and in total, and the session limit.
+        """
+        counts = {}
+        for session in self.sessions.values():
+            counts[session.status] = counts.get(session.status, 0) + 1
+        return {"sessions": len(self.sessions), "max_sessions": self.max_sessions, "status": counts}
+
+    async def close(self):
+        """
+        Stop all sessions, pending long polls return the closed snapshots right away.
+        """
+        for session in self.sessions.values():
+            session.close()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.sessions.clear()
+
+    def _session_ended(self, session_id, task):
+        # Keep the ended session for finished_ttl seconds so the players can fetch the result
+        if self._tasks.get(session_id) is not task:
+            return
+        del self._tasks[session_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Session {session_id} failed", exc_info=task.exception())
+        asyncio.get_running_loop().call_later(self.finished_ttl, self.sessions.pop, session_id, None)
@@ -0,0 +1,234 @@
+# Defining beer games played by people and learned policies together, one asyncio task per game
+import asyncio
+
+# Status of a session while it waits for the orders of a period, and once it ended
+WAITING = "waiting"
+FINISHED = "finished"
+ABANDONED = "abandoned" # Ended after the people missed max_missed_turns periods in a row
+FAILED = "failed" # Ended by an error while playing a period
+CLOSED = "closed" # Stopped by the server before the game ended
+
+
+class GameSession:
+    def __init__(self, session_id, env, policy, humans=(), time_horizon=None, turn_timeout=60.0,
+                 max_missed_turns=3, timeout_action=None, period_delay=0.0):
+        """
+        A beer game in which the echelons listed in humans are played through submit and all other echelons by a
+        learned greedy policy. The game is driven by run, which waits for the orders of every period without
+        blocking the event loop, so one process hosts many sessions.
+        A player who has not submitted an order within turn_timeout seconds gets the policy's action (or
+        timeout_action), the session ends as abandoned if no player submitted for max_missed_turns periods in a row,
+        and as failed if playing a period raises.
+        Players observe the game through snapshot and wait_for_period, which always describe the latest period,
+        so a slow player skips periods instead of buffering them.
+
+        Args:
+            session_id (str): Identifier of the session.
+            env (SupplyChainEnv): The environment of this session, not shared with other sessions.
+            policy (object): Greedy policy of the other echelons, anything with choose_greedy(coded_state), e.g. a
+                trained agent, a MappedPolicy or a CompiledPolicy.
+            humans (list): Echelons played by people, none for a game between agents.
+            time_horizon (int): Number of periods, defaults to the length of the environment's customer demand.
+            turn_timeout (float): Seconds to wait for the orders of a period.
+            max_missed_turns (int): Number of consecutive periods without any order before the session is abandoned.
+            timeout_action (int): Action of a player who missed a period, defaults to the policy's action.
+            period_delay (float): Seconds between two periods without players, to let observers follow the game.
+        """
+        num_echelons = len(env.initial_inventory)
+        humans = sorted(set(humans))
+        if any(not 0 <= echelon < num_echelons for echelon in humans):
+            raise ValueError(f"Echelons of the players must be between 0 and {num_echelons - 1}")
+        if time_horizon is None:
+            if env.scenarios is not None:
+                raise ValueError("The time horizon is required for environments drawing scenarios")
+            time_horizon = len(env.customer_demand)
+        if isinstance(time_horizon, bool) or not isinstance(time_horizon, int) or time_horizon <= 0:
+            raise ValueError("The time horizon must be a positive integer")
+        if env.scenarios is None and time_horizon > min(len(env.customer_demand), len(env.lead_times)):
+            raise ValueError(f"The time horizon exceeds the {len(env.customer_demand)} periods of the environment")
+        self.session_id = session_id
+        self.env = env
+        self.policy = policy
+        self.humans = humans
+        self.time_horizon = time_horizon
+        self.turn_timeout = turn_timeout
+        self.max_missed_turns = max_missed_turns
+        self.timeout_action = timeout_action
+        self.period_delay = period_delay
+
+        self.status = WAITING
+        self.total_reward = 0
+        self.last_reward = 0
+        self.last_actions = None
+        self.missed_turns = 0 # Consecutive periods in which no player submitted an order
+        self._state = env.reset()
+        self._orders = {} # Orders submitted for the current period by echelon
+        # Futures and timers instead of asyncio.wait_for, which starts a task per wait
+        self._turn = None # Resolved once every player has submitted the order of the period
+        self._waiters = [] # Resolved whenever the snapshot changes
+
+    @property
+    def period(self):
+        """
+        int: The current period, the number of periods played so far.
+        """
+        return self.env.current_time
+
+    @property
+    def done(self):
+        """
+        bool: Whether the game has ended.
+        """
+        return self.status in (FINISHED, ABANDONED, FAILED, CLOSED)
+
+    def submit(self, echelon, action, period=None):
+        """
+        Submit the order of a player for the current period.
+
+        Args:
+            echelon (int): The echelon of the player.
+            action (int): The action Y of the X+Y rule, the player orders the received order plus Y.
+            period (int): The period the order is meant for, rejected if the game has moved on in the meantime.
+
+        Returns:
+            int: The period of the order.
+        """
+        if self.done:
+            raise ValueError(f"Session {self.session_id} has ended")
+        if echelon not in self.humans:
+            raise ValueError(f"Echelon {echelon} is not played by a person in session {self.session_id}")
+        if isinstance(action, bool) or not isinstance(action, int) or action < 0:
+            raise ValueError("The action must be a non-negative integer")
+        if period is not None and period != self.period:
+            raise ValueError(f"Session {self.session_id} is in period {self.period}, not {period}")
+        if echelon in self._orders:
+            raise ValueError(f"Echelon {echelon} has already ordered in period {self.period}")
+        self._orders[echelon] = action
+        if len(self._orders) == len(self.humans) and self._turn is not None:
+            _wake(self._turn)
+        self._publish()
+        return self.period
+
+    def snapshot(self):
+        """
+        Describe the current state of the game.
+
+        Returns:
+            dict: The status, the period, the inventory levels, backlogs and orders received per echelon,
+                the players still to order, the last actions and rewards and the total cost so far.
+        """
+        env = self.env
+        num_echelons = len(env.inventory_levels)
+        return {
+            "session": self.session_id,
+            "status": self.status,
+            "period": self.period,
+            "time_horizon": self.time_horizon,
+            "humans": self.humans,
+            "waiting_for": [] if self.done else [echelon for echelon in self.humans if echelon not in self._orders],
+            "state": list(self._state),
+            "inventory": list(env.inventory_levels),
+            "backlog": list(env.order_backlog),
+            "received_orders": list(env.required_inventory[:num_echelons]),
+            "last_actions": self.last_actions,
+            "last_reward": self.last_reward,
+            "total_cost": -self.total_reward,
+        }
+
+    async def wait_for_period(self, after, timeout):
+        """
+        Wait until the game has moved past a period or ended.
+
+        Args:
+            after (int): The last period the caller has seen.
+            timeout (float): Longest time to wait in seconds.
+
+        Returns:
+            dict: The snapshot, unchanged if the timeout expired first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.period <= after and not self.done and loop.time() < deadline:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            timer = loop.call_at(deadline, _wake, waiter)
+            try:
+                await waiter
+            finally:
+                timer.cancel()
+        return self.snapshot()
+
+    async def run(self):
+        """
+        Play the game to the end, waiting for the players' orders in every period.
+
+        Returns:
+            dict: The final snapshot.
+        """
+        loop = asyncio.get_running_loop()
+        while self.period < self.time_horizon:
+            if self.humans:
+                if len(self._orders) < len(self.humans):
+                    self._turn = loop.create_future()
+                    timer = loop.call_later(self.turn_timeout, _wake, self._turn)
+                    try:
+                        await self._turn
+                    finally:
+                        timer.cancel()
+                        self._turn = None
+                self.missed_turns = 0 if self._orders else self.missed_turns + 1
+                if self.missed_turns >= self.max_missed_turns:
+                    self.status = ABANDONED
+                    break
+            elif self.period_delay:
+                await asyncio.sleep(self.period_delay)
+            else:
+                # Let the other sessions run between the periods of a game between agents
+                await asyncio.sleep(0)
+            try:
+                self._play_period()
+            except Exception:
+                # Release the waiting players with the terminal status, the manager logs the error
+                self.status = FAILED
+                self._publish()
+                raise
+
+        if not self.done:
+            self.status = FINISHED
+        self._publish()
+        return self.snapshot()
+
+    def close(self):
+        """
+        End the game as closed unless it has already ended, and release the waiting players with the final snapshot.
+        The task running the game is stopped by the caller, see SessionManager.close.
+        """
+        if not self.done:
+            self.status = CLOSED
+        self._publish()
+
+    def _play_period(self):
+        # Combine the players' orders with the policy's actions and step the environment
+        action = list(self.policy.choose_greedy(self._state))
+        for echelon in self.humans:
+            if echelon in self._orders:
+                action[echelon] = self._orders[echelon]
+            elif self.timeout_action is not None:
+                action[echelon] = self.timeout_action
+        self._state, self.last_reward = self.env.step(action)
+        self.total_reward += self.last_reward
+        self.last_actions = action
+        self._orders = {}
+        self._publish()
+
+    def _publish(self):
+        # Wake up everyone waiting for a change
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            _wake(waiter)
+
+
+def _wake(future):
+    # Resolve a future unless it is already done, e.g. cancelled together with its caller
+    if not future.done():
+        future.set_result(None)
@@ -15,6 +15,9 @@ setup(
         'numpy>=1.19.0',
         'pytest>=6.0.0'
     ],
+    extras_require={
+        'jit': ['numba>=0.50.0'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
@@ -24,6 +27,9 @@ setup(
     entry_points={
         'console_scripts': [
             'supply_chain_sim=main:main',
+            'supply_chain_runner=utils.runner:main',
+            'supply_chain_sweep=utils.sweep:main',
+            'supply_chain_server=server.api:main',
         ],
     },
 )
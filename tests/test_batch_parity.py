@@ -0,0 +1,38 @@
+# Checking that every lane of BatchSupplyChainEnv follows SupplyChainEnv step by step
+import numpy as np
+import pytest
+
+from environment.batch_supply_chain import BatchSupplyChainEnv
+from environment.supply_chain import SupplyChainEnv
+from environment.topology import SupplyChainTopology
+
+CASES = {
+    "serial_integer_costs": (SupplyChainTopology.serial(4), [1, 1, 1, 1], [2, 2, 2, 2]),
+    "serial_fractional_costs": (SupplyChainTopology.serial(4), [0.5, 0.5, 0.5, 0.5], [1.5, 1.5, 1.5, 1.5]),
+    "tree_fractional_costs": (SupplyChainTopology.divergent(3), [0.5, 0.25, 0.75, 1, 1.5, 0.5],
+                              [1.5, 2.25, 1, 0.5, 3, 2]),
+}
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_lanes_match_single_env(case):
+    topology, holding_costs, penalty_costs = CASES[case]
+    n_envs, horizon, num_echelons = 3, 30, topology.num_echelons
+    rng = np.random.default_rng(0)
+    initial_inventory = [12] * num_echelons
+    customer_demand = rng.integers(0, 15, size=(n_envs, horizon, len(topology.retailers)))
+    lead_times = rng.integers(0, 5, size=(n_envs, horizon))
+    actions = rng.integers(0, 4, size=(horizon, n_envs, num_echelons))
+
+    batch = BatchSupplyChainEnv(n_envs, initial_inventory, holding_costs, penalty_costs, customer_demand, lead_times,
+                                max_lead_time=4, topology=topology)
+    batch_rewards = [batch.step(actions[t])[1] for t in range(horizon)]
+    for lane in range(n_envs):
+        env = SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, customer_demand[lane].tolist(),
+                             lead_times[lane].tolist(), max_lead_time=4, topology=topology)
+        for t in range(horizon):
+            state, reward = env.step(actions[t, lane].tolist())
+            assert batch_rewards[t][lane] == reward
+        assert batch.get_state()[lane].tolist() == list(state)
+        assert batch.inventory_levels[lane].tolist() == env.inventory_levels
+        assert batch.order_backlog[lane].tolist() == env.order_backlog
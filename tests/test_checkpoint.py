@@ -0,0 +1,49 @@
+# Checking that training resumed from a checkpoint continues exactly as an uninterrupted run
+import numpy as np
+import pytest
+
+from agent.dense_q_learning import DenseQLearning
+from agent.parallel_q_learning import ParallelQLearning
+from agent.q_learning import QLearning
+from data.test_problems import actions, initial_inventory, holding_costs, penalty_costs, state_space, test_problems
+from environment.scenarios import UniformScenarios
+from environment.supply_chain import SupplyChainEnv
+from utils.sweep import BudgetStop
+
+
+def make_main_env():
+    return SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, test_problems["main"]["customer_demand"],
+                          test_problems["main"]["lead_times"])
+
+
+def make_scenario_env():
+    return SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, scenarios=UniformScenarios(seed=7))
+
+
+@pytest.mark.parametrize("agent_class", [QLearning, DenseQLearning])
+@pytest.mark.parametrize("make_env", [make_main_env, make_scenario_env])
+def test_resumed_equals_uninterrupted(tmp_path, agent_class, make_env):
+    def make_agent():
+        return agent_class(actions, state_space, time_horizon=35, max_iterations=8, seed=4)
+
+    uninterrupted = make_agent()
+    logs, simulation_log = uninterrupted.train(make_env())
+
+    checkpoint_path = str(tmp_path / "checkpoint.npz")
+    make_agent().train(make_env(), checkpoint_path=checkpoint_path, monitor=BudgetStop(3))
+    # A new process: fresh agent and environment, everything else comes from the checkpoint
+    resumed = make_agent()
+    resumed_logs, resumed_simulation_log = resumed.train(make_env(), checkpoint_path=checkpoint_path, resume=True)
+
+    assert resumed_logs == logs[3:]
+    assert resumed_simulation_log == simulation_log
+    entries, resumed_entries = uninterrupted.get_Q_entries(), resumed.get_Q_entries()
+    for name in entries:
+        assert np.array_equal(resumed_entries[name], entries[name])
+
+
+@pytest.mark.parametrize("agent_class", [QLearning, ParallelQLearning])
+def test_checkpoint_every_requires_path(agent_class):
+    agent = agent_class(actions, state_space, time_horizon=35, max_iterations=2, seed=4)
+    with pytest.raises(ValueError):
+        agent.train(make_main_env(), checkpoint_every=1)
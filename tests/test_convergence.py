@@ -0,0 +1,31 @@
+# Checking that the greedy evaluations of ConvergenceMonitor do not change the course of training
+import numpy as np
+import pytest
+
+from agent.convergence import ConvergenceMonitor
+from agent.dense_q_learning import DenseQLearning
+from data.test_problems import actions, initial_inventory, holding_costs, penalty_costs, state_space, test_problems
+from environment.scenarios import UniformScenarios
+from environment.supply_chain import SupplyChainEnv
+
+
+def make_main_env():
+    return SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, test_problems["main"]["customer_demand"],
+                          test_problems["main"]["lead_times"])
+
+
+def make_scenario_env():
+    return SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, scenarios=UniformScenarios(seed=7))
+
+
+@pytest.mark.parametrize("make_env", [make_main_env, make_scenario_env])
+def test_evaluations_keep_training_unchanged(make_env):
+    plain = DenseQLearning(actions, state_space, time_horizon=35, max_iterations=6, seed=2)
+    monitored = DenseQLearning(actions, state_space, time_horizon=35, max_iterations=6, seed=2)
+    plain_logs, _ = plain.train(make_env())
+    monitor = ConvergenceMonitor(check_every=2, evaluate_every=1)
+    monitored_logs, _ = monitored.train(make_env(), monitor=monitor)
+
+    assert len([record for record in monitor.history if "greedy_reward" in record]) == 6
+    assert monitored_logs == plain_logs
+    assert np.array_equal(monitored._values, plain._values)
@@ -0,0 +1,35 @@
+# Checking the batched evaluation of compiled policies against stepping SupplyChainEnv
+import numpy as np
+import pytest
+
+from agent.dense_q_learning import DenseQLearning
+from agent.evaluation import compile_policy, evaluate_policy
+from data.test_problems import actions, initial_inventory, state_space, test_problems
+from environment.supply_chain import SupplyChainEnv
+
+
+@pytest.mark.parametrize("costs", [([1, 1, 1, 1], [2, 2, 2, 2]), ([0.5, 0.5, 0.5, 0.5], [1.5, 1.5, 1.5, 1.5])])
+def test_costs_match_single_env(costs):
+    holding_costs, penalty_costs = costs
+    problem = test_problems["main"]
+    agent = DenseQLearning(actions, state_space, time_horizon=35, max_iterations=20, seed=0)
+    agent.train(SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, problem["customer_demand"],
+                               problem["lead_times"]))
+    policy = compile_policy(agent)
+
+    rng = np.random.default_rng(1)
+    customer_demand = rng.integers(0, 15, size=(5, 35))
+    lead_times = rng.integers(0, 5, size=(5, 35))
+    summary = evaluate_policy(policy, customer_demand, lead_times, initial_inventory, holding_costs, penalty_costs,
+                              batch_size=2, max_lead_time=4)
+
+    expected = []
+    for demand, lead_time in zip(customer_demand.tolist(), lead_times.tolist()):
+        env = SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, demand, lead_time, max_lead_time=4)
+        state, total_reward = env.reset(), 0
+        for _ in range(35):
+            state, reward = env.step(policy.choose_greedy(state))
+            total_reward += reward
+        expected.append(-total_reward)
+    assert summary["costs"].tolist() == expected
+    assert summary["max"] == max(expected)
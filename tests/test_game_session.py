@@ -0,0 +1,71 @@
+# Checking the validation and the terminal states of the game sessions
+import asyncio
+import json
+
+import pytest
+
+from data.test_problems import problem_env
+from server.api import GameServer
+from server.manager import SessionManager
+
+
+class GreedyZero:
+    # Policy ordering nothing beyond the received orders
+    def choose_greedy(self, state):
+        return (0,) * len(state)
+
+
+class Broken:
+    def choose_greedy(self, state):
+        raise RuntimeError("policy failed")
+
+
+@pytest.mark.parametrize("time_horizon", [0, -1, 36, 1000, "10", 2.5, True])
+def test_invalid_time_horizon_is_rejected(time_horizon):
+    async def create():
+        server = GameServer(SessionManager(GreedyZero(), problem_env))
+        return await server.dispatch("POST", "/sessions", json.dumps({"time_horizon": time_horizon}).encode())
+
+    status, payload = asyncio.run(create())
+    assert status == 400, payload
+
+
+def test_session_plays_to_the_end():
+    async def play():
+        manager = SessionManager(GreedyZero(), problem_env)
+        session = manager.create_session(time_horizon=10)
+        return await session.wait_for_period(9, 5.0)
+
+    snapshot = asyncio.run(play())
+    assert snapshot["status"] == "finished"
+    assert snapshot["period"] == 10
+
+
+def test_failing_session_releases_waiting_players():
+    async def play():
+        manager = SessionManager(Broken(), problem_env)
+        session = manager.create_session()
+        snapshot = await session.wait_for_period(0, 5.0)
+        await asyncio.sleep(0)
+        return snapshot
+
+    snapshot = asyncio.run(play())
+    assert snapshot["status"] == "failed"
+    assert snapshot["waiting_for"] == []
+
+
+def test_close_releases_pending_long_polls():
+    async def play():
+        manager = SessionManager(GreedyZero(), problem_env, turn_timeout=60.0)
+        session = manager.create_session(humans=[0])
+        poll = asyncio.get_running_loop().create_task(session.wait_for_period(0, 30.0))
+        await asyncio.sleep(0.05)
+        start = asyncio.get_running_loop().time()
+        await manager.close()
+        snapshot = await asyncio.wait_for(poll, 1.0)
+        return snapshot, asyncio.get_running_loop().time() - start
+
+    snapshot, seconds = asyncio.run(play())
+    assert snapshot["status"] == "closed"
+    assert snapshot["waiting_for"] == []
+    assert seconds < 1.0
@@ -0,0 +1,58 @@
+# Checking that the compiled training episodes of JitQLearning match DenseQLearning on SupplyChainEnv
+import numpy as np
+import pytest
+
+from agent.dense_q_learning import DenseQLearning
+from agent.jit_q_learning import JitQLearning
+from data.test_problems import actions, initial_inventory, holding_costs, penalty_costs, state_space, test_problems
+from environment.scenarios import UniformScenarios
+from environment.supply_chain import SupplyChainEnv
+
+
+def make_main_env(costs=(holding_costs, penalty_costs)):
+    return SupplyChainEnv(initial_inventory, costs[0], costs[1], test_problems["main"]["customer_demand"],
+                          test_problems["main"]["lead_times"])
+
+
+def make_scenario_env():
+    # 300 periods are longer than one chunk of the scenario stream
+    return SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, scenarios=UniformScenarios(seed=7))
+
+
+CASES = {
+    "integer_costs": (make_main_env, 35),
+    "float_costs": (lambda: make_main_env(([0.1, 0.5, 1.3, 0.7], [2.5, 1.1, 0.3, 3.9])), 35),
+    "scenario_stream": (make_scenario_env, 300),
+}
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_training_matches_dense(case):
+    make_env, horizon = CASES[case]
+    dense = DenseQLearning(actions, state_space, time_horizon=horizon, max_iterations=5, seed=3)
+    jit = JitQLearning(actions, state_space, time_horizon=horizon, max_iterations=5, seed=3, use_jit=True)
+    dense_logs, dense_simulation = dense.train(make_env())
+    jit_logs, jit_simulation = jit.train(make_env())
+
+    # States, actions, rewards, demands, inventory levels and backlogs of every period
+    assert jit_logs == dense_logs
+    assert jit_simulation == dense_simulation
+    assert np.array_equal(jit._values, dense._values)
+    assert np.array_equal(jit._visited, dense._visited)
+    assert np.array_equal(jit._masked_values, dense._masked_values)
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_episode_leaves_same_environment(case):
+    make_env, horizon = CASES[case]
+    dense_env, jit_env = make_env(), make_env()
+    dense = DenseQLearning(actions, state_space, time_horizon=horizon, seed=1)
+    jit = JitQLearning(actions, state_space, time_horizon=horizon, seed=1, use_jit=True)
+    dense_log, dense_reward = dense.run_episode(dense_env, 0.5)
+    jit_log, jit_reward = jit.run_episode(jit_env, 0.5)
+
+    assert jit_reward == dense_reward
+    assert type(jit_reward) is type(dense_reward)
+    for name in ("inventory_levels", "order_backlog", "pending_orders", "owed", "required_inventory", "current_time",
+                 "state_index", "echelon_holding_costs", "echelon_penalty_costs"):
+        assert getattr(jit_env, name) == getattr(dense_env, name), name
@@ -0,0 +1,23 @@
+# Checking that exported policies act as the agent's greedy policy
+import numpy as np
+
+from agent.dense_q_learning import DenseQLearning
+from agent.policy_io import policy_arrays
+from data.test_problems import actions, state_space
+from environment.state_coding import StateCoder
+
+
+def test_greedy_actions_from_full_precision_values():
+    agent = DenseQLearning(actions, state_space, time_horizon=35, max_iterations=1, seed=0)
+    # The two values of the first echelon only differ below float32 precision
+    agent.set_Q_entries({
+        "Q_agents": np.array([0, 0, 1], dtype=np.int32),
+        "Q_states": np.array([[2, 3, 4, 5]] * 3, dtype=np.int16),
+        "Q_actions": np.array([1, 2, 0], dtype=np.int32),
+        "Q_values": np.array([-10.0, -10.0 + 1e-9, -4.0]),
+    })
+
+    arrays = policy_arrays(agent, StateCoder(num_echelons=4), fallback_action=0)
+
+    assert arrays["q_values"].dtype == np.float32
+    assert arrays["greedy_actions"][0, :2].tolist() == list(agent.choose_greedy((2, 3, 4, 5)))[:2] == [2, 0]
@@ -0,0 +1,49 @@
+# Checking that the sparse agent keeps the states of finer state codings apart
+import numpy as np
+import pytest
+
+from agent.dense_q_learning import DenseQLearning
+from agent.sparse_q_learning import SparseQLearning
+from agent.sparse_q_table import SparseQTable
+from data.test_problems import actions, initial_inventory, holding_costs, penalty_costs, test_problems
+from environment.state_coding import StateCoder
+from environment.supply_chain import SupplyChainEnv
+
+FINE_BIN_EDGES = [-12, -8, -6, -3, 0, 3, 6, 10, 15, 20, 25, 30]
+
+
+def make_env(state_coder=None):
+    return SupplyChainEnv(initial_inventory, holding_costs, penalty_costs, test_problems["main"]["customer_demand"],
+                          test_problems["main"]["lead_times"], state_coder=state_coder)
+
+
+def test_takes_n_codes_from_state_coder():
+    state_coder = StateCoder(FINE_BIN_EDGES, num_echelons=len(initial_inventory))
+    dense = DenseQLearning(actions, state_coder.state_space(), time_horizon=35, max_iterations=10, seed=3)
+    sparse = SparseQLearning(actions, num_agents=len(initial_inventory), dtype=np.float64, time_horizon=35,
+                             max_iterations=10, seed=3)
+    dense_logs, dense_simulation_log = dense.train(make_env(state_coder))
+    sparse_logs, sparse_simulation_log = sparse.train(make_env(state_coder))
+
+    assert sparse.n_codes == state_coder.n_codes
+    assert sparse_logs == dense_logs
+    assert sparse_simulation_log == dense_simulation_log
+    assert sparse.num_Q_states() == dense.num_Q_states()
+
+
+def test_rejects_other_state_coder():
+    state_coder = StateCoder(FINE_BIN_EDGES, num_echelons=len(initial_inventory))
+    sparse = SparseQLearning(actions, num_agents=len(initial_inventory), n_codes=9, time_horizon=35, max_iterations=2)
+    with pytest.raises(ValueError):
+        sparse.train(make_env(state_coder))
+
+
+def test_rejects_codes_out_of_range():
+    table = SparseQTable(2, 3, 9)
+    for state in [(1, 10), (0, 1)]:
+        with pytest.raises(ValueError):
+            table.key(state)
+        with pytest.raises(ValueError):
+            table.keys(np.array([state]))
+    with pytest.raises(ValueError):
+        StateCoder(num_echelons=2).index((1, 10))
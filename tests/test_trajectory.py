@@ -0,0 +1,44 @@
+# Checking the conversion of tuple logs into trajectories
+import numpy as np
+
+from agent.dense_q_learning import DenseQLearning
+from data.test_problems import actions, initial_inventory, state_space, test_problems
+from environment.supply_chain import SupplyChainEnv
+from utils.analysis import calculate_rewards
+from utils.log_sinks import FileSink
+from utils.trajectory import COLUMNS, Trajectory, TrajectoryWriter
+
+
+def test_from_empty_logs():
+    for logs in ([], [[]]):
+        trajectory = Trajectory.from_logs(logs)
+        assert len(trajectory) == 0
+        for name, (dtype, per_echelon) in COLUMNS.items():
+            values = getattr(trajectory, name)
+            assert values.dtype == np.dtype(dtype)
+            assert values.shape == ((0, 0) if per_echelon else (0,))
+
+
+def test_writer_skips_empty_episodes(tmp_path):
+    episode_log = [((1, 2), (0, 1), 0, 4, (12, 12), (0, 0)), ((2, 2), (1, 1), -5, 4, (8, 10), (0, 0))]
+    writer = TrajectoryWriter(str(tmp_path))
+    writer.append(Trajectory.from_logs([episode_log]))
+    writer.append(Trajectory.from_logs([[]], [2]))
+    writer.close()
+
+    trajectory = Trajectory.load(str(tmp_path))
+    assert trajectory.state.tolist() == [[1, 2], [2, 2]]
+    assert trajectory.reward.tolist() == [0, -5]
+
+
+def test_fractional_rewards_round_trip(tmp_path):
+    env = SupplyChainEnv(initial_inventory, [0.5] * 4, [1.5] * 4, test_problems["main"]["customer_demand"],
+                         test_problems["main"]["lead_times"])
+    sink = FileSink(str(tmp_path))
+    agent = DenseQLearning(actions, state_space, time_horizon=35, max_iterations=2, seed=0)
+    agent.train(env, log_sink=sink)
+
+    trajectory = Trajectory.load(str(tmp_path))
+    assert trajectory.reward.dtype == np.float64
+    assert calculate_rewards(trajectory) == sink.episode_rewards
+    assert any(not float(reward).is_integer() for reward in sink.episode_rewards)
@@ -1,4 +1,6 @@
-import pandas as pd
+import numpy as np
+
+from utils.trajectory import Trajectory
 
 
 def print_logs(logs, num_episodes=1):
@@ -6,13 +8,24 @@ def print_logs(logs, num_episodes=1):
     Prints the logs of the last few episodes.
 
     Args:
-        logs (list): The list of logs from the training process.
+        logs (list): The list of logs from the training process, the log sink used for training or a Trajectory.
         num_episodes (int): Number of recent episodes to print.
     """
-    for episode_index in range(-num_episodes, 0):
+    if isinstance(logs, Trajectory):
+        for episode in np.unique(logs.episode)[-num_episodes:]:
+            print(f"Episode {episode}")
+            print(logs.select_episodes([episode]).to_dataframe())
+            print("\n")
+        return
+
+    import pandas as pd
+
+    # Log sinks may drop episodes, so they keep the episode number of each retained log
+    episode_numbers = list(getattr(logs, 'episode_numbers', range(1, len(logs) + 1)))
+    for episode_index in range(-min(num_episodes, len(logs)), 0):
         episode_log = logs[episode_index]
         df = pd.DataFrame(episode_log, columns=['State', 'Action', 'Reward', 'Demand', 'Inventory Levels', 'Order Backlog'])
-        print(f"Episode {len(logs) + episode_index + 1}")
+        print(f"Episode {episode_numbers[episode_index]}")
         print(df)
         print("\n")
 
@@ -21,11 +34,22 @@ def calculate_rewards(logs):
     Calculates total rewards per episode.
 
     Args:
-        logs (list): The list of logs from the training process.
+        logs (list): The list of logs from the training process, the log sink used for training or a Trajectory.
 
     Returns:
         list: Total rewards for each episode.
     """
+    if isinstance(logs, Trajectory):
+        if len(logs) == 0:
+            return []
+        # Rows of an episode are contiguous, sum the rewards between the episode boundaries
+        first_rows = np.flatnonzero(np.r_[True, logs.episode[1:] != logs.episode[:-1]])
+        return np.add.reduceat(logs.reward, first_rows).tolist()
+
+    # Log sinks keep the total reward of every episode, also of those they did not log
+    if hasattr(logs, 'episode_rewards'):
+        return list(logs.episode_rewards)
+
     episode_rewards = []
     for episode in logs:
         total_episode_reward = sum(log[2] for log in episode)
@@ -37,8 +61,15 @@ def print_simulation_log(simulation_log):
     Prints the simulation log.
 
     Args:
-        simulation_log (list): The log of the simulation process.
+        simulation_log (list): The log of the simulation process, or a Trajectory.
     """
+    if isinstance(simulation_log, Trajectory):
+        print(simulation_log.to_dataframe())
+        print("\n")
+        return
+
+    import pandas as pd
+
     df = pd.DataFrame(simulation_log, columns=['State', 'Action', 'Reward', 'Demand', 'Inventory Levels', 'Order Backlog'])
     print(df)
     print("\n")
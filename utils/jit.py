@@ -0,0 +1,28 @@
+# Optional just-in-time compilation with numba
+import logging
+
+try:
+    import numba
+except ImportError:
+    numba = None
+else:
+    # numba logs every compilation step at debug level, which floods the debug logging of utils.logger
+    logging.getLogger("numba").setLevel(logging.WARNING)
+
+# Whether compiled kernels are available, without numba they run as plain Python functions
+NUMBA_AVAILABLE = numba is not None
+
+
+def njit(*args, **kwargs):
+    """
+    Compile a function with numba.njit if numba is installed, otherwise return it unchanged.
+    Can be used as @njit or with options, e.g. @njit(cache=True).
+
+    Returns:
+        function: The compiled function, or the decorator when called with options.
+    """
+    if numba is not None:
+        return numba.njit(*args, **kwargs)
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return lambda func: func
@@ -0,0 +1,221 @@
+# Computing supply chain KPIs of many episodes at once from columnar trajectories
+import numpy as np
+
+from environment.topology import SupplyChainTopology
+from utils.trajectory import Trajectory
+
+# Per-echelon KPIs returned by episode_kpis, each of shape (episodes, num_echelons)
+ECHELON_KPIS = ("bullwhip", "fill_rate", "backlog_periods", "mean_backlog_duration", "holding_cost", "penalty_cost")
+
+
+def _segment_sums(values, first_rows):
+    # Sum of the rows of every episode, values of shape (rows,) or (rows, num_echelons)
+    if len(first_rows) == 0:
+        return np.zeros((0,) + values.shape[1:], dtype=values.dtype)
+    return np.add.reduceat(values, first_rows, axis=0)
+
+
+def _ratio(numerator, denominator):
+    # Elementwise ratio, NaN where the denominator is 0
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=np.float64),
+                                                 np.asarray(denominator, dtype=np.float64))
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=denominator != 0)
+
+
+def _variance(sums, squares, counts):
+    # Population variance from the sums and the sums of squares of the segments
+    mean = _ratio(sums, counts)
+    return _ratio(squares, counts) - mean ** 2
+
+
+def received_orders(trajectory, topology=None, demand_is_total=False):
+    """
+    Reconstruct the order each echelon received (X of the X+Y rule) and placed (X + Y) in every period.
+
+    Args:
+        trajectory (Trajectory): The logs, rows of an episode in period order.
+        topology (SupplyChainTopology): Which echelon supplies which, defaults to a serial chain.
+        demand_is_total (bool): Whether the logged demand is the sum over several retailers, as for customer demand
+            entries with one demand per retailer. It is then split evenly between the retailers, which is exact
+            only if they all face the same demand. By default every retailer faces the logged demand.
+
+    Returns:
+        tuple: The received and the placed orders, each of shape (rows, num_echelons).
+    """
+    num_echelons = trajectory.num_echelons
+    if topology is None:
+        topology = SupplyChainTopology.serial(num_echelons)
+    actions = np.asarray(trajectory.action, dtype=np.int64)
+    demand = np.asarray(trajectory.demand, dtype=np.int64)
+    if topology.is_serial:
+        # Every echelon receives the customer demand plus the actions of the echelons below it
+        received = np.empty_like(actions)
+        received[:, 0] = demand
+        received[:, 1:] = demand[:, None] + np.cumsum(actions[:, :-1], axis=1)
+    else:
+        # The retailers below an echelon pass on their demand, the echelons below it their actions
+        retailer_counts = topology.retailer_descendants.sum(axis=1)
+        if demand_is_total:
+            received = demand[:, None] * (retailer_counts / len(topology.retailers)) + actions @ topology.descendants.T
+        else:
+            received = demand[:, None] * retailer_counts + actions @ topology.descendants.T
+    return received, received + actions
+
+
+def episode_kpis(trajectory, holding_costs, penalty_costs, topology=None, demand_is_total=False):
+    """
+    Compute the KPIs of every episode of a trajectory, vectorized over all episodes at once.
+    The periods of an episode are the transitions between its rows, the last row holds the final state.
+
+    - bullwhip: variance of the orders an echelon placed over the variance of the logged customer demand.
+    - fill_rate: share of the orders an echelon received that it shipped in the same period from stock.
+      A received order that creates new backlog is partly unfilled, the new backlog is the smaller of the backlog
+      after the period and the received order, as backorders are served before new orders.
+    - backlog_periods: number of periods that end with backlog.
+    - mean_backlog_duration: mean length of the runs of consecutive periods ending with backlog.
+    - holding_cost and penalty_cost: the costs of the episode, summed over the periods.
+    Ratios without a denominator (no demand variance, no orders, no backlog) are NaN.
+
+    Args:
+        trajectory (Trajectory): The logs, rows of an episode contiguous and in period order.
+        holding_costs (list): Holding costs per unit for each level in the supply chain.
+        penalty_costs (list): Penalty costs per unit for each level in the supply chain.
+        topology (SupplyChainTopology): Which echelon supplies which, defaults to a serial chain.
+        demand_is_total (bool): Whether the logged demand is the sum over the retailers, see received_orders.
+
+    Returns:
+        dict: The episode numbers ("episode", shape (episodes,)), the per-echelon KPIs of ECHELON_KPIS with shape
+            (episodes, num_echelons) and the "total_cost" per episode.
+    """
+    episode = np.asarray(trajectory.episode)
+    first = np.r_[True, episode[1:] != episode[:-1]] if len(episode) else np.zeros(0, dtype=bool)
+    first_rows = np.flatnonzero(first)
+    # Rows whose period is followed by another row of the same episode
+    steps = np.r_[~first[1:], False] if len(episode) else np.zeros(0, dtype=bool)
+    inventory = np.asarray(trajectory.inventory, dtype=np.int64)
+    backlog = np.asarray(trajectory.backlog, dtype=np.int64)
+    demand = np.asarray(trajectory.demand, dtype=np.int64)
+
+    # Bullwhip ratios from the sums and squares of the orders and of the demand over the periods of each episode
+    received, placed = received_orders(trajectory, topology, demand_is_total)
+    counts = _segment_sums(steps.astype(np.int64), first_rows)
+    step_demand = np.where(steps, demand, 0)
+    step_placed = np.where(steps[:, None], placed, 0)
+    demand_variance = _variance(_segment_sums(step_demand, first_rows),
+                                _segment_sums(step_demand ** 2, first_rows), counts)
+    order_variance = _variance(_segment_sums(step_placed, first_rows),
+                               _segment_sums(step_placed ** 2, first_rows), counts[:, None])
+    bullwhip = _ratio(order_variance, demand_variance[:, None])
+
+    # New backlog of every period, the backlog after the period is in the next row
+    next_backlog = np.empty_like(backlog)
+    next_backlog[:-1] = backlog[1:]
+    next_backlog[-1:] = 0
+    step_received = np.where(steps[:, None], received, 0)
+    unfilled = np.where(steps[:, None], np.minimum(next_backlog, received), 0)
+    received_sums = _segment_sums(step_received, first_rows)
+    fill_rate = 1.0 - _ratio(_segment_sums(unfilled, first_rows), received_sums)
+
+    # Periods ending with backlog, and the first period of each run of them
+    in_backlog = (backlog > 0) & ~first[:, None]
+    run_starts = in_backlog.copy()
+    run_starts[1:] &= ~in_backlog[:-1]
+    backlog_periods = _segment_sums(in_backlog.astype(np.int64), first_rows)
+    mean_backlog_duration = _ratio(backlog_periods, _segment_sums(run_starts.astype(np.int64), first_rows))
+
+    # Costs of the states after every period, as the rewards of SupplyChainEnv
+    after = ~first[:, None]
+    holding_cost = _segment_sums(np.where(after, np.maximum(inventory, 0), 0) * np.asarray(holding_costs), first_rows)
+    penalty_cost = _segment_sums(np.where(after, np.maximum(backlog, 0), 0) * np.asarray(penalty_costs), first_rows)
+
+    return {
+        "episode": episode[first_rows],
+        "bullwhip": bullwhip,
+        "fill_rate": fill_rate,
+        "backlog_periods": backlog_periods,
+        "mean_backlog_duration": mean_backlog_duration,
+        "holding_cost": holding_cost,
+        "penalty_cost": penalty_cost,
+        "total_cost": holding_cost.sum(axis=1) + penalty_cost.sum(axis=1),
+    }
+
+
+def episode_first_rows(episode, block_rows=2 ** 20):
+    """
+    Find the first row of every episode, reading the episode column block by block so a memory-mapped
+    column is not loaded at once.
+
+    Args:
+        episode (np.ndarray): The episode number of each row, rows of an episode contiguous.
+        block_rows (int): Number of rows read at once.
+
+    Returns:
+        np.ndarray: The first rows.
+    """
+    parts = [np.zeros(min(len(episode), 1), dtype=np.int64)]
+    for start in range(0, len(episode), block_rows):
+        # Include the last row of the previous block to see an episode starting at the block boundary
+        offset = max(start - 1, 0)
+        rows = np.asarray(episode[offset:start + block_rows])
+        parts.append(np.flatnonzero(rows[1:] != rows[:-1]) + offset + 1)
+    return np.concatenate(parts)
+
+
+def iter_episode_chunks(trajectory, episodes_per_chunk=10000):
+    """
+    Split a trajectory into chunks of whole episodes. Slicing keeps memory-mapped columns on disk,
+    so a trajectory loaded with Trajectory.load is read one chunk at a time.
+
+    Args:
+        trajectory (Trajectory): The logs, rows of an episode contiguous.
+        episodes_per_chunk (int): Number of episodes per chunk.
+
+    Yields:
+        Trajectory: The rows of the next episodes.
+    """
+    boundaries = np.r_[episode_first_rows(trajectory.episode)[::episodes_per_chunk], len(trajectory)].tolist()
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        yield Trajectory(**{name: values[start:stop] for name, values in trajectory.columns().items()})
+
+
+def chunked_episode_kpis(trajectory, holding_costs, penalty_costs, topology=None, demand_is_total=False,
+                         episodes_per_chunk=10000):
+    """
+    Compute episode_kpis chunk by chunk, for trajectories that do not fit into memory.
+
+    Args:
+        trajectory (Trajectory): The logs, e.g. loaded memory-mapped with Trajectory.load.
+        holding_costs (list): Holding costs per unit for each level in the supply chain.
+        penalty_costs (list): Penalty costs per unit for each level in the supply chain.
+        topology (SupplyChainTopology): Which echelon supplies which, defaults to a serial chain.
+        demand_is_total (bool): Whether the logged demand is the sum over the retailers, see received_orders.
+        episodes_per_chunk (int): Number of episodes per chunk.
+
+    Returns:
+        dict: The KPIs of every episode, as returned by episode_kpis.
+    """
+    parts = [episode_kpis(chunk, holding_costs, penalty_costs, topology, demand_is_total)
+             for chunk in iter_episode_chunks(trajectory, episodes_per_chunk)]
+    if not parts:
+        return episode_kpis(trajectory, holding_costs, penalty_costs, topology, demand_is_total)
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def summarize_kpis(kpis):
+    """
+    Average the KPIs over the episodes, ignoring the NaN ratios.
+
+    Args:
+        kpis (dict): The KPIs of every episode, as returned by episode_kpis.
+
+    Returns:
+        dict: The mean of every KPI per echelon as a list, and the mean total cost.
+    """
+    summary = {}
+    for name in ECHELON_KPIS:
+        values = np.asarray(kpis[name], dtype=np.float64)
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+        summary[name] = _ratio(np.where(valid, values, 0.0).sum(axis=0), counts).tolist()
+    summary["total_cost"] = float(np.mean(kpis["total_cost"])) if len(kpis["total_cost"]) else float("nan")
+    return summary
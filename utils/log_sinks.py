@@ -0,0 +1,149 @@
+# Defining the sinks that decide which training episodes are logged and where
+import os
+from collections import deque
+
+import numpy as np
+
+from utils.trajectory import Trajectory, TrajectoryWriter
+
+
+class MemorySink:
+    def __init__(self):
+        """
+        Keep every episode log in memory, as QLearning.train always did.
+        All sinks record the total reward of every episode, even if the episode log itself is dropped.
+
+        Attributes:
+            logs (list): The retained episode logs.
+            episode_numbers (list): The 1-based episode number of each retained log.
+            episode_rewards (list): The total reward of every episode.
+        """
+        self.logs = []
+        self.episode_numbers = []
+        self.episode_rewards = []
+
+    def wants(self, iteration):
+        """
+        Tell the training loop whether to build the log entries of an episode.
+
+        Args:
+            iteration (int): The 0-based training iteration.
+
+        Returns:
+            bool: True if the episode log will be stored.
+        """
+        return True
+
+    def add_episode(self, iteration, episode_log, total_reward):
+        """
+        Receive a finished episode.
+
+        Args:
+            iteration (int): The 0-based training iteration.
+            episode_log (list): The episode log, None if wants() returned False.
+            total_reward (int): The total reward of the episode.
+        """
+        self.episode_rewards.append(total_reward)
+        if episode_log is not None:
+            self.logs.append(episode_log)
+            self.episode_numbers.append(iteration + 1)
+
+    def close(self):
+        """
+        Finish logging, called once training is complete.
+        """
+
+    def __len__(self):
+        return len(self.logs)
+
+    def __getitem__(self, index):
+        return self.logs[index]
+
+    def __iter__(self):
+        return iter(self.logs)
+
+
+class NullSink(MemorySink):
+    """
+    Keep no episode logs at all, only the episode rewards.
+    """
+
+    def wants(self, iteration):
+        return False
+
+
+class LastEpisodesSink(MemorySink):
+    def __init__(self, num_episodes):
+        """
+        Keep the logs of the last few episodes only.
+
+        Args:
+            num_episodes (int): Number of recent episodes to keep.
+        """
+        super().__init__()
+        self.num_episodes = num_episodes
+        self.logs = deque(maxlen=num_episodes)
+        self.episode_numbers = deque(maxlen=num_episodes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.logs)[index]
+        return self.logs[index]
+
+
+class EveryKthEpisodeSink(MemorySink):
+    def __init__(self, k):
+        """
+        Keep the log of every k-th episode, starting with the first one.
+
+        Args:
+            k (int): Distance between two logged episodes.
+        """
+        super().__init__()
+        self.k = k
+
+    def wants(self, iteration):
+        return iteration % self.k == 0
+
+
+class FileSink(MemorySink):
+    def __init__(self, path, k=1):
+        """
+        Stream episode logs to a trajectory directory instead of keeping them in memory.
+        The logs are read back with utils.trajectory.Trajectory.load, the episode rewards with load_episode_rewards.
+
+        Args:
+            path (str): The trajectory directory, created if it does not exist.
+            k (int): Distance between two logged episodes, 1 logs every episode.
+        """
+        super().__init__()
+        self.path = path
+        self.k = k
+        self.writer = TrajectoryWriter(path)
+
+    def wants(self, iteration):
+        return iteration % self.k == 0
+
+    def add_episode(self, iteration, episode_log, total_reward):
+        self.episode_rewards.append(total_reward)
+        if episode_log is not None:
+            self.episode_numbers.append(iteration + 1)
+            self.writer.append(Trajectory.from_logs([episode_log], [iteration + 1]))
+
+    def close(self):
+        self.writer.close()
+        np.save(os.path.join(self.path, "episode_rewards.npy"), np.asarray(self.episode_rewards))
+
+
+def load_episode_rewards(path, mmap_mode="r"):
+    """
+    Load the total reward of every episode from a directory written by FileSink.
+
+    Args:
+        path (str): The trajectory directory.
+        mmap_mode (str): Memory-map mode passed to np.load.
+
+    Returns:
+        np.ndarray: The total reward per episode.
+    """
+    return np.load(os.path.join(path, "episode_rewards.npy"), mmap_mode=mmap_mode)
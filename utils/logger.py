@@ -1,4 +1,6 @@
+import io
 import logging
+import pstats
 
 def setup_logger():
     """
@@ -8,4 +10,26 @@ def setup_logger():
         logging.Logger: Configured logger instance.
     """
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(lineno)d - %(message)s')
-    return logging.getLogger()
\ No newline at end of file
+    return logging.getLogger()
+
+
+def log_profile(profiler, logger=None, top=20):
+    """
+    Log the phase timings, the counters and the cProfile statistics of a profiler.
+
+    Args:
+        profiler (Profiler): The profiler, see utils.profiling.
+        logger (logging.Logger): The logger, defaults to the root logger.
+        top (int): Number of functions of the cProfile statistics to log.
+    """
+    logger = logging.getLogger() if logger is None else logger
+    report = profiler.report()
+    for phase, timing in sorted(report["phases"].items(), key=lambda item: -item[1]["seconds"]):
+        logger.info(f"{phase}: {timing['seconds']:.3f} s in {timing['calls']} calls "
+                    f"({timing['us_per_call']:.2f} us per call)")
+    for counter, value in sorted(report["counters"].items()):
+        logger.info(f"{counter}: {value}")
+    if profiler.cprofile is not None and profiler.cprofile.getstats():
+        stream = io.StringIO()
+        pstats.Stats(profiler.cprofile, stream=stream).sort_stats("cumulative").print_stats(top)
+        logger.info(stream.getvalue())
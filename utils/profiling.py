@@ -0,0 +1,119 @@
+# Defining opt-in timing and profiling of the training loop
+import cProfile
+import contextlib
+import functools
+import time
+from collections import defaultdict
+
+clock = time.perf_counter
+
+
+class Profiler:
+    def __init__(self, cprofile=False):
+        """
+        Collect cumulative per-phase wall-clock times and event counters, e.g. of QLearning.train.
+        Pass it as the profiler of an agent and report it with utils.logger.log_profile.
+
+        Args:
+            cprofile (bool): Also run cProfile during the profiled sections (train and simulation).
+        """
+        self.seconds = defaultdict(float) # Cumulative time per phase
+        self.calls = defaultdict(int) # Number of timed calls per phase
+        self.counters = defaultdict(int)
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self._mark = clock()
+        self._depth = 0 # Nesting depth of the sections, cProfile is enabled by the outermost one
+
+    def mark(self):
+        """
+        Start timing the next phase.
+        """
+        self._mark = clock()
+
+    def lap(self, phase):
+        """
+        Add the time since the last mark or lap to a phase and start timing the next phase.
+
+        Args:
+            phase (str): Name of the phase that just ended.
+        """
+        now = clock()
+        self.seconds[phase] += now - self._mark
+        self.calls[phase] += 1
+        self._mark = now
+
+    def count(self, counter, n=1):
+        """
+        Increase a counter.
+
+        Args:
+            counter (str): Name of the counter.
+            n (int): The increment.
+        """
+        self.counters[counter] += n
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """
+        Time a section as a phase and run cProfile during it, if enabled.
+
+        Args:
+            name (str): Name of the phase.
+        """
+        start = clock()
+        if self.cprofile is not None and self._depth == 0:
+            self.cprofile.enable()
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self.cprofile is not None and self._depth == 0:
+                self.cprofile.disable()
+            self.seconds[name] += clock() - start
+            self.calls[name] += 1
+
+    def report(self):
+        """
+        Summarize the collected timings and counters.
+
+        Returns:
+            dict: "phases" with the seconds, calls and microseconds per call of each phase, and "counters".
+        """
+        return {
+            "phases": {phase: {"seconds": seconds, "calls": self.calls[phase],
+                               "us_per_call": 1e6 * seconds / max(self.calls[phase], 1)}
+                       for phase, seconds in self.seconds.items()},
+            "counters": dict(self.counters),
+        }
+
+    def reset(self):
+        """
+        Discard all timings, counters and cProfile statistics.
+        """
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+        if self.cprofile is not None:
+            self.cprofile = cProfile.Profile()
+
+
+def profiled(name):
+    """
+    Decorate a method of an agent to run it as a section of the agent's profiler, if it has one.
+
+    Args:
+        name (str): Name of the section.
+
+    Returns:
+        function: The decorator.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.profiler is None:
+                return method(self, *args, **kwargs)
+            with self.profiler.section(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
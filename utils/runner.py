@@ -0,0 +1,117 @@
+# Running training jobs for several problems, seeds and hyperparameters in parallel
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from data.test_problems import (
+    time_horizon,
+    actions,
+    state_space,
+    test_problems,
+    AGENTS,
+    load_agent,
+    problem_env,
+)
+from utils.analysis import calculate_rewards
+from utils.log_sinks import NullSink
+
+def make_jobs(problems, seeds, param_grid, agent="dict"):
+    """
+    Build the cartesian product of problems, seeds and hyperparameter values.
+
+    Args:
+        problems (list): Names of the test problems, see data.test_problems.
+        seeds (list): Seeds of the agents' random number generators.
+        param_grid (dict): Lists of values per QLearning argument, e.g. {"alpha": [0.1, 0.17]}.
+        agent (str): The kind of agent, a key of data.test_problems.AGENTS.
+
+    Returns:
+        list: One job dictionary per combination.
+    """
+    names = list(param_grid)
+    jobs = []
+    for problem, seed, values in itertools.product(problems, seeds, itertools.product(*param_grid.values())):
+        jobs.append({"problem": problem, "seed": seed, "agent": agent, "params": dict(zip(names, values))})
+    return jobs
+
+
+def run_job(job):
+    """
+    Train one agent and summarize the result. Runs inside a worker process.
+
+    Args:
+        job (dict): A job as built by make_jobs.
+
+    Returns:
+        dict: The job's problem, seed and hyperparameters with the rewards and the training time.
+    """
+    start_time = time.time()
+    env = problem_env(job["problem"])
+    agent = load_agent(job["agent"])(actions, state_space, time_horizon=time_horizon, seed=job["seed"], **job["params"])
+    # Only the episode rewards are needed for the summary
+    logs, simulation_log = agent.train(env, log_sink=NullSink())
+
+    return {
+        "problem": job["problem"],
+        "seed": job["seed"],
+        "agent": job["agent"],
+        **job["params"],
+        "final_training_reward": calculate_rewards(logs)[-1],
+        "simulation_reward": calculate_rewards([simulation_log])[0],
+        "seconds": time.time() - start_time,
+    }
+
+
+def run_jobs(jobs, max_workers=None):
+    """
+    Run jobs across a pool of worker processes.
+
+    Args:
+        jobs (list): Jobs as built by make_jobs.
+        max_workers (int): Number of worker processes, defaults to the number of cores.
+
+    Returns:
+        pd.DataFrame: One summary row per job, in the order of the jobs.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_job, jobs))
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train Q-learning agents for many problems, seeds and hyperparameters.")
+    parser.add_argument("--problems", nargs="+", default=list(test_problems), choices=list(test_problems))
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--agent", default="dict", choices=list(AGENTS))
+    parser.add_argument("--iterations", nargs="+", type=int, default=[100])
+    parser.add_argument("--alpha", nargs="+", type=float, default=[0.17])
+    parser.add_argument("--gamma", nargs="+", type=float, default=[1])
+    parser.add_argument("--epsilon-start", nargs="+", type=float, default=[0.98])
+    parser.add_argument("--epsilon-end", nargs="+", type=float, default=[0.1])
+    parser.add_argument("--epsilon-final", nargs="+", type=float, default=[0.02])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="CSV file for the summary table")
+    args = parser.parse_args()
+
+    param_grid = {
+        "max_iterations": args.iterations,
+        "alpha": args.alpha,
+        "gamma": args.gamma,
+        "epsilon_start": args.epsilon_start,
+        "epsilon_end": args.epsilon_end,
+        "epsilon_final": args.epsilon_final,
+    }
+    summary = run_jobs(make_jobs(args.problems, args.seeds, param_grid, agent=args.agent), max_workers=args.workers)
+    print(summary.to_string(index=False))
+
+    if args.output:
+        summary.to_csv(args.output, index=False)
+        print(f"Summary saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+# Searching Q-learning hyperparameters with successive halving and Hyperband
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from agent.checkpoint import load_checkpoint
+from data.test_problems import (
+    time_horizon,
+    actions,
+    state_space,
+    test_problems,
+    AGENTS,
+    load_agent,
+    problem_env,
+)
+from utils.analysis import calculate_rewards
+from utils.log_sinks import NullSink
+
+
+class BudgetStop:
+    def __init__(self, budget):
+        """
+        Monitor for QLearning.train that stops training after a number of iterations,
+        while the epsilon schedule still follows the agent's max_iterations.
+
+        Args:
+            budget (int): Number of completed iterations after which training stops.
+        """
+        self.budget = budget
+
+    def update(self, agent, env, iteration, total_reward):
+        """
+        Returns:
+            bool: Whether the budget is used up after the episode of the iteration.
+        """
+        return iteration + 1 >= self.budget
+
+
+def grid_configs(space):
+    """
+    Build every combination of the hyperparameter values.
+
+    Args:
+        space (dict): List of values per QLearning argument, e.g. {"alpha": [0.1, 0.17]}.
+
+    Returns:
+        list: One configuration dictionary per combination.
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def sample_configs(space, n_configs, rng):
+    """
+    Draw random configurations. A list of values is sampled uniformly, a (low, high) tuple as a uniform float.
+
+    Args:
+        space (dict): Values or (low, high) range per QLearning argument.
+        n_configs (int): Number of configurations.
+        rng (np.random.Generator): The random number generator.
+
+    Returns:
+        list: The configuration dictionaries.
+    """
+    configs = []
+    for _ in range(n_configs):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                config[name] = float(rng.uniform(*values))
+            else:
+                config[name] = values[int(rng.integers(len(values)))]
+        configs.append(config)
+    return configs
+
+
+def halving_budgets(min_budget, max_budget, eta):
+    """
+    Budgets of the rungs of successive halving, growing by eta and ending with max_budget.
+
+    Args:
+        min_budget (int): Training iterations of the first rung.
+        max_budget (int): Training iterations of the last rung.
+        eta (int): Growth of the budget and reduction of the trials per rung.
+
+    Returns:
+        list: The budgets.
+    """
+    budgets = [min_budget]
+    while budgets[-1] * eta < max_budget:
+        budgets.append(budgets[-1] * eta)
+    if budgets[-1] < max_budget:
+        budgets.append(max_budget)
+    return budgets
+
+
+def run_trial_job(job):
+    """
+    Train one trial on one problem and seed up to the budget of its rung, continuing from the previous rung's
+    checkpoint. Every rung keeps its own checkpoint, so a rung can be repeated exactly. Runs inside a worker process.
+
+    Args:
+        job (dict): The trial, config, rung, budget, max_budget, problem, seed, agent, checkpoint path of the rung
+            and checkpoint path of the previous rung (None for the first rung).
+
+    Returns:
+        dict: The job with the rewards after the budget and the training time.
+    """
+    start_time = time.time()
+    env = problem_env(job["problem"])
+    agent = load_agent(job["agent"])(actions, state_space, time_horizon=time_horizon, seed=job["seed"],
+                                     max_iterations=job["max_budget"], **job["config"])
+    checkpoint_path = job["checkpoint"]
+    final_training_reward = None
+    trained_iterations = 0
+    if os.path.exists(checkpoint_path):
+        with np.load(checkpoint_path) as checkpoint:
+            trained_iterations = int(checkpoint["iteration"])
+    if trained_iterations >= job["budget"]:
+        # Trained before an interruption, but the result was not recorded
+        load_checkpoint(agent, checkpoint_path, env)
+        simulation_log = agent.simulation(env)
+    else:
+        if job["previous_checkpoint"] is not None:
+            shutil.copyfile(job["previous_checkpoint"], checkpoint_path)
+        logs, simulation_log = agent.train(env, log_sink=NullSink(), checkpoint_path=checkpoint_path, resume=True,
+                                           monitor=BudgetStop(job["budget"]))
+        final_training_reward = calculate_rewards(logs)[-1]
+
+    return {
+        **job,
+        "final_training_reward": final_training_reward,
+        "simulation_reward": calculate_rewards([simulation_log])[0],
+        "seconds": time.time() - start_time,
+    }
+
+
+def _job_key(trial, rung, problem, seed):
+    return f"{trial}/{rung}/{problem}/{seed}"
+
+
+def load_results(path):
+    """
+    Load the records of a sweep.
+
+    Args:
+        path (str): The results file (.jsonl) of the sweep.
+
+    Returns:
+        list: One record per finished job, empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class Sweep:
+    def __init__(self, sweep_dir, problems=("main",), seeds=(0,), agent="dict", max_workers=None):
+        """
+        Run hyperparameter trials on local cores, persisting every finished job so an interrupted sweep resumes
+        where it stopped. A trial is scored by its mean simulation reward over the problems and seeds.
+
+        Args:
+            sweep_dir (str): Directory of the results file (results.jsonl) and the trial checkpoints.
+            problems (list): Names of the test problems, see data.test_problems.
+            seeds (list): Seeds of the agents' random number generators.
+            agent (str): The kind of agent, a key of data.test_problems.AGENTS.
+            max_workers (int): Number of worker processes, defaults to the number of cores.
+        """
+        self.sweep_dir = sweep_dir
+        self.problems = list(problems)
+        self.seeds = list(seeds)
+        self.agent = agent
+        self.max_workers = max_workers
+        self.results_path = os.path.join(sweep_dir, "results.jsonl")
+        os.makedirs(os.path.join(sweep_dir, "checkpoints"), exist_ok=True)
+        self.records = load_results(self.results_path)
+        self._finished = {_job_key(r["trial"], r["rung"], r["problem"], r["seed"]): r for r in self.records}
+        self._next_trial = 0
+
+    def new_trials(self, configs):
+        """
+        Assign trial ids to configurations, checking them against the records of a resumed sweep.
+
+        Args:
+            configs (list): The configuration dictionaries.
+
+        Returns:
+            list: (trial id, config) pairs.
+        """
+        trials = []
+        recorded = {record["trial"]: record["config"] for record in self.records}
+        for config in configs:
+            trial = self._next_trial
+            self._next_trial += 1
+            if trial in recorded and recorded[trial] != json.loads(json.dumps(config)):
+                raise ValueError(f"Trial {trial} was recorded with {recorded[trial]}, not {config}. "
+                                 "Resume a sweep with the same search space, seed and budgets.")
+            trials.append((trial, config))
+        return trials
+
+    def checkpoint_path(self, trial, rung, problem, seed):
+        """
+        Returns:
+            str: The checkpoint of a trial after a rung.
+        """
+        return os.path.join(self.sweep_dir, "checkpoints", f"trial{trial}_rung{rung}_{problem}_{seed}.npz")
+
+    def run_rung(self, trials, rung, budget, max_budget, bracket=0):
+        """
+        Train every trial up to a budget, skipping jobs that are already recorded.
+
+        Args:
+            trials (list): (trial id, config) pairs.
+            rung (int): Index of the rung.
+            budget (int): Training iterations of the rung.
+            max_budget (int): Training iterations of the full schedule, the agents' max_iterations.
+            bracket (int): Index of the Hyperband bracket.
+
+        Returns:
+            dict: Mean simulation reward per trial id.
+        """
+        jobs = []
+        for (trial, config), problem, seed in itertools.product(trials, self.problems, self.seeds):
+            if _job_key(trial, rung, problem, seed) not in self._finished:
+                jobs.append({"trial": trial, "config": config, "bracket": bracket, "rung": rung, "budget": budget,
+                             "max_budget": max_budget, "problem": problem, "seed": seed, "agent": self.agent,
+                             "checkpoint": self.checkpoint_path(trial, rung, problem, seed),
+                             "previous_checkpoint": self.checkpoint_path(trial, rung - 1, problem, seed)
+                             if rung > 0 else None})
+
+        if jobs:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor, \
+                    open(self.results_path, "a") as file:
+                for future in as_completed([executor.submit(run_trial_job, job) for job in jobs]):
+                    record = future.result()
+                    file.write(json.dumps(record) + "\n")
+                    file.flush()
+                    self.records.append(record)
+                    self._finished[_job_key(record["trial"], rung, record["problem"], record["seed"])] = record
+
+        return {trial: float(np.mean([self._finished[_job_key(trial, rung, problem, seed)]["simulation_reward"]
+                                      for problem in self.problems for seed in self.seeds]))
+                for trial, _ in trials}
+
+    def successive_halving(self, configs, min_budget, max_budget, eta=3, bracket=0):
+        """
+        Train all configurations with a small budget and promote the best 1/eta to the next, eta times larger budget
+        until max_budget is reached.
+
+        Args:
+            configs (list): The configuration dictionaries.
+            min_budget (int): Training iterations of the first rung.
+            max_budget (int): Training iterations of the last rung.
+            eta (int): Growth of the budget and reduction of the trials per rung.
+            bracket (int): Index of the Hyperband bracket.
+
+        Returns:
+            list: (trial id, config, score) of the trials of the last rung, best first.
+        """
+        trials = self.new_trials(configs)
+        budgets = halving_budgets(min_budget, max_budget, eta)
+        for rung, budget in enumerate(budgets):
+            scores = self.run_rung(trials, rung, budget, max_budget, bracket)
+            trials = sorted(trials, key=lambda trial: -scores[trial[0]])
+            if rung < len(budgets) - 1:
+                trials = trials[:max(1, len(trials) // eta)]
+        return [(trial, config, scores[trial]) for trial, config in trials]
+
+    def hyperband(self, space, min_budget, max_budget, eta=3, rng=None):
+        """
+        Run successive halving brackets that trade the number of random configurations against their first budget.
+
+        Args:
+            space (dict): Values or (low, high) range per QLearning argument, see sample_configs.
+            min_budget (int): Smallest budget of a rung.
+            max_budget (int): Training iterations of the last rung.
+            eta (int): Growth of the budget and reduction of the trials per rung.
+            rng (np.random.Generator): Random number generator of the configurations.
+
+        Returns:
+            list: (trial id, config, score) of the finalists of all brackets, best first.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        s_max = int(math.floor(math.log(max_budget / min_budget, eta) + 1e-9))
+        finalists = []
+        for s in range(s_max, -1, -1):
+            n_configs = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+            first_budget = max(min_budget, int(round(max_budget / eta ** s)))
+            finalists += self.successive_halving(sample_configs(space, n_configs, rng), first_budget, max_budget, eta,
+                                                 bracket=s_max - s)
+        return sorted(finalists, key=lambda finalist: -finalist[2])
+
+    def summary(self):
+        """
+        Returns:
+            pd.DataFrame: One row per recorded job with the configuration as columns.
+        """
+        return pd.DataFrame([{**{k: v for k, v in record.items() if k != "config"}, **record["config"]}
+                             for record in self.records])
+
+
+def run_sweep(space, sweep_dir, method="hyperband", search="random", n_configs=27, min_budget=100, max_budget=2700,
+              eta=3, problems=("main",), seeds=(0,), agent="dict", max_workers=None, seed=0):
+    """
+    Search hyperparameters with successive halving or Hyperband. Rerunning with the same arguments resumes the sweep.
+
+    Args:
+        space (dict): Values per QLearning argument, or (low, high) ranges for the random search.
+        sweep_dir (str): Directory of the results and checkpoints.
+        method (str): "halving" or "hyperband". Hyperband draws its own configurations, so it needs the random search.
+        search (str): "grid" for every combination of the values or "random" for n_configs random configurations.
+        n_configs (int): Number of random configurations of successive halving.
+        min_budget (int): Training iterations of the first rung.
+        max_budget (int): Training iterations of a fully trained trial.
+        eta (int): Growth of the budget and reduction of the trials per rung.
+        problems (list): Names of the test problems.
+        seeds (list): Seeds of the agents.
+        agent (str): The kind of agent, a key of data.test_problems.AGENTS.
+        max_workers (int): Number of worker processes, defaults to the number of cores.
+        seed (int): Seed of the random search.
+
+    Returns:
+        tuple: The ranking of the finalists as (trial id, config, score) and the sweep.
+    """
+    sweep = Sweep(sweep_dir, problems, seeds, agent, max_workers)
+    rng = np.random.default_rng(seed)
+    if method == "hyperband":
+        if search != "random":
+            raise ValueError("Hyperband draws its configurations, use search='random'")
+        return sweep.hyperband(space, min_budget, max_budget, eta, rng), sweep
+    if method != "halving":
+        raise ValueError(f"Unknown sweep method {method}")
+    configs = grid_configs(space) if search == "grid" else sample_configs(space, n_configs, rng)
+    return sweep.successive_halving(configs, min_budget, max_budget, eta), sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search Q-learning hyperparameters with successive halving or Hyperband. "
+                    "With --search random a parameter given two values is drawn uniformly between them.")
+    parser.add_argument("sweep_dir", help="Directory of the results and checkpoints, rerun to resume")
+    parser.add_argument("--method", default="hyperband", choices=["halving", "hyperband"])
+    parser.add_argument("--search", default="random", choices=["grid", "random"])
+    parser.add_argument("--n-configs", type=int, default=27)
+    parser.add_argument("--min-budget", type=int, default=100)
+    parser.add_argument("--max-budget", type=int, default=2700)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--problems", nargs="+", default=["main"], choices=list(test_problems))
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--agent", default="dict", choices=list(AGENTS))
+    parser.add_argument("--alpha", nargs="+", type=float, default=[0.05, 0.3])
+    parser.add_argument("--gamma", nargs="+", type=float, default=[1])
+    parser.add_argument("--epsilon-start", nargs="+", type=float, default=[0.98])
+    parser.add_argument("--epsilon-end", nargs="+", type=float, default=[0.1])
+    parser.add_argument("--epsilon-final", nargs="+", type=float, default=[0.02])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random search")
+    args = parser.parse_args()
+
+    values = {
+        "alpha": args.alpha,
+        "gamma": args.gamma,
+        "epsilon_start": args.epsilon_start,
+        "epsilon_end": args.epsilon_end,
+        "epsilon_final": args.epsilon_final,
+    }
+    if args.search == "random":
+        space = {name: tuple(v) if len(v) == 2 else v for name, v in values.items()}
+    else:
+        space = values
+    ranking, sweep = run_sweep(space, args.sweep_dir, method=args.method, search=args.search,
+                               n_configs=args.n_configs, min_budget=args.min_budget, max_budget=args.max_budget,
+                               eta=args.eta, problems=args.problems, seeds=args.seeds, agent=args.agent,
+                               max_workers=args.workers, seed=args.seed)
+    for trial, config, score in ranking[:10]:
+        print(f"Trial {trial}: {score:.1f} {config}")
+
+
+if __name__ == "__main__":
+    main()
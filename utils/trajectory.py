@@ -0,0 +1,241 @@
+# Defining the columnar trajectory format for simulation and training logs
+import os
+import shutil
+
+import numpy as np
+
+# Columns of a trajectory with their data type and whether they hold one value per echelon
+COLUMNS = {
+    "episode": ("int32", False),
+    "period": ("int32", False),
+    "state": ("int8", True),
+    "action": ("int16", True),
+    "reward": ("float64", False), # Fractional costs give fractional rewards, float64 holds integers exactly
+    "demand": ("int32", False),
+    "inventory": ("int32", True),
+    "backlog": ("int32", True),
+}
+
+
+class Trajectory:
+    def __init__(self, episode, period, state, action, reward, demand, inventory, backlog):
+        """
+        Log entries stored as fixed-width numeric arrays, one row per log entry.
+        Per-echelon columns have shape (rows, num_echelons), all others shape (rows,).
+
+        Args:
+            episode (np.ndarray): The 1-based episode number of each row.
+            period (np.ndarray): The period within the episode, the final state of an episode has period time_horizon.
+            state (np.ndarray): The coded state.
+            action (np.ndarray): The action vector.
+            reward (np.ndarray): The reward received before the row's state, as in the tuple logs.
+            demand (np.ndarray): The customer demand of the period, summed over the retailers.
+            inventory (np.ndarray): The inventory levels.
+            backlog (np.ndarray): The order backlogs.
+        """
+        self.episode = episode
+        self.period = period
+        self.state = state
+        self.action = action
+        self.reward = reward
+        self.demand = demand
+        self.inventory = inventory
+        self.backlog = backlog
+
+    @classmethod
+    def from_logs(cls, logs, episode_numbers=None):
+        """
+        Convert tuple logs as returned by QLearning.train or QLearning.simulation.
+
+        Args:
+            logs (list): A list of episode logs, e.g. [simulation_log] for a single episode.
+            episode_numbers (list): The episode number of each log, defaults to 1, 2, ...
+
+        Returns:
+            Trajectory: The logs as arrays, without rows (and without echelons) if there are no log entries.
+        """
+        if episode_numbers is None:
+            episode_numbers = getattr(logs, 'episode_numbers', range(1, len(logs) + 1))
+        columns = {name: [] for name in COLUMNS}
+        for number, episode_log in zip(episode_numbers, logs):
+            if not len(episode_log):
+                continue
+            states, action_vectors, rewards, demands, inventories, backlogs = zip(*episode_log)
+            columns["episode"].append(np.full(len(episode_log), number))
+            columns["period"].append(np.arange(len(episode_log)))
+            columns["state"].append(states)
+            columns["action"].append(action_vectors)
+            columns["reward"].append(rewards)
+            # Supply chains with several retailers may log one demand per retailer
+            columns["demand"].append([sum(d) if hasattr(d, "__len__") else d for d in demands])
+            columns["inventory"].append(inventories)
+            columns["backlog"].append(backlogs)
+        if not columns["episode"]:
+            return cls(**{name: np.zeros((0, 0) if per_echelon else 0, dtype=dtype)
+                          for name, (dtype, per_echelon) in COLUMNS.items()})
+        return cls(**{name: np.concatenate([np.asarray(part, dtype=COLUMNS[name][0]) for part in parts])
+                      for name, parts in columns.items()})
+
+    def __len__(self):
+        return len(self.episode)
+
+    @property
+    def num_echelons(self):
+        """
+        int: Number of echelons (agents) per row.
+        """
+        return self.state.shape[1]
+
+    def columns(self):
+        """
+        Returns:
+            dict: The column arrays by name.
+        """
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def select_episodes(self, episode_numbers):
+        """
+        Select the rows of some episodes.
+
+        Args:
+            episode_numbers (list): The episode numbers to keep.
+
+        Returns:
+            Trajectory: The rows of these episodes.
+        """
+        mask = np.isin(self.episode, episode_numbers)
+        return Trajectory(**{name: values[mask] for name, values in self.columns().items()})
+
+    def to_dataframe(self):
+        """
+        Convert to a pandas DataFrame with one column per echelon for the per-echelon values.
+
+        Returns:
+            pd.DataFrame: The trajectory.
+        """
+        import pandas as pd
+
+        data = {}
+        for name, (dtype, per_echelon) in COLUMNS.items():
+            values = getattr(self, name)
+            if per_echelon:
+                for echelon in range(values.shape[1]):
+                    data[f"{name}_{echelon}"] = values[:, echelon]
+            else:
+                data[name] = values
+        return pd.DataFrame(data)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Convert a DataFrame built by to_dataframe back into a trajectory.
+
+        Args:
+            df (pd.DataFrame): The trajectory as a DataFrame.
+
+        Returns:
+            Trajectory: The trajectory.
+        """
+        columns = {}
+        for name, (dtype, per_echelon) in COLUMNS.items():
+            if per_echelon:
+                names = [column for column in df.columns if column.rsplit("_", 1)[0] == name]
+                columns[name] = df[sorted(names, key=lambda column: int(column.rsplit("_", 1)[1]))].to_numpy(dtype)
+            else:
+                columns[name] = df[name].to_numpy(dtype)
+        return cls(**columns)
+
+    def save(self, path):
+        """
+        Save the trajectory as a directory with one .npy file per column.
+
+        Args:
+            path (str): The directory, created if it does not exist.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, values in self.columns().items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load a trajectory saved with save() or streamed with TrajectoryWriter.
+
+        Args:
+            path (str): The directory.
+            mmap_mode (str): Memory-map mode passed to np.load, None reads the columns into memory.
+
+        Returns:
+            Trajectory: The trajectory, backed by the memory-mapped files by default.
+        """
+        return cls(**{name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in COLUMNS})
+
+    def to_parquet(self, path):
+        """
+        Save the trajectory as a Parquet file, requires pyarrow or fastparquet.
+
+        Args:
+            path (str): The file path.
+        """
+        self.to_dataframe().to_parquet(path, index=False)
+
+    @classmethod
+    def from_parquet(cls, path):
+        """
+        Load a trajectory saved with to_parquet().
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            Trajectory: The trajectory.
+        """
+        import pandas as pd
+
+        return cls.from_dataframe(pd.read_parquet(path))
+
+
+class TrajectoryWriter:
+    def __init__(self, path):
+        """
+        Stream trajectory rows to a directory in the format of Trajectory.save, without holding them in memory.
+        The rows are appended to raw files, which close() turns into .npy files.
+
+        Args:
+            path (str): The directory, created if it does not exist.
+        """
+        self.path = path
+        self.rows = 0
+        self.num_echelons = 0
+        os.makedirs(path, exist_ok=True)
+        self._files = {name: open(self._part_path(name), "wb") for name in COLUMNS}
+
+    def _part_path(self, name):
+        return os.path.join(self.path, f"{name}.npy.part")
+
+    def append(self, trajectory):
+        """
+        Append the rows of a trajectory.
+
+        Args:
+            trajectory (Trajectory): The rows to append.
+        """
+        for name, values in trajectory.columns().items():
+            np.ascontiguousarray(values, dtype=COLUMNS[name][0]).tofile(self._files[name])
+        if len(trajectory):
+            self.rows += len(trajectory)
+            self.num_echelons = trajectory.num_echelons
+
+    def close(self):
+        """
+        Write the .npy headers and move the streamed rows behind them.
+        """
+        for name, (dtype, per_echelon) in COLUMNS.items():
+            self._files[name].close()
+            shape = (self.rows, self.num_echelons) if per_echelon else (self.rows,)
+            header = {"descr": np.dtype(dtype).str, "fortran_order": False, "shape": shape}
+            with open(os.path.join(self.path, f"{name}.npy"), "wb") as file:
+                np.lib.format.write_array_header_1_0(file, header)
+                with open(self._part_path(name), "rb") as part:
+                    shutil.copyfileobj(part, file)
+            os.remove(self._part_path(name))